@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+Module for exchanging area source models as Apache Arrow tables and
+GeoParquet files. The columns of an
+:class:`hmtk_utils.oq_shp_tools.source_table.AreaSourceTable` are mapped to
+Arrow columns: the parameters of the sources (MFD parameters included) are
+flat columns while the occurrence rates and the nodal plane and
+hypocentral depth distributions are list columns built directly from the
+ragged arrays (values and offsets) of the table. The polygons are stored
+as WKB in the `geometry` column (as required by GeoParquet) or as two list
+columns `lons` and `lats`.
+
+Requires pyarrow.
+"""
+
+import json
+
+import numpy as np
+
+import polygons as poly
+
+from parsers import parse_area_source_table
+from source_table import AreaSourceTable, STRING_COLUMNS, FLOAT_COLUMNS, \
+    RAGGED_COLUMNS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+GEOMETRY_FORMATS = ('wkb', 'coords')
+GEOPARQUET_VERSION = '1.0.0'
+
+# Ragged columns written as list columns. The rings are written according
+# to the geometry format.
+LIST_COLUMNS = tuple((offsets, values) for offsets, values in
+                     RAGGED_COLUMNS if offsets != 'ring_offsets')
+
+
+def _check_pyarrow():
+    if pa is None:
+        raise ImportError('pyarrow is required to use Arrow tables')
+
+
+def _get_list_array(values, offsets):
+    """
+    :returns:
+        A list array with the rows of a ragged array
+    """
+    return pa.ListArray.from_arrays(
+        pa.array(np.asarray(offsets, dtype=np.int32)),
+        pa.array(np.asarray(values, dtype=float)))
+
+
+def _get_geo_metadata(table):
+    """
+    :returns:
+        The GeoParquet metadata of the `geometry` column
+    """
+    column = {'encoding': 'WKB', 'geometry_types': ['Polygon']}
+    if len(table.lons):
+        column['bbox'] = [float(table.lons.min()), float(table.lats.min()),
+                          float(table.lons.max()), float(table.lats.max())]
+    return {'version': GEOPARQUET_VERSION, 'primary_column': 'geometry',
+            'columns': {'geometry': column}}
+
+
+def to_arrow(sources, geometry='wkb'):
+    """
+    Convert a set of area sources into an Arrow table
+
+    :parameter sources:
+        An instance of :class:`AreaSourceTable` or the name of a shapefile
+        or of a nrml file
+    :parameter str geometry:
+        'wkb' to store the polygons in a binary `geometry` column or
+        'coords' to store them in the list columns `lons` and `lats`
+    :returns:
+        An instance of :class:`pyarrow.Table`. With WKB geometries the
+        schema contains the GeoParquet metadata.
+    """
+    _check_pyarrow()
+    if geometry not in GEOMETRY_FORMATS:
+        raise ValueError('Unsupported geometry format: %s' % geometry)
+    table = sources
+    if not isinstance(sources, AreaSourceTable):
+        table = parse_area_source_table(sources)
+
+    names, arrays = [], []
+    for name in STRING_COLUMNS:
+        names.append(name)
+        arrays.append(pa.array(list(getattr(table, name)), pa.string()))
+    for name in FLOAT_COLUMNS:
+        names.append(name)
+        arrays.append(pa.array(getattr(table, name)))
+    for offsets, values in LIST_COLUMNS:
+        for name in values:
+            names.append(name)
+            arrays.append(_get_list_array(getattr(table, name),
+                                          getattr(table, offsets)))
+    metadata = None
+    if geometry == 'wkb':
+        names.append('geometry')
+        arrays.append(pa.array(
+            [poly.get_polygon_wkb(lons, lats) for lons, lats in
+             poly.split_rings(table.lons, table.lats, table.ring_offsets)],
+            pa.binary()))
+        metadata = {'geo': json.dumps(_get_geo_metadata(table))}
+    else:
+        for name in ('lons', 'lats'):
+            names.append(name)
+            arrays.append(_get_list_array(getattr(table, name),
+                                          table.ring_offsets))
+    return pa.Table.from_arrays(arrays, names=names, metadata=metadata)
+
+
+def _get_array(column):
+    """
+    :returns:
+        The chunks of a column of an Arrow table joined in a single array
+    """
+    if isinstance(column, pa.ChunkedArray):
+        if column.num_chunks == 1:
+            return column.chunk(0)
+        return pa.concat_arrays(column.chunks)
+    return column
+
+
+def _get_ragged(array):
+    """
+    :returns:
+        The values and the offsets (starting from 0) of a list array
+    """
+    offsets = np.asarray(array.offsets, dtype=int)
+    return (np.asarray(array.flatten().to_numpy(zero_copy_only=False),
+                       dtype=float), offsets - offsets[0])
+
+
+def from_arrow(arrow_table):
+    """
+    Convert an Arrow table into a table of area sources. Missing columns
+    take the default values of :class:`AreaSourceTable`.
+
+    :parameter arrow_table:
+        An instance of :class:`pyarrow.Table` (see :func:`to_arrow`)
+    :returns:
+        An instance of :class:`AreaSourceTable`
+    """
+    _check_pyarrow()
+    names = set(arrow_table.column_names)
+    if 'id' not in names:
+        raise ValueError('The table does not contain the id column')
+    columns = {}
+    for name in STRING_COLUMNS:
+        if name in names:
+            columns[name] = _get_array(arrow_table.column(name)).to_pylist()
+    for name in FLOAT_COLUMNS:
+        if name in names:
+            columns[name] = np.asarray(_get_array(arrow_table.column(
+                name)).to_numpy(zero_copy_only=False), dtype=float)
+    for offsets, values in LIST_COLUMNS:
+        for name in values:
+            if name in names:
+                columns[name], columns[offsets] = _get_ragged(
+                    _get_array(arrow_table.column(name)))
+
+    if 'geometry' in names:
+        rings = [poly.get_polygon_from_wkb(wkb) for wkb in
+                 _get_array(arrow_table.column('geometry')).to_pylist()]
+        (columns['lons'], columns['lats'],
+         columns['ring_offsets']) = poly.join_rings(rings)
+    elif 'lons' in names and 'lats' in names:
+        columns['lons'], columns['ring_offsets'] = _get_ragged(
+            _get_array(arrow_table.column('lons')))
+        columns['lats'], _ = _get_ragged(
+            _get_array(arrow_table.column('lats')))
+    return AreaSourceTable(**columns)
+
+
+def write_geoparquet(sources, filename, **kwargs):
+    """
+    Write a set of area sources in a GeoParquet file
+
+    :parameter sources:
+        An instance of :class:`AreaSourceTable` or the name of a shapefile
+        or of a nrml file
+    :parameter str filename:
+        The name of the parquet file
+    :parameter kwargs:
+        Other parameters of :func:`pyarrow.parquet.write_table` (e.g.
+        `compression`)
+    """
+    pq.write_table(to_arrow(sources, geometry='wkb'), filename, **kwargs)
+
+
+def read_geoparquet(filename, columns=None):
+    """
+    Read a set of area sources from a GeoParquet file. Only the columns
+    requested are read.
+
+    :parameter str filename:
+        The name of the parquet file
+    :parameter list columns:
+        The names of the columns read (the `id` column is always read).
+        When None all the columns are read.
+    :returns:
+        An instance of :class:`AreaSourceTable`
+    """
+    _check_pyarrow()
+    if columns is not None and 'id' not in columns:
+        columns = ['id'] + list(columns)
+    return from_arrow(pq.read_table(filename, columns=columns))
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+Module for assigning the events of an earthquake catalogue to the area
+sources (zones) of a model. The bounding boxes of the zones are indexed
+with a regular grid; each event is tested only against the zones whose
+box covers its cell and all the candidate pairs event-zone are filtered
+by depth and tested with a vectorized point-in-polygon test.
+"""
+
+import numpy as np
+
+import polygons as poly
+
+from parsers import parse_area_source_table
+from source_table import AreaSourceTable
+
+# Number of events processed at once
+CHUNK_SIZE = 100000
+
+
+def get_zone_index(lons, lats, offsets, cell_size=None):
+    """
+    Index the bounding boxes of a set of rings with a regular grid
+
+    :parameter lons:
+        An array with the longitudes of the vertices
+    :parameter lats:
+        An array with the latitudes of the vertices
+    :parameter offsets:
+        An array with the offsets of the rings
+    :parameter float cell_size:
+        The size [degrees] of the cells. When None it is a quarter of the
+        median size of the bounding boxes.
+    :returns:
+        A dictionary with the origin and size of the grid (`x0`, `y0`,
+        `cell_size`, `num_x`), the index of each covered cell (`cells`,
+        sorted) and the index of the ring covering it (`rings`)
+    """
+    bboxes = poly.get_bounding_boxes(lons, lats, offsets)
+    if cell_size is None:
+        sizes = np.maximum(bboxes[:, 2] - bboxes[:, 0],
+                           bboxes[:, 3] - bboxes[:, 1])
+        cell_size = np.median(sizes) / 4. if len(sizes) else 1.
+        cell_size = cell_size if cell_size > 0 else 1.
+    x0, y0 = bboxes[:, 0].min(), bboxes[:, 1].min()
+    ix0 = np.floor((bboxes[:, 0] - x0) / cell_size).astype(int)
+    iy0 = np.floor((bboxes[:, 1] - y0) / cell_size).astype(int)
+    ix1 = np.floor((bboxes[:, 2] - x0) / cell_size).astype(int)
+    iy1 = np.floor((bboxes[:, 3] - y0) / cell_size).astype(int)
+    num_x = ix1.max() + 1
+    # Cells covered by each box
+    nx, ny = ix1 - ix0 + 1, iy1 - iy0 + 1
+    counts = nx * ny
+    rings = np.repeat(np.arange(len(counts)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,
+                                                counts)
+    cells = ((iy0[rings] + local // nx[rings]) * num_x +
+             ix0[rings] + local % nx[rings])
+    order = np.lexsort((rings, cells))
+    return {'x0': x0, 'y0': y0, 'cell_size': cell_size, 'num_x': num_x,
+            'cells': cells[order], 'rings': rings[order]}
+
+
+def _get_candidates(xpnt, ypnt, index):
+    """
+    :returns:
+        The indexes of the points and of the rings whose bounding box may
+        contain them
+    """
+    size = index['cell_size']
+    ix = np.floor((xpnt - index['x0']) / size).astype(int)
+    iy = np.floor((ypnt - index['y0']) / size).astype(int)
+    ok = (ix >= 0) & (ix < index['num_x']) & (iy >= 0)
+    cell = np.where(ok, iy * index['num_x'] + ix, -1)
+    low = np.searchsorted(index['cells'], cell, side='left')
+    upp = np.searchsorted(index['cells'], cell, side='right')
+    counts = np.where(ok, upp - low, 0)
+    pnt = np.repeat(np.arange(len(xpnt)), counts)
+    pos = (np.repeat(low, counts) + np.arange(counts.sum()) -
+           np.repeat(np.cumsum(counts) - counts, counts))
+    return pnt, index['rings'][pos]
+
+
+def assign_events(lons, lats, depths, zones, index=None,
+                  chunk_size=CHUNK_SIZE):
+    """
+    Find the zone containing each event of a catalogue. The depth of an
+    event must be between the upper and lower seismogenic depths of the
+    zone; events or zones without depth are not filtered by depth. When an
+    event is inside more zones the first one is selected.
+
+    :parameter lons:
+        An array with the longitudes of the events
+    :parameter lats:
+        An array with the latitudes of the events
+    :parameter depths:
+        An array with the depths [km] of the events or None
+    :parameter zones:
+        An instance of :class:`AreaSourceTable` or the name of a shapefile
+        or of a nrml file
+    :parameter dict index:
+        The index of the zones (see :func:`get_zone_index`). When None it
+        is created.
+    :parameter int chunk_size:
+        The number of events processed at once
+    :returns:
+        An integer array with the index of the zone of each event (-1 for
+        the events outside all the zones)
+    """
+    table = zones
+    if not isinstance(zones, AreaSourceTable):
+        table = parse_area_source_table(zones)
+    lons = np.asarray(lons, dtype=float)
+    lats = np.asarray(lats, dtype=float)
+    if depths is None:
+        depths = np.empty(len(lons))
+        depths.fill(np.nan)
+    depths = np.asarray(depths, dtype=float)
+    if not (len(lons) == len(lats) == len(depths)):
+        raise ValueError('Coordinates and depths have different lengths')
+    out = -np.ones(len(lons), dtype=int)
+    if not len(table) or not len(lons):
+        return out
+    if index is None:
+        index = get_zone_index(table.lons, table.lats, table.ring_offsets)
+    upper = table.upper_seismo_depth
+    lower = table.lower_seismo_depth
+
+    for start in range(0, len(lons), chunk_size):
+        xpnt = lons[start:start + chunk_size]
+        ypnt = lats[start:start + chunk_size]
+        dpnt = depths[start:start + chunk_size]
+        pnt, ring = _get_candidates(xpnt, ypnt, index)
+        dep = dpnt[pnt]
+        with np.errstate(invalid='ignore'):
+            ok = ~((dep < upper[ring]) | (dep > lower[ring]))
+        pnt, ring = pnt[ok], ring[ok]
+        inside = poly.get_points_in_rings(xpnt[pnt], ypnt[pnt], ring,
+                                          table.lons, table.lats,
+                                          table.ring_offsets)
+        pnt, ring = pnt[inside], ring[inside]
+        # First zone for each event (pairs are sorted by event and zone)
+        order = np.lexsort((ring, pnt))
+        pnt, ring = pnt[order], ring[order]
+        first = np.concatenate([[True], pnt[1:] != pnt[:-1]]) if len(pnt) \
+            else np.zeros(0, dtype=bool)
+        out[start + pnt[first]] = ring[first]
+    return out
+
+
+def get_zone_counts(assignment, num_zones):
+    """
+    :parameter assignment:
+        The zone of each event (see :func:`assign_events`)
+    :parameter int num_zones:
+        The number of zones
+    :returns:
+        An array with the number of events in each zone
+    """
+    assignment = np.asarray(assignment)
+    return np.bincount(assignment[assignment >= 0], minlength=num_zones)
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+Module for checking the consistency of the attribute table of a shapefile
+containing area sources. The checks operate on the columns of the table
+(see :func:`hmtk_utils.oq_shp_tools.shapefile_tools.get_field_arrays`) and
+are vectorized over all the sources.
+"""
+
+import json
+import numpy as np
+
+from attribute_tools import get_numbered_columns, get_used_mask
+
+NPD_WEIGHTS = 'npd_weights_sum'
+HDD_WEIGHTS = 'hdd_weights_sum'
+NUM_NPD = 'num_npd_mismatch'
+NUM_HDD = 'num_hdd_mismatch'
+INCOMPLETE_NPD = 'incomplete_nodal_plane'
+MISSING_DEPTH = 'missing_hypo_depth'
+MAG_RANGE = 'min_mag_not_lower_than_max_mag'
+DEPTH_RANGE = 'upp_seismo_not_shallower_than_low_seismo'
+
+
+def _check_distribution(columns, num_key, weight_key, value_keys,
+                        tolerance):
+    """
+    Check the columns describing a discrete distribution (e.g. the nodal
+    plane distribution)
+
+    :returns:
+        Three boolean arrays: True for the rows where the weights do not sum
+        to one, where the number of values does not match the number of
+        weights set and where one of the values used is not set
+    """
+    num_rows = len(columns[num_key])
+    weights = get_numbered_columns(columns, weight_key)
+    if weights is None:
+        weights = np.zeros((num_rows, 0))
+    used = get_used_mask(columns[num_key], weights.shape[1])
+    total = np.where(used, np.nan_to_num(weights), 0.).sum(axis=1)
+    bad_sum = np.abs(total - 1.0) > tolerance
+    bad_num = np.isfinite(weights).sum(axis=1) != columns[num_key]
+    missing = np.zeros(num_rows, dtype=bool)
+    for key in value_keys:
+        values = get_numbered_columns(columns, key)
+        if values is None:
+            values = np.zeros((num_rows, 0))
+        values = values[:, :weights.shape[1]]
+        miss = ~np.isfinite(values) & used[:, :values.shape[1]]
+        missing |= miss.any(axis=1) | (values.shape[1] < used.sum(axis=1))
+    return bad_sum, bad_num, missing
+
+
+def get_attribute_errors(columns, tolerance=1e-4):
+    """
+    Check the consistency of the attribute table of a set of area sources
+
+    :parameter dict columns:
+        A dictionary with the columns of the attribute table
+    :parameter float tolerance:
+        Tolerance used to check that weights sum to one
+    :returns:
+        A dictionary whose keys are the names of the checks and values
+        boolean arrays, True for the sources failing the check
+    """
+    errors = {}
+    if 'num_npd' in columns:
+        errors[NPD_WEIGHTS], errors[NUM_NPD], errors[INCOMPLETE_NPD] = \
+            _check_distribution(columns, 'num_npd', 'weight_',
+                                ['strike_', 'dip_', 'rake_'], tolerance)
+    if 'num_hdd' in columns:
+        errors[HDD_WEIGHTS], errors[NUM_HDD], errors[MISSING_DEPTH] = \
+            _check_distribution(columns, 'num_hdd', 'hdd_w_', ['hdd_d_'],
+                                tolerance)
+    # Comparisons with NaN are False hence only values set are checked
+    if 'min_mag' in columns and 'max_mag' in columns:
+        errors[MAG_RANGE] = columns['min_mag'] >= columns['max_mag']
+    if 'upp_seismo' in columns and 'low_seismo' in columns:
+        errors[DEPTH_RANGE] = columns['upp_seismo'] >= columns['low_seismo']
+    return errors
+
+
+def check_area_source_attributes(columns, tolerance=1e-4,
+                                 report_filename=None):
+    """
+    Check the consistency of the attribute table of a set of area sources
+    and create a report
+
+    :parameter dict columns:
+        A dictionary with the columns of the attribute table
+    :parameter float tolerance:
+        Tolerance used to check that weights sum to one
+    :parameter str report_filename:
+        Name of the file where the report is saved in json format
+    :returns:
+        A dictionary with the report
+    """
+    errors = get_attribute_errors(columns, tolerance)
+    names = sorted(errors.keys())
+    # The number of features does not depend on the checks applied
+    num_sources = len(next(iter(columns.values()))) if columns else 0
+    if len(names):
+        table = np.column_stack([errors[name] for name in names])
+    else:
+        table = np.zeros((num_sources, 0), dtype=bool)
+    ids = columns.get('src_id', [None] * num_sources)
+
+    report = {'num_sources': num_sources,
+              'num_failures': dict((name, int(errors[name].sum())) for name
+                                   in names),
+              'sources': []}
+    for i in np.nonzero(table.any(axis=1))[0]:
+        report['sources'].append({'index': int(i), 'src_id': ids[i],
+                                  'errors': [names[j] for j in
+                                             np.nonzero(table[i])[0]]})
+    report['num_with_errors'] = len(report['sources'])
+
+    if report_filename is not None:
+        with open(report_filename, 'w') as fout:
+            json.dump(report, fout, indent=2, sort_keys=True)
+    return report
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+Module with tools for handling the attribute table of a preformatted
+shapefile stored as a dictionary of arrays (one for each field).
+"""
+
+import re
+import numpy as np
+
+
+def get_numbered_columns(columns, prefix):
+    """
+    Collect the values stored in a family of numbered columns (e.g. `or_1`,
+    `or_2`, ...) of an attribute table into a 2D array
+
+    :parameter dict columns:
+        A dictionary with the columns of the attribute table
+    :parameter str prefix:
+        The prefix of the columns (e.g. `or_`)
+    :returns:
+        A 2D array (number of rows x largest column number). Missing values
+        are NaN. None if the table does not contain columns with this
+        prefix.
+    """
+    pattern = re.compile(r'^%s(\d+)$' % re.escape(prefix))
+    keys = sorted([(int(pattern.match(key).group(1)), key) for key in
+                   columns if pattern.match(key)])
+    if not len(keys):
+        return None
+    out = np.empty((len(columns[keys[0][1]]), keys[-1][0]))
+    out.fill(np.nan)
+    for num, key in keys:
+        out[:, num - 1] = columns[key]
+    return out
+
+
+def get_used_mask(counts, width):
+    """
+    :parameter counts:
+        An array with the number of values used in each row (e.g. the
+        `num_npd` column)
+    :parameter int width:
+        The number of numbered columns
+    :returns:
+        A 2D boolean array (number of rows x width), True for the values
+        used
+    """
+    return np.arange(width)[None, :] < np.asarray(counts)[:, None]
+
+
+def get_ragged_from_matrix(matrix, counts):
+    """
+    Convert the values stored in a 2D array (e.g. the numbered columns of a
+    distribution) into a ragged array
+
+    :parameter matrix:
+        A 2D array (number of rows x maximum number of values)
+    :parameter counts:
+        An array with the number of values used in each row
+    :returns:
+        An array with the values used and an array with the offsets of the
+        first value of each row
+    """
+    counts = np.minimum(np.asarray(counts, dtype=int), matrix.shape[1])
+    used = get_used_mask(counts, matrix.shape[1])
+    return matrix[used], np.concatenate([[0], np.cumsum(counts)])
+
+
+def get_matrix_from_ragged(values, offsets, width=None):
+    """
+    Convert a ragged array into a 2D array padded with NaN
+
+    :parameter values:
+        An array with the values
+    :parameter offsets:
+        An array with the offsets of the first value of each row
+    :parameter int width:
+        The number of columns. When None it is the maximum number of values
+        in a row.
+    :returns:
+        A 2D array (number of rows x width)
+    """
+    counts = np.diff(offsets)
+    if width is None:
+        width = counts.max() if len(counts) else 0
+    out = np.empty((len(counts), width))
+    out.fill(np.nan)
+    out[get_used_mask(counts, width)] = values
+    return out
+
+
+def take_ragged(values, offsets, idx):
+    """
+    Select a set of rows of a ragged array
+
+    :parameter values:
+        An array with the values
+    :parameter offsets:
+        An array with the offsets of the first value of each row
+    :parameter idx:
+        An array with the indexes of the rows selected
+    :returns:
+        The values and the offsets of the rows selected
+    """
+    idx = np.asarray(idx, dtype=int)
+    counts = np.diff(offsets)[idx]
+    new_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(int)
+    pos = (np.repeat(offsets[idx] - new_offsets[:-1], counts) +
+           np.arange(new_offsets[-1]))
+    return values[pos], new_offsets
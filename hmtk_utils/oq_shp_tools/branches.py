@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+Module for creating the branches of a logic tree by perturbing the
+parameters of the area sources of a model. The model is parsed once; each
+branch is a new :class:`AreaSourceTable` sharing all the arrays of the
+original one except the perturbed columns. The geometry is serialized only
+once: when the branches are written as shapefiles the files of the first
+branch are copied and only the perturbed columns are written.
+
+A branch is described by a dictionary with a name and a list of
+perturbations, e.g.::
+
+    {"name": "b_low",
+     "perturbations": [{"column": "b_value", "op": "add", "value": -0.1},
+                       {"column": "mag_scal_r", "op": "set",
+                        "value": "WC1994", "ids": ["1", "2"]}]}
+
+Columns can be given with the names of the table or with the names of the
+fields of the preformatted shapefiles. The operations are `set`, `add`
+and `scale`; `ids` optionally restricts a perturbation to some sources.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from nrml import get_geometry_fragments, write_nrml
+from parsers import parse_area_source_table
+from source_table import AreaSourceTable, STRING_COLUMNS, FLOAT_COLUMNS, \
+    RAGGED_COLUMNS, MAPPING_FIELDS, MAPPING_RAGGED_FIELDS
+from writers import get_table_geometries, write_table_shps
+
+OPERATIONS = ('set', 'add', 'scale')
+
+# Names of the shapefile fields and of the ragged columns
+_FIELD_NAMES = dict((field, name) for name, field in MAPPING_FIELDS.items())
+_FIELD_NAMES.update((prefix.rstrip('_'), name) for name, (_, prefix) in
+                    MAPPING_RAGGED_FIELDS.items())
+_RAGGED_OFFSETS = dict((name, offsets) for offsets, names in RAGGED_COLUMNS
+                       for name in names)
+
+
+def load_branch_spec(filename):
+    """
+    Read the description of the branches from a json file
+
+    :parameter str filename:
+        The name of the file. It contains a list of branches or a
+        dictionary with the list in the `branches` key.
+    :returns:
+        A list of dictionaries
+    """
+    if not os.path.isfile(filename):
+        raise IOError("The file %s doesn't exists" % filename)
+    with open(filename) as fin:
+        spec = json.load(fin)
+    if isinstance(spec, dict):
+        spec = spec['branches']
+    return spec
+
+
+def _get_column_name(column):
+    """
+    :returns:
+        The name of a column of the table
+    """
+    name = _FIELD_NAMES.get(column, column)
+    if (name not in STRING_COLUMNS + FLOAT_COLUMNS and
+            name not in _RAGGED_OFFSETS):
+        raise ValueError('Unknown column: %s' % column)
+    if name in ('id', 'mfd_type'):
+        raise ValueError('The column %s cannot be perturbed' % column)
+    return name
+
+
+def apply_perturbations(table, perturbations):
+    """
+    Apply a set of perturbations to the columns of a table
+
+    :parameter table:
+        An instance of :class:`AreaSourceTable`
+    :parameter list perturbations:
+        A list of dictionaries with the keys `column`, `op`, `value` and,
+        optionally, `ids`
+    :returns:
+        A new instance of :class:`AreaSourceTable`. The columns not
+        perturbed are shared with the original table.
+    """
+    columns = table.get_columns()
+    copied = set()
+    for pert in perturbations:
+        name = _get_column_name(pert['column'])
+        operation = pert.get('op', 'set')
+        if operation not in OPERATIONS:
+            raise ValueError('Unknown operation: %s' % operation)
+        if name in STRING_COLUMNS and operation != 'set':
+            raise ValueError('Only set can be used for %s' % name)
+
+        mask = np.ones(len(table), dtype=bool)
+        if pert.get('ids') is not None:
+            mask = np.in1d(np.asarray(table.id, dtype=object),
+                           np.asarray(pert['ids'], dtype=object))
+        if name in _RAGGED_OFFSETS:
+            mask = np.repeat(mask, np.diff(columns[_RAGGED_OFFSETS[name]]))
+
+        if name not in copied:
+            columns[name] = np.array(columns[name])
+            if name in STRING_COLUMNS:
+                columns[name] = columns[name].astype(object)
+            copied.add(name)
+        values = columns[name]
+        if operation == 'set':
+            values[mask] = pert['value']
+        elif operation == 'add':
+            values[mask] += pert['value']
+        else:
+            values[mask] *= pert['value']
+    return AreaSourceTable(**columns)
+
+
+def expand_branches(sources, spec, out_directory, out_format='nrml',
+                    name='model'):
+    """
+    Create the variants of a source model
+
+    :parameter sources:
+        The name of a shapefile or of a nrml file (see
+        :func:`hmtk_utils.oq_shp_tools.parsers.parse_area_source_table`) or
+        an instance of :class:`AreaSourceTable`
+    :parameter spec:
+        A list of branches (see the documentation of the module) or the
+        name of a json file (see :func:`load_branch_spec`)
+    :parameter str out_directory:
+        The folder where the variants are written
+    :parameter str out_format:
+        'nrml' to create one nrml file for each branch or 'shp' to create
+        one set of shapefiles for each branch
+    :parameter str name:
+        The name of the source model
+    :returns:
+        A list with the names of the files (nrml) or the root names of the
+        shapefiles (shp) created
+    """
+    if out_format not in ('nrml', 'shp'):
+        raise ValueError('Unsupported format: %s' % out_format)
+    if not isinstance(spec, (list, tuple)):
+        spec = load_branch_spec(spec)
+    table = sources
+    if not isinstance(sources, AreaSourceTable):
+        table = parse_area_source_table(sources)
+    if out_format == 'nrml':
+        geometries = get_geometry_fragments(table)
+    else:
+        geometries = get_table_geometries(table)
+
+    out = []
+    base = None
+    for branch in spec:
+        variant = apply_perturbations(table, branch.get('perturbations', []))
+        if out_format == 'nrml':
+            filename = os.path.join(out_directory, branch['name'] + '.xml')
+            write_nrml(variant, filename, '%s %s' % (name, branch['name']),
+                       geometries)
+            out.append(filename)
+        else:
+            # The shapefiles of the first branch are copied and only the
+            # perturbed columns are written
+            write_table_shps(variant, out_directory, branch['name'],
+                             geometries, base)
+            if base is None:
+                base = (branch['name'], variant)
+            out.append(os.path.join(out_directory, branch['name']))
+    return out
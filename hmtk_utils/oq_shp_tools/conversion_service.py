@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+Module implementing a local service for converting source models on
+demand (nrml to shapefile and shapefile to nrml). Conversion jobs run in a
+bounded pool of processes; identical requests (same conversion, same
+options and same input content) share the same job and the same archive.
+Finished archives can be streamed back in chunks.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+
+from openquake.nrmllib.hazard.writers import SourceModelXMLWriter
+from openquake.nrmllib.models import SourceModel
+
+from parsers import parse_area_source_shp
+from writers import write_shps
+
+SHAPEFILE_EXTENSIONS = ('.shp', '.shx', '.dbf', '.prj', '.cpg', '.qpj')
+
+
+def _zip_directory(path, archive):
+    """
+    Create a zip archive with the files in a folder. The archive is written
+    to a temporary file and then renamed.
+    """
+    tmp_archive = archive + '.tmp'
+    with zipfile.ZipFile(tmp_archive, 'w', zipfile.ZIP_DEFLATED) as zfile:
+        for name in sorted(os.listdir(path)):
+            zfile.write(os.path.join(path, name), name)
+    os.rename(tmp_archive, archive)
+
+
+def convert_nrml_to_shp(input_path, archive, rootname='as', **options):
+    """
+    Convert a nrml file into a set of shapefiles stored in a zip archive
+
+    :parameter str input_path:
+        The name of the nrml file
+    :parameter str archive:
+        The name of the zip archive
+    :parameter str rootname:
+        The root name of the shapefiles
+    :parameter options:
+        Other options of :func:`hmtk_utils.oq_shp_tools.writers.write_shps`
+    """
+    tmp_path = tempfile.mkdtemp()
+    try:
+        write_shps(input_path, tmp_path + os.sep, rootname=rootname,
+                   **options)
+        _zip_directory(tmp_path, archive)
+    finally:
+        shutil.rmtree(tmp_path)
+
+
+def convert_shp_to_nrml(input_path, archive, name='model', **options):
+    """
+    Convert a shapefile with area sources into a nrml file stored in a zip
+    archive
+
+    :parameter str input_path:
+        The name of the shapefile
+    :parameter str archive:
+        The name of the zip archive
+    :parameter str name:
+        The name of the source model (and of the nrml file)
+    :parameter options:
+        Other options of
+        :func:`hmtk_utils.oq_shp_tools.parsers.parse_area_source_shp`
+    """
+    sources = parse_area_source_shp(input_path, **options)
+    tmp_path = tempfile.mkdtemp()
+    try:
+        SourceModelXMLWriter(os.path.join(tmp_path, name + '.xml')).serialize(
+            SourceModel(name=name, sources=list(sources)))
+        _zip_directory(tmp_path, archive)
+    finally:
+        shutil.rmtree(tmp_path)
+
+
+CONVERTERS = {'nrml_to_shp': convert_nrml_to_shp,
+              'shp_to_nrml': convert_shp_to_nrml}
+
+
+def _get_input_files(input_path):
+    """
+    :returns:
+        The list of files composing an input (all the files of a shapefile)
+    """
+    root, ext = os.path.splitext(input_path)
+    if ext.lower() != '.shp':
+        return [input_path]
+    return [root + extension for extension in SHAPEFILE_EXTENSIONS if
+            os.path.isfile(root + extension)]
+
+
+def get_job_key(kind, input_path, options):
+    """
+    Compute the key identifying a conversion: a hash of the kind of
+    conversion, of its options and of the content of the input files.
+
+    :parameter str kind:
+        The kind of conversion
+    :parameter str input_path:
+        The name of the input file
+    :parameter dict options:
+        The options of the conversion
+    :returns:
+        A string
+    """
+    if not os.path.isfile(input_path):
+        raise IOError("The input file %s doesn't exists" % input_path)
+    sha = hashlib.sha1()
+    sha.update(kind)
+    sha.update(json.dumps(options, sort_keys=True))
+    for filename in _get_input_files(input_path):
+        sha.update(os.path.splitext(filename)[1].lower())
+        with open(filename, 'rb') as fin:
+            for chunk in iter(lambda: fin.read(1 << 20), ''):
+                sha.update(chunk)
+    return sha.hexdigest()
+
+
+class ConversionJob(object):
+    """
+    A conversion job
+
+    :parameter str key:
+        The key of the job (see :func:`get_job_key`)
+    :parameter str archive:
+        The name of the archive created by the job
+    :parameter result:
+        The :class:`multiprocessing.pool.AsyncResult` of the job or None
+        when the archive already exists
+    """
+
+    def __init__(self, key, archive, result=None):
+        self.key = key
+        self.archive = archive
+        self.result = result
+
+    def ready(self):
+        """
+        :returns:
+            True if the job is completed
+        """
+        return self.result is None or self.result.ready()
+
+    def wait(self, timeout=None):
+        """
+        Wait for the completion of the job. Errors raised by the conversion
+        are raised again here.
+
+        :parameter float timeout:
+            Maximum time [s] to wait
+        :returns:
+            The name of the archive
+        """
+        if self.result is not None:
+            error = self.result.get(timeout)
+            if error is not None:
+                raise error
+        return self.archive
+
+
+class ConversionService(object):
+    """
+    A service running conversion jobs in a pool of processes
+
+    :parameter str out_directory:
+        The folder where the archives are stored
+    :parameter int processes:
+        The number of processes running conversions
+    :parameter int max_pending:
+        The maximum number of jobs running or waiting. When the limit is
+        reached :meth:`submit` waits for a job to be completed.
+    :parameter dict converters:
+        Additional conversion functions. Each function takes the name of
+        the input file, the name of the archive and the options of the
+        conversion.
+    """
+
+    def __init__(self, out_directory, processes=2, max_pending=None,
+                 converters=None):
+        if not os.path.isdir(out_directory):
+            os.makedirs(out_directory)
+        self.out_directory = out_directory
+        self.converters = dict(CONVERTERS)
+        self.converters.update(converters or {})
+        self.pool = multiprocessing.Pool(processes)
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_pending or
+                                                4 * processes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Wait for the jobs and terminate the processes
+        """
+        self.pool.close()
+        self.pool.join()
+
+    def _done(self, key, error):
+        """
+        Release the slot of a job. Failed jobs are forgotten so they can be
+        submitted again.
+        """
+        self.slots.release()
+        if error is not None:
+            with self.lock:
+                self.jobs.pop(key, None)
+
+    def submit(self, kind, input_path, **options):
+        """
+        Submit a conversion. When an identical conversion is running or
+        completed its job is returned.
+
+        :parameter str kind:
+            The kind of conversion (e.g. 'nrml_to_shp' or 'shp_to_nrml')
+        :parameter str input_path:
+            The name of the input file
+        :parameter options:
+            The options of the conversion
+        :returns:
+            An instance of :class:`ConversionJob`
+        """
+        if kind not in self.converters:
+            raise ValueError('Unsupported conversion: %s' % kind)
+        key = get_job_key(kind, input_path, options)
+        archive = os.path.join(self.out_directory, key + '.zip')
+        with self.lock:
+            if key in self.jobs:
+                return self.jobs[key]
+            if os.path.isfile(archive):
+                self.jobs[key] = ConversionJob(key, archive)
+                return self.jobs[key]
+
+        self.slots.acquire()
+        with self.lock:
+            # Check again since the lock was released while waiting
+            if key in self.jobs:
+                self.slots.release()
+                return self.jobs[key]
+            callback = lambda error, key=key: self._done(key, error)
+            result = self.pool.apply_async(
+                _run_converter, (self.converters[kind], input_path, archive,
+                                 options),
+                callback=callback)
+            self.jobs[key] = ConversionJob(key, archive, result)
+            return self.jobs[key]
+
+    def stream(self, job, chunk_size=1 << 16, timeout=None):
+        """
+        Stream the archive created by a job
+
+        :parameter job:
+            An instance of :class:`ConversionJob`
+        :parameter int chunk_size:
+            The size of the chunks [bytes]
+        :parameter float timeout:
+            Maximum time [s] to wait for the completion of the job
+        :returns:
+            A generator of strings
+        """
+        archive = job.wait(timeout)
+        with open(archive, 'rb') as fin:
+            for chunk in iter(lambda: fin.read(chunk_size), ''):
+                yield chunk
+
+
+def _run_converter(converter, input_path, archive, options):
+    """
+    Run a conversion function (executed in the processes of the pool)
+
+    :returns:
+        None or the exception raised by the conversion
+    """
+    try:
+        converter(input_path, archive, **options)
+    except Exception as error:
+        return error
+    return None
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+Module for comparing two versions of a model with area sources. The
+models are stored in tables (see
+:class:`hmtk_utils.oq_shp_tools.source_table.AreaSourceTable`) joined on
+the ID of the sources; the columns of the sources in both models are
+compared at once and only the differences are collected.
+"""
+
+import numpy as np
+
+from attribute_tools import take_ragged
+from parsers import parse_area_source_table
+from source_table import AreaSourceTable, RAGGED_COLUMNS
+
+# Groups of columns compared (one entry in the report for each group)
+SCALAR_GROUPS = (('name', ('name',)),
+                 ('trt', ('trt',)),
+                 ('mag_scale_rel', ('mag_scale_rel',)),
+                 ('rupt_aspect_ratio', ('rupt_aspect_ratio',)),
+                 ('depths', ('upper_seismo_depth', 'lower_seismo_depth')),
+                 ('mfd', ('mfd_type', 'a_val', 'b_val', 'min_mag',
+                          'max_mag', 'bin_width')))
+
+RAGGED_GROUPS = (('mfd', 'rate_offsets'),
+                 ('nodal_plane_dist', 'npd_offsets'),
+                 ('hypo_depth_dist', 'hdd_offsets'),
+                 ('geometry', 'ring_offsets'))
+
+_RAGGED_NAMES = dict(RAGGED_COLUMNS)
+
+
+def _get_table(model):
+    """
+    :returns:
+        An instance of :class:`AreaSourceTable`
+    """
+    if isinstance(model, AreaSourceTable):
+        return model
+    return parse_area_source_table(model)
+
+
+def join_ids(old_ids, new_ids):
+    """
+    Join two sets of IDs
+
+    :parameter old_ids:
+        The IDs of the first model
+    :parameter new_ids:
+        The IDs of the second model
+    :returns:
+        The indexes of the common IDs in the two models and the indexes of
+        the IDs only in the first model and only in the second model
+    """
+    old_ids = np.asarray(old_ids, dtype=object)
+    new_ids = np.asarray(new_ids, dtype=object)
+    for ids in (old_ids, new_ids):
+        if len(np.unique(ids)) != len(ids):
+            raise ValueError('The source IDs of a model are not unique')
+    _, old_idx, new_idx = np.intersect1d(old_ids, new_ids,
+                                         return_indices=True)
+    removed = np.setdiff1d(np.arange(len(old_ids)), old_idx)
+    added = np.setdiff1d(np.arange(len(new_ids)), new_idx)
+    return old_idx, new_idx, removed, added
+
+
+def _differ(old, new, tolerance):
+    """
+    Compare two arrays element by element. NaN values are equal.
+    """
+    if old.dtype.kind in 'fi' and new.dtype.kind in 'fi':
+        old = old.astype(float)
+        new = new.astype(float)
+        with np.errstate(invalid='ignore'):
+            same = np.abs(old - new) <= tolerance
+        return ~(same | (np.isnan(old) & np.isnan(new)))
+    return np.array([oval != nval for oval, nval in zip(old, new)],
+                    dtype=bool)
+
+
+def _get_ragged_changes(old, new, offsets, old_idx, new_idx, tolerance):
+    """
+    Compare the ragged columns of the sources in the two tables
+
+    :returns:
+        A boolean array (number of common sources) which is True when the
+        number of values or one of the values is different
+    """
+    old_counts = np.diff(getattr(old, offsets))[old_idx]
+    new_counts = np.diff(getattr(new, offsets))[new_idx]
+    changed = old_counts != new_counts
+    same = np.nonzero(~changed)[0]
+    if not len(same):
+        return changed
+    row = np.repeat(np.arange(len(same)), old_counts[same])
+    for name in _RAGGED_NAMES[offsets]:
+        old_values, _ = take_ragged(getattr(old, name),
+                                    getattr(old, offsets), old_idx[same])
+        new_values, _ = take_ragged(getattr(new, name),
+                                    getattr(new, offsets), new_idx[same])
+        diff = _differ(old_values, new_values, tolerance)
+        changed[same] |= np.bincount(row[diff], minlength=len(same)) > 0
+    return changed
+
+
+def _get_ragged_values(table, offsets, idx):
+    """
+    :returns:
+        The values of the ragged columns of a source
+    """
+    low, upp = getattr(table, offsets)[idx], getattr(table, offsets)[idx + 1]
+    return dict((name, getattr(table, name)[low:upp].tolist()) for name in
+                _RAGGED_NAMES[offsets])
+
+
+def _get_scalar(value):
+    """
+    :returns:
+        A value which can be saved in json (None for NaN)
+    """
+    if isinstance(value, (float, np.floating)):
+        return None if np.isnan(value) else float(value)
+    return value
+
+
+def diff_models(old, new, tolerance=1e-6, geometry_tolerance=1e-5):
+    """
+    Compare two models
+
+    :parameter old:
+        The first model: an instance of :class:`AreaSourceTable` or the
+        name of a shapefile or of a nrml file
+    :parameter new:
+        The second model
+    :parameter float tolerance:
+        The tolerance used to compare numbers
+    :parameter float geometry_tolerance:
+        The tolerance [degrees] used to compare the coordinates of the
+        vertices
+    :returns:
+        A dictionary with the IDs of the sources removed and added, the
+        number of sources not changed and, for each changed source, the
+        old and new values of the groups of columns changed
+    """
+    old = _get_table(old)
+    new = _get_table(new)
+    old_idx, new_idx, removed, added = join_ids(old.id, new.id)
+
+    # Changes of each group of columns for all the common sources
+    changes = {}
+    for group, names in SCALAR_GROUPS:
+        changed = np.zeros(len(old_idx), dtype=bool)
+        for name in names:
+            changed |= _differ(getattr(old, name)[old_idx],
+                               getattr(new, name)[new_idx], tolerance)
+        changes[group] = changed
+    for group, offsets in RAGGED_GROUPS:
+        tol = geometry_tolerance if group == 'geometry' else tolerance
+        changed = _get_ragged_changes(old, new, offsets, old_idx, new_idx,
+                                      tol)
+        changes[group] = changes.get(group, False) | changed
+
+    # Values of the changed sources only
+    groups = dict(SCALAR_GROUPS)
+    ragged = dict(RAGGED_GROUPS)
+    any_change = np.zeros(len(old_idx), dtype=bool)
+    for changed in changes.values():
+        any_change |= changed
+    out = []
+    for i in np.nonzero(any_change)[0]:
+        oidx, nidx = old_idx[i], new_idx[i]
+        fields = {}
+        for group in sorted(changes):
+            if not changes[group][i]:
+                continue
+            values = [{}, {}]
+            for table, idx, val in ((old, oidx, values[0]),
+                                    (new, nidx, values[1])):
+                for name in groups.get(group, ()):
+                    val[name] = _get_scalar(getattr(table, name)[idx])
+                if group in ragged:
+                    val.update(_get_ragged_values(table, ragged[group], idx))
+            fields[group] = values
+        out.append({'src_id': old.id[oidx], 'changes': fields})
+
+    return {'removed': [old.id[i] for i in removed],
+            'added': [new.id[i] for i in added],
+            'changed': out,
+            'num_unchanged': int(len(old_idx) - any_change.sum())}
+
+
+def get_diff_summary(diff, max_sources=20):
+    """
+    Create a summary of the differences between two models
+
+    :parameter dict diff:
+        The differences as returned by :func:`diff_models`
+    :parameter int max_sources:
+        The maximum number of sources listed for each kind of difference
+    :returns:
+        A string
+    """
+    def _ids(ids):
+        text = ', '.join(str(sid) for sid in ids[:max_sources])
+        if len(ids) > max_sources:
+            text += ', ... (%d more)' % (len(ids) - max_sources)
+        return text
+
+    lines = ['Sources added: %d' % len(diff['added']),
+             'Sources removed: %d' % len(diff['removed']),
+             'Sources changed: %d' % len(diff['changed']),
+             'Sources unchanged: %d' % diff['num_unchanged']]
+    if diff['added']:
+        lines.append('Added: %s' % _ids(diff['added']))
+    if diff['removed']:
+        lines.append('Removed: %s' % _ids(diff['removed']))
+    counts = {}
+    for src in diff['changed']:
+        for group in src['changes']:
+            counts.setdefault(group, []).append(src['src_id'])
+    for group in sorted(counts):
+        lines.append('Changed %s (%d): %s' % (group, len(counts[group]),
+                                              _ids(counts[group])))
+    return '\n'.join(lines)
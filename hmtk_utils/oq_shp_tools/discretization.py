@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+Module for previewing the discretization of area sources into point
+sources. The grids of all the polygons are generated at once and filtered
+with a vectorized point-in-polygon test; the number of points is then
+combined with the number of magnitude bins, nodal planes and hypocentral
+depths of each source to estimate the number of ruptures and the memory
+required by the hazard calculation.
+"""
+
+import numpy as np
+
+import polygons as poly
+
+from openquake.nrmllib.models import SourceModel
+from source_table import AreaSourceTable, TGR_MFD, INCR_MFD
+
+# Rough size [bytes] of a point source and of a rupture in the engine
+BYTES_PER_POINT = 600
+BYTES_PER_RUPTURE = 1200
+
+
+def get_grids(lons, lats, offsets, spacing):
+    """
+    Create a regular grid covering the bounding box of each ring. The
+    spacing along the longitude is computed at the central latitude of each
+    box and the grid is centred in the box.
+
+    :parameter lons:
+        An array with the longitudes of the vertices
+    :parameter lats:
+        An array with the latitudes of the vertices
+    :parameter offsets:
+        An array with the offsets of the rings
+    :parameter float spacing:
+        The grid spacing [km]
+    :returns:
+        The longitudes and latitudes of the points and the offsets (number
+        of rings + 1) of the first point of each grid
+    """
+    bboxes = poly.get_bounding_boxes(lons, lats, offsets)
+    dlat = spacing / poly.DEG_TO_KM
+    dlon = dlat / np.cos(np.radians((bboxes[:, 1] + bboxes[:, 3]) / 2.))
+    numx = np.floor((bboxes[:, 2] - bboxes[:, 0]) / dlon).astype(int) + 1
+    numy = np.floor((bboxes[:, 3] - bboxes[:, 1]) / dlat).astype(int) + 1
+    xstart = bboxes[:, 0] + (bboxes[:, 2] - bboxes[:, 0] -
+                             (numx - 1) * dlon) / 2.
+    ystart = bboxes[:, 1] + (bboxes[:, 3] - bboxes[:, 1] -
+                             (numy - 1) * dlat) / 2.
+
+    counts = numx * numy
+    grid_offsets = np.concatenate([[0], np.cumsum(counts)])
+    idx = np.repeat(np.arange(len(counts)), counts)
+    local = np.arange(grid_offsets[-1]) - grid_offsets[idx]
+    xpnt = xstart[idx] + (local % numx[idx]) * dlon[idx]
+    ypnt = ystart[idx] + (local // numx[idx]) * dlat
+    return xpnt, ypnt, grid_offsets
+
+
+def discretize_rings(lons, lats, offsets, spacing):
+    """
+    Discretize a set of rings into points
+
+    :parameter lons:
+        An array with the longitudes of the vertices
+    :parameter lats:
+        An array with the latitudes of the vertices
+    :parameter offsets:
+        An array with the offsets of the rings
+    :parameter float spacing:
+        The grid spacing [km]
+    :returns:
+        The longitudes and latitudes of the points inside the rings and the
+        offsets (number of rings + 1) of the first point of each ring
+    """
+    xpnt, ypnt, grid_offsets = get_grids(lons, lats, offsets, spacing)
+    idx = poly.get_ring_index(grid_offsets)
+    inside = poly.get_points_in_rings(xpnt, ypnt, idx, lons, lats, offsets)
+    counts = np.bincount(idx[inside], minlength=len(offsets) - 1)
+    return (xpnt[inside], ypnt[inside],
+            np.concatenate([[0], np.cumsum(counts)]))
+
+
+def get_num_magnitude_bins(table, bin_width=0.1):
+    """
+    :parameter table:
+        An instance of :class:`AreaSourceTable`
+    :parameter float bin_width:
+        The width of the magnitude bins used to discretize the truncated
+        Gutenberg-Richter distributions
+    :returns:
+        An array with the number of magnitude bins of each source
+    """
+    out = np.zeros(len(table), dtype=int)
+    tgr = table.mfd_type == TGR_MFD
+    out[tgr] = np.maximum(np.round(
+        (table.max_mag[tgr] - table.min_mag[tgr]) / bin_width), 0)
+    incr = table.mfd_type == INCR_MFD
+    out[incr] = np.diff(table.rate_offsets)[incr]
+    return out
+
+
+def _get_table(sources):
+    """
+    :returns:
+        An instance of :class:`AreaSourceTable`
+    """
+    if isinstance(sources, SourceModel):
+        sources = sources.sources
+    if isinstance(sources, AreaSourceTable):
+        return sources
+    return AreaSourceTable.from_sources(sources)
+
+
+def get_discretization_summary(sources, spacing=5.0, bin_width=0.1):
+    """
+    Estimate the number of point sources and ruptures generated by the
+    discretization of a set of area sources. Each point generates one
+    rupture for each magnitude bin, nodal plane and hypocentral depth.
+
+    :parameter sources:
+        An instance of :class:`AreaSourceTable`, an instance of
+        :class:`SourceModel` or a list of :class:`AreaSource` instances
+    :parameter float spacing:
+        The spacing [km] of the discretization grid (i.e. the
+        `area_source_discretization` parameter of the engine)
+    :parameter float bin_width:
+        The width of the magnitude bins used to discretize the truncated
+        Gutenberg-Richter distributions
+    :returns:
+        A dictionary with the IDs of the sources, the number of points and
+        ruptures of each source, their totals and the estimated memory
+        [bytes]
+    """
+    table = _get_table(sources)
+    _, _, point_offsets = discretize_rings(table.lons, table.lats,
+                                           table.ring_offsets, spacing)
+    num_points = np.diff(point_offsets)
+    num_ruptures = (num_points * get_num_magnitude_bins(table, bin_width) *
+                    np.diff(table.npd_offsets) * np.diff(table.hdd_offsets))
+    out = {'ids': list(table.id),
+           'num_points': num_points,
+           'num_ruptures': num_ruptures,
+           'total_points': int(num_points.sum()),
+           'total_ruptures': int(num_ruptures.sum())}
+    out['memory'] = (out['total_points'] * BYTES_PER_POINT +
+                     out['total_ruptures'] * BYTES_PER_RUPTURE)
+    return out
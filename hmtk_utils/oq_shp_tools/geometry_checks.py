@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+Module for checking (and repairing) the geometry of the polygons describing
+area sources. The checks on the vertices are vectorized over the whole
+model while the topological ones (e.g. self-intersections) are performed
+by OGR across a pool of processes.
+"""
+
+import multiprocessing
+import os
+
+import numpy as np
+import osgeo.ogr as ogr
+
+import polygons as poly
+import shapefile_tools as shpt
+
+from openquake.nrmllib.hazard.parsers import SourceModelParser
+from openquake.nrmllib.hazard.writers import SourceModelXMLWriter
+from openquake.nrmllib.models import AreaSource
+
+UNCLOSED_RING = 'unclosed_ring'
+DUPLICATE_VERTICES = 'duplicate_vertices'
+TOO_FEW_VERTICES = 'too_few_vertices'
+WRONG_WINDING = 'wrong_winding'
+INVALID_GEOMETRY = 'invalid_geometry'
+UNREPAIRABLE_GEOMETRY = 'unrepairable_geometry'
+
+
+def _check_validity(args):
+    """
+    Check the validity of a chunk of polygons with OGR.
+
+    :parameter tuple args:
+        The longitudes, latitudes and offsets of the rings and a flag
+        indicating if invalid geometries must be repaired
+    :returns:
+        A list of tuples (one for each polygon) containing a boolean (True
+        when the polygon is valid) and the WKB of the repaired geometry
+        (None when the polygon is valid or not repaired)
+    """
+    lons, lats, offsets, repair = args
+    out = []
+    for i in range(len(offsets) - 1):
+        wkb = poly.get_polygon_wkb(lons[offsets[i]:offsets[i + 1]],
+                                   lats[offsets[i]:offsets[i + 1]])
+        geom = ogr.CreateGeometryFromWkb(wkb)
+        if geom is not None and geom.IsValid():
+            out.append((True, None))
+            continue
+        fixed = None
+        if repair and geom is not None:
+            if hasattr(geom, 'MakeValid'):
+                fixed = geom.MakeValid()
+            else:
+                fixed = geom.Buffer(0)
+            fixed = bytes(fixed.ExportToWkb()) if fixed is not None else None
+        out.append((False, fixed))
+    return out
+
+
+def _get_chunks(lons, lats, offsets, repair, num_chunks):
+    """
+    Split the rings into chunks
+    """
+    num = len(offsets) - 1
+    bounds = np.unique(np.linspace(0, num, num_chunks + 1).astype(int))
+    chunks = []
+    for low, upp in zip(bounds[:-1], bounds[1:]):
+        chunks.append((lons[offsets[low]:offsets[upp]],
+                       lats[offsets[low]:offsets[upp]],
+                       offsets[low:upp + 1] - offsets[low],
+                       repair))
+    return chunks
+
+
+def _get_largest_polygon(wkb):
+    """
+    Get the largest polygon included in a geometry (repairing a polygon can
+    create a collection of geometries)
+
+    :returns:
+        An instance of :class:`ogr.Geometry` or None when the geometry does
+        not include a polygon (e.g. a ring collapsed to a line)
+    """
+    geom = ogr.CreateGeometryFromWkb(wkb)
+    if geom is None or geom.IsEmpty():
+        return None
+    if geom.GetGeometryType() == ogr.wkbPolygon:
+        return geom
+    parts = [geom.GetGeometryRef(i) for i in range(geom.GetGeometryCount())]
+    parts = [part for part in parts if not part.IsEmpty() and
+             part.GetGeometryType() == ogr.wkbPolygon]
+    if not parts:
+        return None
+    return max(parts, key=lambda part: part.GetArea()).Clone()
+
+
+def check_polygons(lons, lats, offsets, require_closed=True, orientation=None,
+                   processes=None, repair=False):
+    """
+    Check a set of polygons.
+
+    :parameter lons:
+        An array with the longitudes of the vertices
+    :parameter lats:
+        An array with the latitudes of the vertices
+    :parameter offsets:
+        An array with the offsets of the rings
+    :parameter bool require_closed:
+        When True the last vertex of each ring must coincide with the first
+        one
+    :parameter str orientation:
+        The expected orientation of the rings ('cw' or 'ccw'). When None
+        the orientation is not checked.
+    :parameter int processes:
+        Number of processes used for the OGR checks. When None the number of
+        processes is equal to the number of CPUs. When 1 the checks are
+        performed in the current process.
+    :parameter bool repair:
+        When True the polygons are repaired
+    :returns:
+        A list containing for each polygon the list of the problems found
+        and, when `repair` is True, a list with the WKB of the repaired
+        polygons (None otherwise). The polygons whose repair does not
+        produce a polygon are reported as unrepairable and kept unchanged.
+    """
+    num = len(offsets) - 1
+    errors = [[] for _ in range(num)]
+
+    # Checks on the vertices
+    closed = poly.is_closed(lons, lats, offsets)
+    if require_closed:
+        for i in np.nonzero(~closed)[0]:
+            errors[i].append(UNCLOSED_RING)
+    dupl = poly.get_duplicate_vertices(lons, lats, offsets)
+    num_dupl = np.bincount(poly.get_ring_index(offsets)[dupl], minlength=num)
+    for i in np.nonzero(num_dupl)[0]:
+        errors[i].append(DUPLICATE_VERTICES)
+    num_distinct = np.diff(offsets) - num_dupl - closed
+    for i in np.nonzero(num_distinct < 3)[0]:
+        errors[i].append(TOO_FEW_VERTICES)
+    areas = poly.get_signed_areas(lons, lats, offsets)
+    if orientation is not None:
+        wrong = areas > 0 if orientation == 'cw' else areas < 0
+        for i in np.nonzero(wrong)[0]:
+            errors[i].append(WRONG_WINDING)
+
+    # Fix the problems on the vertices before running the topological checks
+    lons, lats, offsets = poly.remove_vertices(lons, lats, offsets, dupl)
+    lons, lats, offsets = poly.close_rings(lons, lats, offsets)
+    if orientation is not None:
+        lons, lats = poly.reverse_rings(lons, lats, offsets, wrong)
+
+    # Topological checks
+    processes = processes or multiprocessing.cpu_count()
+    chunks = _get_chunks(lons, lats, offsets, repair, processes * 4)
+    if processes > 1 and len(chunks) > 1:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_check_validity, chunks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_check_validity(chunk) for chunk in chunks]
+    results = [res for chunk in results for res in chunk]
+    for i, (valid, _) in enumerate(results):
+        if not valid:
+            errors[i].append(INVALID_GEOMETRY)
+    if not repair:
+        return errors, None
+
+    # Repaired geometries
+    geoms = []
+    for i, (valid, fixed) in enumerate(results):
+        if fixed is not None and _get_largest_polygon(fixed) is None:
+            errors[i].append(UNREPAIRABLE_GEOMETRY)
+            fixed = None
+        if fixed is not None:
+            geoms.append(fixed)
+        else:
+            geoms.append(poly.get_polygon_wkb(lons[offsets[i]:offsets[i + 1]],
+                                              lats[offsets[i]:offsets[i + 1]]))
+    return errors, geoms
+
+
+def get_report(errors, ids):
+    """
+    Create a report with the results of the checks
+
+    :parameter list errors:
+        A list containing for each polygon the list of problems found
+    :parameter ids:
+        A list with the IDs of the sources
+    :returns:
+        A dictionary
+    """
+    report = {'num_polygons': len(errors), 'num_with_errors': 0,
+              'polygons': []}
+    for i, (err, src_id) in enumerate(zip(errors, ids)):
+        if len(err):
+            report['polygons'].append({'index': i, 'src_id': src_id,
+                                       'errors': err})
+    report['num_with_errors'] = len(report['polygons'])
+    return report
+
+
+def _write_repaired_shp(layer, geoms, out_filename):
+    """
+    Create a copy of a layer with the repaired geometries
+    """
+    drv = ogr.GetDriverByName('ESRI Shapefile')
+    if os.path.exists(out_filename):
+        drv.DeleteDataSource(out_filename)
+    dsource = shpt.create_datasource(out_filename)
+    name = os.path.splitext(os.path.basename(out_filename))[0]
+    lyr = dsource.CreateLayer(name, layer.GetSpatialRef(), ogr.wkbPolygon)
+    defn = layer.GetLayerDefn()
+    for i in range(defn.GetFieldCount()):
+        lyr.CreateField(defn.GetFieldDefn(i))
+
+    layer.ResetReading()
+    for geom, feature in zip(geoms, layer):
+        feat = ogr.Feature(lyr.GetLayerDefn())
+        feat.SetFrom(feature)
+        feat.SetGeometry(ogr.CreateGeometryFromWkb(geom))
+        lyr.CreateFeature(feat)
+        feat.Destroy()
+    layer.ResetReading()
+    dsource.Destroy()
+
+
+def check_area_source_shp(filename, out_filename=None, report_filename=None,
+                          orientation='cw', processes=None):
+    """
+    Check the polygons in a preformatted shapefile containing area sources
+
+    :parameter str filename:
+        Name of the shapefile to be checked
+    :parameter str out_filename:
+        Name of the shapefile where the repaired polygons are saved. When
+        None the polygons are not repaired.
+    :parameter str report_filename:
+        Name of the file where the report is saved in json format
+    :parameter str orientation:
+        The expected orientation of the rings ('cw' for shapefiles)
+    :parameter int processes:
+        Number of processes used for the checks
+    :returns:
+        A dictionary with the report
+    """
+    if not os.path.isfile(filename):
+        raise IOError("This shapefile doesn't exists")
+    data_source = ogr.GetDriverByName('ESRI Shapefile').Open(filename, 0)
+    if data_source is None:
+        raise IOError("This shapefile cannot be opened")
+    layer = data_source.GetLayer()
+
+    lons, lats, offsets = shpt.get_ring_arrays(layer)
+    ids = shpt.get_field_arrays(layer, ['src_id']).get(
+        'src_id', [None] * (len(offsets) - 1))
+    errors, geoms = check_polygons(lons, lats, offsets,
+                                   orientation=orientation,
+                                   processes=processes,
+                                   repair=out_filename is not None)
+    if out_filename is not None:
+        _write_repaired_shp(layer, geoms, out_filename)
+    data_source.Destroy()
+
+    report = get_report(errors, ids)
+    if report_filename is not None:
+        shpt.write_report(report, report_filename)
+    return report
+
+
+def check_area_source_nrml(filename, out_filename=None, report_filename=None,
+                           processes=None):
+    """
+    Check the polygons of the area sources in a nrml file. The rings in a
+    nrml file are not closed and their orientation is not checked.
+
+    :parameter str filename:
+        Name of the nrml file to be checked
+    :parameter str out_filename:
+        Name of the nrml file where the model with the repaired polygons is
+        saved. When None the polygons are not repaired.
+    :parameter str report_filename:
+        Name of the file where the report is saved in json format
+    :parameter int processes:
+        Number of processes used for the checks
+    :returns:
+        A dictionary with the report
+    """
+    source_model = SourceModelParser(filename).parse()
+    source_model.sources = list(source_model.sources)
+    sources = [src for src in source_model.sources if
+               isinstance(src, AreaSource)]
+    lons, lats, offsets = poly.join_rings(
+        [poly.get_polygon_from_wkt(src.geometry.wkt) for src in sources])
+
+    errors, geoms = check_polygons(lons, lats, offsets,
+                                   require_closed=False,
+                                   processes=processes,
+                                   repair=out_filename is not None)
+    if out_filename is not None:
+        for src, geom in zip(sources, geoms):
+            src.geometry.wkt = _get_largest_polygon(geom).ExportToWkt()
+        SourceModelXMLWriter(out_filename).serialize(source_model)
+
+    report = get_report(errors, [src.id for src in sources])
+    if report_filename is not None:
+        shpt.write_report(report, report_filename)
+    return report
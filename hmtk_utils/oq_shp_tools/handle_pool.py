@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+Module with a pool of OGR data sources for long-lived services reading the
+same shapefiles many times. OGR data sources and layers are not thread
+safe hence each thread gets its own handles; a handle is reused by later
+calls of the same thread (nested calls get a second handle), reopened
+when the files change and closed after a period of inactivity.
+
+Example::
+
+    pool = HandlePool(max_idle=600)
+    with pool.open('model.shp') as data_source:
+        layer = data_source.GetLayer()
+"""
+
+import contextlib
+import os
+import threading
+import time
+
+from osgeo import gdal, ogr
+
+import shapefile_tools as shpt
+
+# Files of a shapefile checked to detect a change
+SIGNATURE_EXTENSIONS = ('.shp', '.shx', '.dbf', '.prj')
+
+
+def get_signature(filename):
+    """
+    :parameter str filename:
+        The name of a shapefile or a GDAL virtual path
+    :returns:
+        A tuple with the modification time and the size of the files of the
+        shapefile. It changes when any of the files is rewritten.
+    """
+    if filename.startswith('/vsi'):
+        stat = gdal.VSIStatL(filename)
+        return ((stat.mtime, stat.size),) if stat is not None else ()
+    root = os.path.splitext(filename)[0]
+    out = []
+    for ext in SIGNATURE_EXTENSIONS:
+        try:
+            stat = os.stat(root + ext)
+        except OSError:
+            continue
+        out.append((ext, stat.st_mtime, stat.st_size))
+    return tuple(out)
+
+
+class _Handle(object):
+    """
+    A data source opened by a thread
+    """
+
+    def __init__(self, data_source, signature):
+        self.data_source = data_source
+        self.signature = signature
+        self.count = 0
+        self.last_used = time.time()
+
+    def close(self):
+        if self.data_source is not None:
+            self.data_source.Destroy()
+            self.data_source = None
+
+
+class HandlePool(object):
+    """
+    A pool of read-only OGR data sources keyed by thread, path and
+    signature of the files (see :func:`get_signature`)
+
+    :parameter float max_idle:
+        The time [s] after which an unused handle is closed
+    :parameter str driver_name:
+        The name of the OGR driver
+    """
+
+    def __init__(self, max_idle=300., driver_name='ESRI Shapefile'):
+        self.max_idle = max_idle
+        self.driver_name = driver_name
+        self._handles = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(handles) for handles in self._handles.values())
+
+    def _acquire(self, path):
+        """
+        :returns:
+            A free handle of the current thread for a path. Handles of files
+            that changed are closed; a new handle is opened when all the
+            handles of the thread are in use (nested calls).
+        """
+        key = (threading.current_thread().ident, path)
+        signature = get_signature(path)
+        with self._lock:
+            handles = self._handles.setdefault(key, [])
+            for handle in [h for h in handles if h.count == 0 and
+                           h.signature != signature]:
+                handle.close()
+                handles.remove(handle)
+            free = [h for h in handles if h.count == 0]
+            if free:
+                handle = free[0]
+            else:
+                # The slot is reserved here and the file is opened without
+                # holding the lock
+                handle = _Handle(None, signature)
+                handles.append(handle)
+            handle.count += 1
+            handle.last_used = time.time()
+        if handle.data_source is not None:
+            return handle
+
+        data_source = ogr.GetDriverByName(self.driver_name).Open(path, 0)
+        with self._lock:
+            if data_source is None:
+                handles = self._handles[key]
+                handles.remove(handle)
+                if not handles:
+                    del self._handles[key]
+                raise IOError("The shapefile %s cannot be opened" % path)
+            handle.data_source = data_source
+        return handle
+
+    def _release(self, handle):
+        with self._lock:
+            handle.count -= 1
+            handle.last_used = time.time()
+        self.evict()
+
+    @contextlib.contextmanager
+    def open(self, filename):
+        """
+        Borrow the data source of a shapefile for the current thread. The
+        reading of the layers is reset.
+
+        :parameter str filename:
+            The name of the shapefile (zip and gzip archives are read
+            through the GDAL virtual file systems)
+        """
+        path = shpt.get_vsi_path(filename)
+        if not shpt.path_exists(path):
+            raise IOError("The shapefile %s doesn't exists" % filename)
+        handle = self._acquire(path)
+        try:
+            data_source = handle.data_source
+            for i in range(data_source.GetLayerCount()):
+                layer = data_source.GetLayer(i)
+                layer.SetAttributeFilter(None)
+                layer.SetSpatialFilter(None)
+                layer.ResetReading()
+            yield data_source
+        finally:
+            self._release(handle)
+
+    def evict(self, max_idle=None):
+        """
+        Close the handles not used for a given time
+
+        :parameter float max_idle:
+            The time [s]. When None the `max_idle` of the pool.
+        :returns:
+            The number of handles closed
+        """
+        max_idle = self.max_idle if max_idle is None else max_idle
+        now = time.time()
+        num = 0
+        with self._lock:
+            for key in list(self._handles):
+                handles = self._handles[key]
+                for handle in [h for h in handles if h.count == 0 and
+                               now - h.last_used >= max_idle]:
+                    handle.close()
+                    handles.remove(handle)
+                    num += 1
+                if not handles:
+                    del self._handles[key]
+        return num
+
+    def close(self):
+        """
+        Close all the handles not in use
+        """
+        return self.evict(0.)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
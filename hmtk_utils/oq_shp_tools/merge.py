@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+Module for merging several shapefiles with area sources into a single
+shapefile. The attribute tables are unified (the families of numbered
+fields, e.g. `strike_N` or `hdd_d_N`, are extended to the largest number
+used), duplicated source IDs are replaced and, optionally, the overlaps
+between the polygons are detected.
+"""
+
+import os
+import re
+
+import osgeo.ogr as ogr
+
+import projections as proj
+import shapefile_tools as shpt
+
+from source_table import MAPPING_RAGGED_FIELDS
+from topology import get_overlaps
+
+ID_FIELD = 'src_id'
+ID_WIDTH = 10
+
+_NUMBERED_FIELD = re.compile(r'^(.*_)(\d+)$')
+
+
+def _merge_attribute(old, new):
+    """
+    Merge the definitions of a field with the same name
+    """
+    if old['type'] == new['type']:
+        if old['type'] == 'String':
+            old['len'] = max(old['len'], new['len'])
+    elif set([old['type'], new['type']]) == set(['Integer', 'Real']):
+        old['type'] = 'Real'
+    else:
+        old['type'] = 'String'
+        old['len'] = max(old.get('len', 0), new.get('len', 0), 32)
+
+
+def get_merged_attributes(attribute_lists):
+    """
+    Get the union of the attribute tables of a set of layers. Numbered
+    fields with the same counter (e.g. `weight_N`, `strike_N`, `rake_N`
+    and `dip_N` counted by `num_npd`) are extended to the largest number
+    used in any layer and ordered as in the shapefiles created by
+    :func:`hmtk_utils.oq_shp_tools.writers.write_shps`.
+
+    :parameter list attribute_lists:
+        A list with the definitions of the fields of each layer (see
+        :func:`hmtk_utils.oq_shp_tools.shapefile_tools.add_attributes`)
+    :returns:
+        A list with the definitions of the fields
+    """
+    groups = dict((prefix, count) for count, prefix in
+                  MAPPING_RAGGED_FIELDS.values())
+    fields = {}
+    names = []
+    for attributes in attribute_lists:
+        for att in attributes:
+            if att['name'] in fields:
+                _merge_attribute(fields[att['name']], att)
+            else:
+                fields[att['name']] = dict(att)
+                names.append(att['name'])
+
+    # Maximum number of each family of fields and order of the prefixes
+    maxnum = {}
+    prefixes = []
+    for name in names:
+        match = _NUMBERED_FIELD.match(name)
+        if match and match.group(1) in groups:
+            count = groups[match.group(1)]
+            maxnum[count] = max(maxnum.get(count, 0), int(match.group(2)))
+            if match.group(1) not in prefixes:
+                prefixes.append(match.group(1))
+
+    out = []
+    done = set()
+    for name in names:
+        match = _NUMBERED_FIELD.match(name)
+        if not (match and match.group(1) in groups):
+            out.append(fields[name])
+            continue
+        count = groups[match.group(1)]
+        if count in done:
+            continue
+        done.add(count)
+        for i in range(1, maxnum[count] + 1):
+            for prefix in prefixes:
+                if groups[prefix] == count:
+                    lab = '%s%d' % (prefix, i)
+                    out.append(fields.get(lab, {'name': lab, 'type': 'Real'}))
+    return out
+
+
+def get_unique_ids(ids, width=ID_WIDTH):
+    """
+    Replace the repeated IDs. The first occurrence of an ID is retained
+    while the following ones get a suffix `_N`; the ID is truncated when
+    needed to fit the width of the field.
+
+    :parameter list ids:
+        The IDs of the sources
+    :parameter int width:
+        The maximum length of an ID
+    :returns:
+        A list with the new IDs and a list with the indexes of the IDs
+        replaced
+    """
+    ids = ['' if sid is None else sid for sid in ids]
+    used = set(ids)
+    seen = set()
+    counter = {}
+    out = []
+    remapped = []
+    for i, sid in enumerate(ids):
+        if sid in seen:
+            while True:
+                counter[sid] = counter.get(sid, 0) + 1
+                suffix = '_%d' % counter[sid]
+                new = sid[:width - len(suffix)] + suffix
+                if new not in used:
+                    break
+            used.add(new)
+            remapped.append(i)
+            sid = new
+        seen.add(sid)
+        out.append(sid)
+    return out, remapped
+
+
+def _open_layer(filename):
+    """
+    Open a shapefile
+    """
+    if not os.path.isfile(filename):
+        raise IOError("The shapefile %s doesn't exists" % filename)
+    data_source = ogr.GetDriverByName('ESRI Shapefile').Open(filename, 0)
+    if data_source is None:
+        raise IOError("The shapefile %s cannot be opened" % filename)
+    return data_source, data_source.GetLayer()
+
+
+def merge_area_source_shps(filenames, out_filename, check_overlaps=False,
+                           report_filename=None):
+    """
+    Merge a set of shapefiles with area sources. The polygons are copied
+    one at a time hence the inputs are never loaded in memory.
+
+    :parameter list filenames:
+        The names of the shapefiles to be merged
+    :parameter str out_filename:
+        The name of the shapefile created
+    :parameter bool check_overlaps:
+        When True the overlapping polygons are reported
+    :parameter str report_filename:
+        Name of the file where the report is saved in json format
+    :returns:
+        A dictionary with the report: the number of sources, the IDs
+        replaced and the overlaps found
+    """
+    # Schema and IDs of all the inputs
+    attribute_lists = []
+    ids = []
+    origin = []
+    for filename in filenames:
+        data_source, layer = _open_layer(filename)
+        attribute_lists.append(shpt.get_attribute_definitions(layer))
+        num = layer.GetFeatureCount()
+        ids.extend(shpt.get_field_arrays(layer, [ID_FIELD]).get(
+            ID_FIELD, [None] * num))
+        origin.extend((filename, i) for i in range(num))
+        data_source.Destroy()
+    attributes = get_merged_attributes(attribute_lists)
+    width = ID_WIDTH
+    for att in attributes:
+        if att['name'] == ID_FIELD and att['type'] == 'String':
+            width = att['len']
+    new_ids, remapped = get_unique_ids(ids, width)
+
+    # Create the output
+    drv = ogr.GetDriverByName('ESRI Shapefile')
+    if os.path.exists(out_filename):
+        drv.DeleteDataSource(out_filename)
+    out_source = shpt.create_datasource(out_filename)
+    name = os.path.splitext(os.path.basename(out_filename))[0]
+    out_layer = out_source.CreateLayer(name, proj.get_spatial_reference(),
+                                       ogr.wkbPolygon)
+    out_layer = shpt.add_attributes(out_layer, attributes)
+
+    # Copy the features
+    cnt = 0
+    wkbs = []
+    for filename in filenames:
+        data_source, layer = _open_layer(filename)
+        srs = layer.GetSpatialRef()
+        transformation = None
+        if srs is not None and not proj.is_wgs84(srs):
+            transformation = proj.get_transformation(srs, None)
+        for feature in layer:
+            feat = ogr.Feature(out_layer.GetLayerDefn())
+            feat.SetFrom(feature)
+            feat.SetField(ID_FIELD, new_ids[cnt])
+            geom = feature.GetGeometryRef().Clone()
+            if transformation is not None:
+                geom.Transform(transformation)
+            feat.SetGeometry(geom)
+            if check_overlaps:
+                wkbs.append(bytes(geom.ExportToWkb()))
+            out_layer.CreateFeature(feat)
+            feat.Destroy()
+            cnt += 1
+        data_source.Destroy()
+    out_source.Destroy()
+
+    report = {'num_sources': cnt,
+              'remapped_ids': [{'file': origin[i][0], 'index': origin[i][1],
+                                'old_id': ids[i], 'new_id': new_ids[i]}
+                               for i in remapped]}
+    if check_overlaps:
+        report['overlaps'] = get_overlaps(wkbs, new_ids)
+    if report_filename is not None:
+        shpt.write_report(report, report_filename)
+    return report
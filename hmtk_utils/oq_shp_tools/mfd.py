@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+Module for computing occurrence rates and seismic moment rates for the
+magnitude-frequency distributions of an entire source model. The functions
+operate on arrays containing the parameters of all the sources (e.g. the
+columns of the attribute table of a preformatted shapefile) instead of on
+the oq-nrmllib MFD objects.
+"""
+
+import numpy as np
+
+from attribute_tools import get_numbered_columns
+
+TGR_MFD = 'truncGutenbergRichterMFD'
+INCR_MFD = 'IncrementalMFD'
+
+
+def get_seismic_moment(mag):
+    """
+    Compute the scalar seismic moment from moment magnitude using the
+    relationship proposed by Hanks and Kanamori (1979)
+
+    :parameter mag:
+        A scalar or an array of moment magnitudes
+    :returns:
+        The scalar seismic moment [Nm]
+    """
+    return 10.**(1.5 * np.asarray(mag, dtype=float) + 9.05)
+
+
+def get_magnitude_bins(min_mag, max_mag, bin_width=0.1):
+    """
+    Compute the edges of a magnitude grid covering all the magnitudes
+    between the smallest minimum magnitude and the largest maximum magnitude.
+    The edges are multiples of the bin width.
+
+    :parameter min_mag:
+        An array with the minimum magnitudes
+    :parameter max_mag:
+        An array with the maximum magnitudes
+    :parameter float bin_width:
+        The width of the magnitude bins
+    :returns:
+        An array with the edges of the magnitude bins
+    """
+    low = np.floor(np.nanmin(min_mag) / bin_width + 1e-6) * bin_width
+    upp = np.ceil(np.nanmax(max_mag) / bin_width - 1e-6) * bin_width
+    num = max(int(round((upp - low) / bin_width)), 1)
+    return low + bin_width * np.arange(num + 1)
+
+
+def get_tgr_rates(a_val, b_val, min_mag, max_mag, mag_edges):
+    """
+    Compute the annual rates of occurrence in each magnitude bin for a set
+    of truncated Gutenberg-Richter distributions. Bins partially covered
+    by a distribution get the rate of the covered part.
+
+    :parameter a_val:
+        An array with the a values
+    :parameter b_val:
+        An array with the b values
+    :parameter min_mag:
+        An array with the minimum magnitudes
+    :parameter max_mag:
+        An array with the maximum magnitudes
+    :parameter mag_edges:
+        An array with the edges of the magnitude bins
+    :returns:
+        A 2D array (number of sources x number of bins) with rates
+    """
+    a_val = np.asarray(a_val, dtype=float)[:, None]
+    b_val = np.asarray(b_val, dtype=float)[:, None]
+    min_mag = np.asarray(min_mag, dtype=float)[:, None]
+    max_mag = np.asarray(max_mag, dtype=float)[:, None]
+    # Clip the edges of the bins to the magnitude range of each source
+    low = np.clip(mag_edges[None, :-1], min_mag, max_mag)
+    upp = np.clip(mag_edges[None, 1:], min_mag, max_mag)
+    return 10.**(a_val - b_val * low) - 10.**(a_val - b_val * upp)
+
+
+def get_incremental_rates(occur_rates, min_mag, bin_width, mag_edges):
+    """
+    Map a set of incremental distributions on a common magnitude grid. The
+    rate of each bin of a distribution is assigned to the grid bin
+    containing its central magnitude.
+
+    :parameter occur_rates:
+        A 2D array (number of sources x maximum number of bins) with the
+        occurrence rates. Bins not used by a distribution contain NaN.
+    :parameter min_mag:
+        An array with the central magnitude of the first bin
+    :parameter bin_width:
+        An array with the bin widths
+    :parameter mag_edges:
+        An array with the edges of the magnitude bins
+    :returns:
+        A 2D array (number of sources x number of bins) with rates
+    """
+    occur_rates = np.atleast_2d(np.asarray(occur_rates, dtype=float))
+    num_src, num_bins = occur_rates.shape
+    mags = (np.asarray(min_mag, dtype=float)[:, None] +
+            np.asarray(bin_width, dtype=float)[:, None] *
+            np.arange(num_bins)[None, :])
+    dlt = mag_edges[1] - mag_edges[0]
+    idx = np.floor((mags - mag_edges[0]) / dlt + 1e-6).astype(int)
+    rows = np.repeat(np.arange(num_src), num_bins).reshape(num_src, num_bins)
+    valid = (np.isfinite(occur_rates) & (idx >= 0) &
+             (idx < len(mag_edges) - 1))
+    rates = np.zeros((num_src, len(mag_edges) - 1))
+    np.add.at(rates, (rows[valid], idx[valid]), occur_rates[valid])
+    return rates
+
+
+def get_cumulative_rates(rates):
+    """
+    Compute the annual rates of exceedance of the lower edge of each bin
+
+    :parameter rates:
+        A 2D array (number of sources x number of bins) with rates
+    :returns:
+        A 2D array (number of sources x number of bins) with cumulative rates
+    """
+    return np.cumsum(rates[:, ::-1], axis=1)[:, ::-1]
+
+
+def get_moment_rates(rates, mag_edges):
+    """
+    Compute the seismic moment rate of each source. The moment of each bin
+    is the one of its central magnitude.
+
+    :parameter rates:
+        A 2D array (number of sources x number of bins) with rates
+    :parameter mag_edges:
+        An array with the edges of the magnitude bins
+    :returns:
+        An array with the seismic moment rate [Nm/yr] of each source
+    """
+    mags = (mag_edges[:-1] + mag_edges[1:]) / 2.
+    return np.dot(rates, get_seismic_moment(mags))
+
+
+def get_incremental_moment_rates(occur_rates, min_mag, bin_width):
+    """
+    Compute the seismic moment rate of a set of incremental distributions
+    using the magnitudes of their own bins (`min_mag + i * bin_width`)
+
+    :parameter occur_rates:
+        A 2D array (number of sources x maximum number of bins) with the
+        occurrence rates. Bins not used by a distribution contain NaN.
+    :parameter min_mag:
+        An array with the central magnitude of the first bin
+    :parameter bin_width:
+        An array with the bin widths
+    :returns:
+        An array with the seismic moment rate [Nm/yr] of each source
+    """
+    occur_rates = np.atleast_2d(np.asarray(occur_rates, dtype=float))
+    mags = (np.asarray(min_mag, dtype=float)[:, None] +
+            np.asarray(bin_width, dtype=float)[:, None] *
+            np.arange(occur_rates.shape[1])[None, :])
+    valid = np.isfinite(occur_rates)
+    moment = np.zeros(occur_rates.shape)
+    moment[valid] = occur_rates[valid] * get_seismic_moment(mags[valid])
+    return moment.sum(axis=1)
+
+
+def get_model_rates(columns, bin_width=0.1):
+    """
+    Compute the occurrence rates and seismic moment rates for all the
+    sources in a model.
+
+    :parameter dict columns:
+        A dictionary with the columns of the attribute table as returned by
+        :func:`hmtk_utils.oq_shp_tools.shapefile_tools.get_field_arrays`.
+        It must contain a `mfd_type` column plus the `a_value`, `b_value`,
+        `min_mag` and `max_mag` columns for truncated Gutenberg-Richter
+        distributions and the `min_mag`, `bin_width` and `or_N` columns
+        for incremental distributions.
+    :parameter float bin_width:
+        The width of the magnitude bins used for the results
+    :returns:
+        A dictionary with the edges of the magnitude bins (`mag_edges`),
+        the rates (`rates`) and cumulative rates (`cumulative_rates`) for
+        each source and bin, the moment rate of each source
+        (`moment_rates`, computed at the magnitudes of the bins of the
+        incremental distributions) and the corresponding totals for the
+        whole model (`total_rates`, `total_cumulative_rates`,
+        `total_moment_rate`).
+        Sources with an unsupported MFD get zero rates.
+    """
+    mfd_type = np.asarray(columns['mfd_type'])
+    num_src = len(mfd_type)
+    is_tgr = mfd_type == TGR_MFD
+    is_incr = mfd_type == INCR_MFD
+    occur_rates = get_numbered_columns(columns, 'or_')
+
+    # Find the magnitude range covered by the model
+    low = []
+    upp = []
+    if np.any(is_tgr):
+        low.append(np.nanmin(columns['min_mag'][is_tgr]))
+        upp.append(np.nanmax(columns['max_mag'][is_tgr]))
+    if np.any(is_incr) and occur_rates is not None:
+        width = columns['bin_width'][is_incr]
+        num_bins = np.sum(np.isfinite(occur_rates[is_incr]), axis=1)
+        low.append(np.nanmin(columns['min_mag'][is_incr] - width / 2.))
+        upp.append(np.nanmax(columns['min_mag'][is_incr] +
+                             width * (num_bins - 0.5)))
+    if not len(low):
+        raise ValueError('The model does not contain supported MFDs')
+    mag_edges = get_magnitude_bins(min(low), max(upp), bin_width)
+
+    rates = np.zeros((num_src, len(mag_edges) - 1))
+    if np.any(is_tgr):
+        rates[is_tgr] = get_tgr_rates(columns['a_value'][is_tgr],
+                                      columns['b_value'][is_tgr],
+                                      columns['min_mag'][is_tgr],
+                                      columns['max_mag'][is_tgr],
+                                      mag_edges)
+    if np.any(is_incr) and occur_rates is not None:
+        rates[is_incr] = get_incremental_rates(occur_rates[is_incr],
+                                               columns['min_mag'][is_incr],
+                                               columns['bin_width'][is_incr],
+                                               mag_edges)
+    cumulative_rates = get_cumulative_rates(rates)
+    moment_rates = get_moment_rates(rates, mag_edges)
+    # The moment of the incremental distributions is computed at the
+    # magnitudes of their bins, which may not be the centres of the grid
+    if np.any(is_incr) and occur_rates is not None:
+        moment_rates[is_incr] = get_incremental_moment_rates(
+            occur_rates[is_incr], columns['min_mag'][is_incr],
+            columns['bin_width'][is_incr])
+
+    return {'mag_edges': mag_edges,
+            'rates': rates,
+            'cumulative_rates': cumulative_rates,
+            'moment_rates': moment_rates,
+            'total_rates': rates.sum(axis=0),
+            'total_cumulative_rates': cumulative_rates.sum(axis=0),
+            'total_moment_rate': moment_rates.sum()}
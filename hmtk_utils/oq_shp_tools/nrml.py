@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+Module with a streaming writer of nrml files for the area sources stored
+in an :class:`hmtk_utils.oq_shp_tools.source_table.AreaSourceTable`. The
+sources are written one at a time without creating the oq-nrmllib objects.
+The geometry fragments can be computed once and reused for several files
+containing the same polygons (e.g. the branches of a logic tree).
+"""
+
+import gzip
+
+from xml.sax.saxutils import escape, quoteattr
+
+import polygons as poly
+import shapefile_tools as shpt
+
+from source_table import TGR_MFD, INCR_MFD
+
+NRML_HEADER = """<?xml version='1.0' encoding='utf-8'?>
+<nrml xmlns:gml="http://www.opengis.net/gml"
+      xmlns="http://openquake.org/xmlns/nrml/0.4">
+
+    <sourceModel name=%s>
+"""
+
+NRML_FOOTER = """
+    </sourceModel>
+</nrml>
+"""
+
+GEOMETRY_TEMPLATE = """                <gml:Polygon>
+                    <gml:exterior>
+                        <gml:LinearRing>
+                            <gml:posList>%s</gml:posList>
+                        </gml:LinearRing>
+                    </gml:exterior>
+                </gml:Polygon>
+"""
+
+
+def _fmt(value):
+    """
+    Format a number
+    """
+    return repr(float(value))
+
+
+def _attr(value):
+    """
+    Format the value of an attribute (quotes included)
+    """
+    return quoteattr('' if value is None else unicode(value))
+
+
+def _text(value):
+    """
+    Format the text of an element
+    """
+    return escape('' if value is None else unicode(value))
+
+
+def get_geometry_fragments(table):
+    """
+    Create the `gml:Polygon` element of each source. The closing vertex of
+    the rings is not included.
+
+    :parameter table:
+        An instance of :class:`AreaSourceTable`
+    :returns:
+        A list of strings
+    """
+    out = []
+    for i in range(len(table)):
+        lons, lats = table.get_polygon(i)
+        if len(lons) > 1 and lons[0] == lons[-1] and lats[0] == lats[-1]:
+            lons, lats = lons[:-1], lats[:-1]
+        coo = ' '.join('%.5f %.5f' % (lon, lat) for lon, lat in
+                       zip(lons, lats))
+        out.append(GEOMETRY_TEMPLATE % coo)
+    return out
+
+
+def _get_mfd_element(table, idx):
+    """
+    Create the element describing the MFD of a source
+    """
+    if table.mfd_type[idx] == TGR_MFD:
+        return ('            <truncGutenbergRichterMFD aValue="%s" '
+                'bValue="%s" minMag="%s" maxMag="%s" />\n' % (
+                    _fmt(table.a_val[idx]), _fmt(table.b_val[idx]),
+                    _fmt(table.min_mag[idx]), _fmt(table.max_mag[idx])))
+    elif table.mfd_type[idx] == INCR_MFD:
+        low, upp = table.rate_offsets[idx], table.rate_offsets[idx + 1]
+        rates = ' '.join(_fmt(rate) for rate in table.occur_rates[low:upp])
+        return ('            <incrementalMFD minMag="%s" binWidth="%s">\n'
+                '                <occurRates>%s</occurRates>\n'
+                '            </incrementalMFD>\n' % (
+                    _fmt(table.min_mag[idx]), _fmt(table.bin_width[idx]),
+                    rates))
+    raise ValueError('Unsupported MFD type: %s' % table.mfd_type[idx])
+
+
+def _get_source_element(table, idx, geometry):
+    """
+    Create the element describing an area source
+    """
+    out = ['        <areaSource id=%s name=%s tectonicRegion=%s>\n' % (
+        _attr(table.id[idx]), _attr(table.name[idx]),
+        _attr(table.trt[idx])),
+        '            <areaGeometry>\n', geometry,
+        '                <upperSeismoDepth>%s</upperSeismoDepth>\n' % (
+            _fmt(table.upper_seismo_depth[idx])),
+        '                <lowerSeismoDepth>%s</lowerSeismoDepth>\n' % (
+            _fmt(table.lower_seismo_depth[idx])),
+        '            </areaGeometry>\n',
+        '            <magScaleRel>%s</magScaleRel>\n' % (
+            _text(table.mag_scale_rel[idx])),
+        '            <ruptAspectRatio>%s</ruptAspectRatio>\n' % (
+            _fmt(table.rupt_aspect_ratio[idx])),
+        _get_mfd_element(table, idx),
+        '            <nodalPlaneDist>\n']
+    for i in range(table.npd_offsets[idx], table.npd_offsets[idx + 1]):
+        out.append('                <nodalPlane probability="%s" '
+                   'strike="%s" dip="%s" rake="%s" />\n' % (
+                       _fmt(table.npd_probability[i]),
+                       _fmt(table.npd_strike[i]), _fmt(table.npd_dip[i]),
+                       _fmt(table.npd_rake[i])))
+    out.append('            </nodalPlaneDist>\n')
+    out.append('            <hypoDepthDist>\n')
+    for i in range(table.hdd_offsets[idx], table.hdd_offsets[idx + 1]):
+        out.append('                <hypoDepth probability="%s" '
+                   'depth="%s" />\n' % (_fmt(table.hdd_probability[i]),
+                                        _fmt(table.hdd_depth[i])))
+    out.append('            </hypoDepthDist>\n')
+    out.append('        </areaSource>\n')
+    return ''.join(out)
+
+
+def write_nrml(table, filename, name='', geometries=None,
+               spatial_sort=False, block_size=shpt.BLOCK_SIZE):
+    """
+    Write the sources of a table in a nrml file
+
+    :parameter table:
+        An instance of :class:`AreaSourceTable`
+    :parameter str filename:
+        The name of the nrml file. When the extension is .gz the file is
+        compressed with gzip.
+    :parameter str name:
+        The name of the source model
+    :parameter list geometries:
+        The geometry fragments as returned by
+        :func:`get_geometry_fragments`. When None they are computed.
+    :parameter bool spatial_sort:
+        When True the sources are written in the order of the Hilbert
+        index of the centroids of their polygons and the bounding boxes and
+        byte ranges (of the uncompressed document) of the blocks of
+        consecutive sources are written in a json file (see
+        :func:`hmtk_utils.oq_shp_tools.shapefile_tools.write_block_index`)
+    :parameter int block_size:
+        The number of sources of each block of the index
+    """
+    if geometries is None:
+        geometries = get_geometry_fragments(table)
+    order = range(len(table))
+    if spatial_sort:
+        order = poly.get_hilbert_order(table.lons, table.lats,
+                                       table.ring_offsets)
+    if filename.lower().endswith('.gz'):
+        fout = gzip.open(filename, 'wb')
+    else:
+        fout = open(filename, 'wb')
+    offsets = []
+    with fout:
+        data = (NRML_HEADER % _attr(name)).encode('utf-8')
+        fout.write(data)
+        pos = len(data)
+        for idx in order:
+            offsets.append(pos)
+            data = ('\n' + _get_source_element(table, idx, geometries[idx])
+                    ).encode('utf-8')
+            fout.write(data)
+            pos += len(data)
+        offsets.append(pos)
+        fout.write(NRML_FOOTER)
+    if spatial_sort and len(table):
+        bboxes = poly.get_bounding_boxes(table.lons, table.lats,
+                                         table.ring_offsets)[order]
+        shpt.write_block_index(filename, bboxes, block_size, offsets)
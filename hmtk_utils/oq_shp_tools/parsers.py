@@ -50,34 +50,52 @@ Module for parsing preformatted shapefiles containing information about
 OQ-engine source typologies.
 """
 
+import gzip
 import ogr
-import os
+import warnings
+import numpy as np
+
+import polygons as poly
+import projections as proj
+import schema as sch
+import shapefile_tools as shpt
 
 from decimal import Decimal
 
+from source_table import AreaSourceTable, TGR_MFD, INCR_MFD
+
+from openquake.nrmllib.hazard.parsers import SourceModelParser
 from openquake.nrmllib.models import AreaSource, TGRMFD, NodalPlane, \
-    HypocentralDepth, AreaGeometry
+    HypocentralDepth, AreaGeometry, IncrementalMFD
 
 
-def _get_area_geometry(feature, only_geom=False):
+def _get_area_geometry(feature, only_geom=False, coords=None):
     """
     This function gets the geometry of a polygon feature
 
     :parameter feature:
     :parameter only_geom:
+    :parameter coords:
+        The longitudes and latitudes of the vertices of the polygon. When
+        None the vertices are taken from the geometry of the feature.
 
     :returns:
         An instance of the :class:`AreaGeometry` defined in the oq-nrmllib
         models.py module
     """
-    geometry = feature.GetGeometryRef()
-    pts = geometry.GetGeometryRef(0)
     points = []
-    wkt_str = 'POLYGON(('
-    for point in xrange(pts.GetPointCount()):
-        points.append((pts.GetX(point), pts.GetY(point)))
-        wkt_str += '%.5f %.5f,' % (pts.GetX(point), pts.GetY(point))
-    wkt_str += '))'
+    if coords is None:
+        geometry = feature.GetGeometryRef()
+        pts = geometry.GetGeometryRef(0)
+        for point in xrange(pts.GetPointCount()):
+            points.append('%.5f %.5f' % (pts.GetX(point), pts.GetY(point)))
+    else:
+        for lon, lat in zip(*coords):
+            points.append('%.5f %.5f' % (lon, lat))
+    # Close the ring
+    if len(points) and points[0] != points[-1]:
+        points.append(points[0])
+    wkt_str = 'POLYGON((%s))' % (', '.join(points))
 
     if not only_geom:
         upp_seismo = feature.GetField('upp_seismo')
@@ -114,7 +132,8 @@ def _get_hypo_depth_distr(feature):
             nodal_plane_list.append(HypocentralDepth(probability=prob,
                                                      depth=depth))
         else:
-            print depth
+            warnings.warn('Feature %d: hypocentral depth %d is not set' %
+                          (feature.GetFID(), idx))
 
     return nodal_plane_list
 
@@ -160,106 +179,500 @@ def _get_truncGR_from_feature(feature):
     return TGRMFD(a_val=a_val, b_val=b_val, min_mag=min_mag, max_mag=max_mag)
 
 
-def parse_area_source_shp(filename, only_geom=False, config={}):
+def _get_incremental_from_feature(feature):
     """
-    Parse an preformatted shapefile containing information about area
-    sources
-
-    :parameter str filename:
-        Name of the shapefile to be parsed
-    :parameter dict config:
-        A dictionary whose keys corresponds to the attributes of a
-        :class:`AreaSource` instance. These attributes are assigned
-        to each parsed area source.
-    :parameter bool only_geometry:
-        When True only geometry of sources is taken from the shapefile
+    Get fields from the attribute table and create an
+    :class:`IncrementalMFD` instance. The occurrence rates are read as a
+    single block; when `num_bins` is not set all the rates set are used.
 
+    :parameter feature:
+        The record of a feature (see :class:`_FeatureRecord`)
     :returns:
-        A list of :class:`AreaSource` istances
-
+        An :class:`IncrementalMFD` instance
+    """
+    num_bins = feature.GetField('num_bins')
+    rates = feature.get_numbered_fields('or_', num_bins or None)
+    if not num_bins:
+        rates = rates[np.isfinite(rates)]
+    elif not np.all(np.isfinite(rates)):
+        raise ValueError('Feature %d: occurrence rates not set' %
+                         feature.GetFID())
+    return IncrementalMFD(min_mag=feature.GetField('min_mag'),
+                          bin_width=feature.GetField('bin_width'),
+                          occur_rates=rates.tolist())
+
+
+def _get_layer_rings(layer, simplify=None, force=False):
     """
+    Get the polygons in a layer in geographic coordinates (WGS84). Polygons
+    in a different spatial reference system are transformed with a single
+    transformation applied to all the coordinates.
+
+    :parameter layer:
+        An instance of :class:`ogr.Layer`
+    :parameter dict simplify:
+        The parameters of
+        :func:`hmtk_utils.oq_shp_tools.polygons.simplify_rings`. When None
+        the polygons are not simplified.
+    :parameter bool force:
+        When False and the polygons in the layer can be used as they are
+        None is returned
+    :returns:
+        The longitudes and latitudes of the vertices and the offsets of the
+        polygons (see :mod:`hmtk_utils.oq_shp_tools.polygons`)
+    """
+    srs = layer.GetSpatialRef()
+    if srs is None:
+        warnings.warn('The layer does not have a spatial reference: ' +
+                      'coordinates are assumed to be WGS84')
+        reproject = False
+    else:
+        reproject = not proj.is_wgs84(srs)
+    if not reproject and simplify is None and not force:
+        return None
 
-    # Check if the input shapefile exists
-    if not os.path.isfile(filename):
-        raise IOError("This shapefile doesn't exists")
+    lons, lats, offsets = shpt.get_ring_arrays(layer)
+    if reproject:
+        transformation = proj.get_transformation(srs, None)
+        lons, lats = proj.transform_coordinates(lons, lats, transformation)
+    if simplify is not None:
+        lons, lats, offsets, _ = poly.simplify_rings_and_log(
+            lons, lats, offsets, **simplify)
+    return lons, lats, offsets
 
-    # Open the shapefile
-    driver = ogr.GetDriverByName('ESRI Shapefile')
-    data_source = driver.Open(filename, 0)
 
-    # Check that the input shapefile can be opened
-    if data_source is None:
-        raise IOError("This shapefile cannot be opened")
+def _get_geometry_only_columns(num):
+    """
+    Create the columns of an attribute table with the default values
+    assigned to the sources when only the geometry is read
+
+    :parameter int num:
+        The number of sources
+    :returns:
+        A dictionary with the columns
+    """
+    return dict((key, np.array([value] * num)) for key, value in
+                GEOMETRY_ONLY_FIELDS.items())
+
+
+# Fields of the attribute table describing the attributes of the sources
+ATTRIBUTE_FIELDS = {'id': 'src_id', 'name': 'src_name', 'trt': 'tect_reg',
+                    'mag_scale_rel': 'mag_scal_r',
+                    'rupt_aspect_ratio': 'rup_asp_ra',
+                    'upper_seismo_depth': 'upp_seismo',
+                    'lower_seismo_depth': 'low_seismo'}
+
+FLOAT_ATTRIBUTES = ('rupt_aspect_ratio', 'upper_seismo_depth',
+                    'lower_seismo_depth')
+
+# Fields and families of numbered fields describing the MFD and the
+# nodal plane and hypocentral depth distributions
+COMPOUND_FIELDS = {'mfd': (('mfd_type', 'a_value', 'b_value', 'min_mag',
+                            'max_mag', 'bin_width', 'num_bins'), ('or_',)),
+                   'nodal_plane_dist': (('num_npd',), ('weight_', 'strike_',
+                                                       'dip_', 'rake_')),
+                   'hypo_depth_dist': (('num_hdd',), ('hdd_w_', 'hdd_d_'))}
+
+ATTRIBUTES = tuple(ATTRIBUTE_FIELDS) + tuple(COMPOUND_FIELDS)
+
+# Values of the fields assigned to the sources when only the geometry is
+# read
+GEOMETRY_ONLY_FIELDS = {'src_id': 'Null', 'src_name': 'Null',
+                        'tect_reg': 'Null', 'mag_scal_r': 'Null',
+                        'rup_asp_ra': 0.1,
+                        'mfd_type': 'truncGutenbergRichterMFD',
+                        'a_value': 1.0, 'b_value': 1.0, 'min_mag': 4.0,
+                        'max_mag': 4.1, 'upp_seismo': 0.0,
+                        'low_seismo': 1.0, 'num_npd': 1, 'weight_1': 1.0,
+                        'strike_1': 0.0, 'dip_1': 0.0, 'rake_1': 0.0,
+                        'num_hdd': 1, 'hdd_w_1': 1.0, 'hdd_d_1': 1.0}
+
+
+class _FeatureRecord(object):
+    """
+    Gives access to the fields of the current feature using the names of
+    the fields of the preformatted shapefile. The index of each field is
+    computed once for the layer.
 
-    layer = data_source.GetLayer()
+    :parameter dict indices:
+        A dictionary with the index of each field
+    """
 
-    sourcelist = []
-    feature = layer.GetNextFeature()
-    cnt = 0
-    while feature:
-        print cnt
+    def __init__(self, indices):
+        self.indices = indices
+        self.feature = None
+        self.numbered = {}
+
+    def GetField(self, name):
+        """
+        :returns:
+            The value of a field (None when the field is missing or not set)
+        """
+        idx = self.indices.get(name)
+        if idx is None or not self.feature.IsFieldSet(idx):
+            return None
+        return self.feature.GetField(idx)
+
+    def GetFID(self):
+        return self.feature.GetFID()
+
+    def get_numbered_fields(self, prefix, num=None):
+        """
+        Read a family of numbered fields (e.g. `or_1`, `or_2`, ...). The
+        indexes of the fields of each family are found once.
+
+        :parameter str prefix:
+            The prefix of the family
+        :parameter int num:
+            The number of fields read. When None all the fields of the
+            family are read.
+        :returns:
+            An array with the values (NaN when a field is not set)
+        """
+        if prefix not in self.numbered:
+            fields = []
+            while '%s%d' % (prefix, len(fields) + 1) in self.indices:
+                fields.append(self.indices['%s%d' % (prefix,
+                                                     len(fields) + 1)])
+            self.numbered[prefix] = fields
+        fields = self.numbered[prefix]
+        if num is not None:
+            if num > len(fields):
+                raise ValueError('Feature %d: %d fields %sN expected, %d '
+                                 'found' % (self.GetFID(), num, prefix,
+                                            len(fields)))
+            fields = fields[:num]
+        out = np.empty(len(fields))
+        out.fill(np.nan)
+        for i, idx in enumerate(fields):
+            if self.feature.IsFieldSet(idx):
+                out[i] = self.feature.GetFieldAsDouble(idx)
+        return out
+
+
+def _get_field_indices(layer, column_map=None):
+    """
+    Get the index of the fields of a layer
+
+    :parameter layer:
+        An instance of :class:`ogr.Layer`
+    :parameter dict column_map:
+        A dictionary whose keys are the names of the fields in the
+        preformatted shapefile and values the names of the corresponding
+        fields in the layer
+    :returns:
+        A dictionary with the index of each field
+    """
+    defn = layer.GetLayerDefn()
+    indices = dict((defn.GetFieldDefn(i).GetName(), i) for i in
+                   range(defn.GetFieldCount()))
+    for name, field in (column_map or {}).items():
+        if field not in indices:
+            raise ValueError('Field %s not found in the shapefile' % field)
+        indices[name] = indices[field]
+    return indices
 
-        # Create the area source geometry
-        geometry = _get_area_geometry(feature, only_geom)
 
-        if not only_geom:
+def _get_field_attribute(name):
+    """
+    :returns:
+        The attribute of the sources described by a field of the
+        preformatted shapefile (None for unknown fields)
+    """
+    for attribute, field in ATTRIBUTE_FIELDS.items():
+        if name == field:
+            return attribute
+    for attribute, (names, prefixes) in COMPOUND_FIELDS.items():
+        if name in names:
+            return attribute
+        for prefix in prefixes:
+            if name.startswith(prefix) and name[len(prefix):].isdigit():
+                return attribute
+    return None
+
+
+def _get_config_value(value, record):
+    """
+    :returns:
+        The value of an attribute assigned with the configuration (a
+        constant or a function of the record of a feature)
+    """
+    return value(record) if callable(value) else value
 
-            # General parameters
-            src_id = feature.GetField('src_id')
-            name = feature.GetField('src_name')
-            tect_reg = feature.GetField('tect_reg')
 
-            # Geometry parameters
-            mag_scal = feature.GetField('mag_scal_r')
-            rup_asp_ratio = feature.GetField('rup_asp_ra')
+def _get_geometry_only_values():
+    """
+    :returns:
+        A dictionary with the attributes assigned to the sources when only
+        the geometry is read (see :data:`GEOMETRY_ONLY_FIELDS`)
+    """
+    fields = GEOMETRY_ONLY_FIELDS
+    out = dict((attribute, fields[field]) for attribute, field in
+               ATTRIBUTE_FIELDS.items())
+    out['mfd'] = TGRMFD(a_val=fields['a_value'], b_val=fields['b_value'],
+                        min_mag=fields['min_mag'],
+                        max_mag=fields['max_mag'])
+    out['nodal_plane_dist'] = [NodalPlane(
+        probability=Decimal(fields['weight_1']),
+        strike=fields['strike_1'], dip=fields['dip_1'],
+        rake=fields['rake_1'])]
+    out['hypo_depth_dist'] = [HypocentralDepth(
+        probability=fields['hdd_w_1'], depth=fields['hdd_d_1'])]
+    return out
+
+
+def _get_source_attributes(record, config, defaults):
+    """
+    Get the attributes of the source described by a feature. The fields of
+    the attributes assigned with the configuration are not read.
 
-            # Computing the MFD distribution
-            mfd_type = feature.GetField('mfd_type')
+    :returns:
+        A dictionary with the attributes
+    """
+    out = {}
+    for attribute in ATTRIBUTES:
+        if attribute in config:
+            out[attribute] = _get_config_value(config[attribute], record)
+            continue
+        if attribute in ATTRIBUTE_FIELDS:
+            value = record.GetField(ATTRIBUTE_FIELDS[attribute])
+        elif attribute == 'mfd':
+            mfd_type = record.GetField('mfd_type')
+            value = None
             if mfd_type == 'truncGutenbergRichterMFD':
-                mfd = _get_truncGR_from_feature(feature)
+                value = _get_truncGR_from_feature(record)
+            elif mfd_type == 'IncrementalMFD':
+                value = _get_incremental_from_feature(record)
+            elif mfd_type is not None or 'mfd' not in defaults:
+                raise ValueError('Feature %d: unsupported MFD type %s' %
+                                 (record.GetFID(), mfd_type))
+        elif record.GetField(COMPOUND_FIELDS[attribute][0][0]) is None:
+            value = None
+        elif attribute == 'nodal_plane_dist':
+            value = _get_nodal_plane_distr(record)
+        else:
+            value = _get_hypo_depth_distr(record)
+        out[attribute] = defaults.get(attribute) if value is None else value
+    return out
+
+
+def _get_column(columns, name, num, kind):
+    """
+    Get a column of an attribute table, creating it when missing. Columns
+    of strings are converted into columns of objects.
+    """
+    col = columns.get(name)
+    if col is None:
+        if kind == 'float':
+            col = np.empty(num)
+            col.fill(np.nan)
+        elif kind == 'int':
+            col = np.zeros(num, dtype=int)
+        else:
+            col = np.empty(num, dtype=object)
+    elif col.dtype.kind in 'SU':
+        col = col.astype(object)
+    columns[name] = col
+    return col
+
 
-            # Create the nodal plane distribution
-            nodal_planes_list = _get_nodal_plane_distr(feature)
+def _set_columns(columns, num, attribute, value, rows):
+    """
+    Assign the value of an attribute to some rows of the columns of an
+    attribute table
+
+    :parameter dict columns:
+        The columns of the attribute table
+    :parameter int num:
+        The number of rows
+    :parameter str attribute:
+        The name of the attribute
+    :parameter value:
+        The value of the attribute
+    :parameter rows:
+        The index of a row, a mask or a slice
+    """
+    if attribute in ATTRIBUTE_FIELDS:
+        kind = 'float' if attribute in FLOAT_ATTRIBUTES else 'object'
+        _get_column(columns, ATTRIBUTE_FIELDS[attribute], num, kind)[rows] = \
+            value
+    elif attribute == 'mfd':
+        if isinstance(value, TGRMFD):
+            values = {'mfd_type': 'truncGutenbergRichterMFD',
+                      'a_value': value.a_val, 'b_value': value.b_val,
+                      'min_mag': value.min_mag, 'max_mag': value.max_mag}
+        elif isinstance(value, IncrementalMFD):
+            values = {'mfd_type': 'IncrementalMFD',
+                      'min_mag': value.min_mag,
+                      'bin_width': value.bin_width,
+                      'num_bins': len(value.occur_rates)}
+            for i, rate in enumerate(value.occur_rates):
+                values['or_%d' % (i + 1)] = rate
+        else:
+            raise ValueError('Unsupported MFD: %s' % value)
+        for name, val in values.items():
+            kind = 'object' if name == 'mfd_type' else (
+                'int' if name == 'num_bins' else 'float')
+            _get_column(columns, name, num, kind)[rows] = val
+    else:
+        count = COMPOUND_FIELDS[attribute][0][0]
+        _get_column(columns, count, num, 'int')[rows] = len(value)
+        if attribute == 'nodal_plane_dist':
+            mapping = (('weight_', 'probability'), ('strike_', 'strike'),
+                       ('dip_', 'dip'), ('rake_', 'rake'))
+        else:
+            mapping = (('hdd_w_', 'probability'), ('hdd_d_', 'depth'))
+        for i, item in enumerate(value):
+            for prefix, key in mapping:
+                _get_column(columns, '%s%d' % (prefix, i + 1), num,
+                            'float')[rows] = float(getattr(item, key))
 
-            # Create the hypocentral depth distribution
-            hypo_depth_list = _get_hypo_depth_distr(feature)
 
-            # Append the AreaSource to the list of sources
-            areasource = AreaSource(id=src_id,
-                                    name=name,
-                                    geometry=geometry,
-                                    trt=tect_reg,
-                                    mag_scale_rel=mag_scal,
-                                    rupt_aspect_ratio=rup_asp_ratio,
-                                    mfd=mfd,
-                                    nodal_plane_dist=nodal_planes_list,
-                                    hypo_depth_dist=hypo_depth_list)
+def _get_table_columns(layer, only_geom, config, defaults, column_map):
+    """
+    Read the attribute table of a layer taking into account the
+    configuration, the defaults and the names of the columns
 
+    :returns:
+        A dictionary with the columns of the attribute table (with the
+        names of the fields of the preformatted shapefile)
+    """
+    num = layer.GetFeatureCount()
+    indices = _get_field_indices(layer, column_map)
+    if only_geom:
+        columns = _get_geometry_only_columns(num)
+    else:
+        # Read only the fields of the preformatted shapefile describing
+        # attributes not covered by the configuration. Fields renamed with
+        # the column map are read only with the name of the preformatted
+        # shapefile.
+        aliases = set((column_map or {}).values()) - set(column_map or {})
+        attributes = dict((name, _get_field_attribute(name)) for name in
+                          indices if name not in aliases)
+        fields = dict((name, layer.GetLayerDefn().GetFieldDefn(indices[name])
+                       .GetName()) for name, attribute in attributes.items()
+                      if attribute is not None and attribute not in config)
+        arrays = shpt.get_field_arrays(layer, sorted(set(fields.values())))
+        columns = dict((name, arrays[field]) for name, field in
+                       fields.items())
+
+        # Defaults
+        for attribute, value in defaults.items():
+            if attribute in config:
+                continue
+            if attribute in ATTRIBUTE_FIELDS:
+                col = columns.get(ATTRIBUTE_FIELDS[attribute])
+                if col is None:
+                    rows = slice(None)
+                elif attribute in FLOAT_ATTRIBUTES:
+                    rows = np.isnan(col)
+                else:
+                    rows = np.array([val is None for val in col], dtype=bool)
+            elif attribute == 'mfd':
+                col = columns.get('mfd_type')
+                rows = (slice(None) if col is None else
+                        np.array([val is None for val in col], dtype=bool))
+            elif COMPOUND_FIELDS[attribute][0][0] not in columns:
+                rows = slice(None)
+            else:
+                continue
+            _set_columns(columns, num, attribute, value, rows)
+
+    # Configuration: constants are assigned to all the rows while functions
+    # are evaluated for each feature
+    functions = []
+    for attribute, value in config.items():
+        if callable(value):
+            functions.append((attribute, value))
         else:
+            _set_columns(columns, num, attribute, value, slice(None))
+    if functions:
+        record = _FeatureRecord(indices)
+        layer.ResetReading()
+        for i, feature in enumerate(layer):
+            record.feature = feature
+            for attribute, function in functions:
+                _set_columns(columns, num, attribute, function(record), i)
+        layer.ResetReading()
+
+    if 'mfd_type' not in columns:
+        raise ValueError('The MFD type of the sources is not available')
+    unknown = set(columns['mfd_type']) - set([TGR_MFD, INCR_MFD])
+    if unknown:
+        raise ValueError('Unsupported MFD types: %s' %
+                         ', '.join(sorted(str(val) for val in unknown)))
+    return columns
+
+
+def _check_attributes(config, defaults):
+    """
+    Check the keys of the configuration and of the defaults
+    """
+    for key in list(config) + list(defaults):
+        if key not in ATTRIBUTES:
+            raise ValueError('Unknown attribute of area sources: %s' % key)
 
-            src_id = 'Null'
-            name = 'Null'
-            tect_reg = 'Null'
-            mag_scal = 'Null'
-            rup_asp_ratio = 0.1
-            mfd = TGRMFD(a_val=1.0, b_val=1.0, min_mag=4.0, max_mag=4.1)
-            nodal_planes_list = [NodalPlane(probability=Decimal(1.0),
-                                            strike=0.0,
-                                            dip=0.0,
-                                            rake=0.0)]
-            hypo_depth_list = [HypocentralDepth(probability=1.0, depth=1.0)]
-
-            # Append the AreaSource to the list of sources
-            areasource = AreaSource(id=src_id,
-                                    name=name,
-                                    geometry=geometry,
-                                    trt=tect_reg,
-                                    mag_scale_rel=mag_scal,
-                                    rupt_aspect_ratio=rup_asp_ratio,
-                                    mfd=mfd,
-                                    nodal_plane_dist=nodal_planes_list,
-                                    hypo_depth_dist=hypo_depth_list)
 
+def _parse_layer(layer, only_geom, config, simplify, as_table, defaults,
+                 column_map, schema):
+    """
+    Read the area sources of the layer of a preformatted shapefile (see
+    :func:`parse_area_source_shp`)
+    """
+    # Compile the schema for the fields of this layer. Arguments of the
+    # call have priority over the schema.
+    if schema is not None:
+        defn = layer.GetLayerDefn()
+        compiled = sch.compile_schema(schema, [
+            defn.GetFieldDefn(i).GetName() for i in
+            range(defn.GetFieldCount())])
+        column_map = dict(compiled['column_map'], **(column_map or {}))
+        config = dict(compiled['config'], **config)
+        defaults = dict(compiled['defaults'], **defaults)
+        _check_attributes(config, defaults)
+
+    if as_table:
+        lons, lats, offsets = _get_layer_rings(layer, simplify, force=True)
+        columns = _get_table_columns(layer, only_geom, config, defaults,
+                                     column_map)
+        return AreaSourceTable.from_attribute_columns(columns, lons, lats,
+                                                      offsets)
+
+    # Polygons reprojected and simplified when needed
+    coords = _get_layer_rings(layer, simplify)
+    if coords is not None:
+        coords = poly.split_rings(*coords)
+
+    record = _FeatureRecord(_get_field_indices(layer, column_map))
+    sourcelist = []
+    feature = layer.GetNextFeature()
+    cnt = 0
+    while feature:
+        record.feature = feature
+
+        if only_geom:
+            values = _get_geometry_only_values()
+            for key, value in config.items():
+                values[key] = _get_config_value(value, record)
+        else:
+            values = _get_source_attributes(record, config, defaults)
+
+        # Create the area source geometry
+        geometry = _get_area_geometry(
+            feature, True, None if coords is None else coords[cnt])
+        geometry.upper_seismo_depth = values['upper_seismo_depth']
+        geometry.lower_seismo_depth = values['lower_seismo_depth']
+
+        # Append the AreaSource to the list of sources
+        areasource = AreaSource(id=values['id'],
+                                name=values['name'],
+                                geometry=geometry,
+                                trt=values['trt'],
+                                mag_scale_rel=values['mag_scale_rel'],
+                                rupt_aspect_ratio=values['rupt_aspect_ratio'],
+                                mfd=values['mfd'],
+                                nodal_plane_dist=values['nodal_plane_dist'],
+                                hypo_depth_dist=values['hypo_depth_dist'])
         sourcelist.append(areasource)
 
         # Get the next feature
@@ -268,3 +681,112 @@ def parse_area_source_shp(filename, only_geom=False, config={}):
         cnt += 1
 
     return sourcelist
+
+
+def parse_area_source_shp(filename, only_geom=False, config=None,
+                          simplify=None, as_table=False, defaults=None,
+                          column_map=None, schema=None, pool=None):
+    """
+    Parse an preformatted shapefile containing information about area
+    sources. Polygons in a spatial reference system different from WGS84
+    are transformed into geographic coordinates.
+
+    :parameter str filename:
+        Name of the shapefile to be parsed. It can be a zip archive
+        containing a single shapefile, a gzip file or a GDAL virtual path
+        (e.g. '/vsizip/model.zip/as_trgr.shp').
+    :parameter dict config:
+        A dictionary whose keys corresponds to the attributes of a
+        :class:`AreaSource` instance (see :data:`ATTRIBUTES`, the depths
+        of the geometry included). These attributes are assigned
+        to each parsed area source and the corresponding fields are not
+        read. A value can be a constant or a function taking the feature
+        and returning the value; the feature gives access to the fields
+        with `GetField`.
+    :parameter bool only_geometry:
+        When True only geometry of sources is taken from the shapefile
+    :parameter dict simplify:
+        When not None the polygons are simplified. The dictionary can
+        contain the `tolerance` [km], `max_vertices` and
+        `preserve_topology` parameters of
+        :func:`hmtk_utils.oq_shp_tools.polygons.simplify_rings`
+    :parameter bool as_table:
+        When True the sources are returned as a
+        :class:`hmtk_utils.oq_shp_tools.source_table.AreaSourceTable`
+        instance
+    :parameter dict defaults:
+        A dictionary with the same keys as `config` with the values
+        assigned when the fields are missing or not set
+    :parameter dict column_map:
+        A dictionary whose keys are the names of the fields of the
+        preformatted shapefile and values the names of the fields in the
+        shapefile parsed (e.g. {'src_id': 'ZONE'})
+    :parameter schema:
+        A schema mapping the fields of the shapefile to the ones of the
+        preformatted shapefile: a dictionary or the name of a json or yaml
+        file (see :mod:`hmtk_utils.oq_shp_tools.schema`)
+    :parameter pool:
+        An instance of
+        :class:`hmtk_utils.oq_shp_tools.handle_pool.HandlePool`. When given
+        the shapefile is read with a data source of the pool instead of
+        opening it.
+
+    :returns:
+        A list of :class:`AreaSource` istances (or an
+        :class:`hmtk_utils.oq_shp_tools.source_table.AreaSourceTable`)
+
+    """
+    config = config or {}
+    defaults = defaults or {}
+    _check_attributes(config, defaults)
+    if schema is not None:
+        schema = sch.load_schema(schema)
+    args = (only_geom, config, simplify, as_table, defaults, column_map,
+            schema)
+
+    if pool is not None:
+        with pool.open(filename) as data_source:
+            return _parse_layer(data_source.GetLayer(), *args)
+
+    # Check if the input shapefile exists (zip and gzip archives are read
+    # through the GDAL virtual file systems)
+    filename = shpt.get_vsi_path(filename)
+    if not shpt.path_exists(filename):
+        raise IOError("This shapefile doesn't exists")
+
+    # Open the shapefile
+    driver = ogr.GetDriverByName('ESRI Shapefile')
+    data_source = driver.Open(filename, 0)
+
+    # Check that the input shapefile can be opened
+    if data_source is None:
+        raise IOError("This shapefile cannot be opened")
+
+    try:
+        return _parse_layer(data_source.GetLayer(), *args)
+    finally:
+        data_source.Destroy()
+
+
+def parse_area_source_table(filename, **kwargs):
+    """
+    Read the area sources of a shapefile or of a nrml file into a table
+
+    :parameter str filename:
+        The name of a shapefile (see :func:`parse_area_source_shp`) or of
+        a nrml file (gzip compressed when the extension is .gz)
+    :parameter kwargs:
+        Other parameters of :func:`parse_area_source_shp`
+    :returns:
+        An instance of
+        :class:`hmtk_utils.oq_shp_tools.source_table.AreaSourceTable`
+    """
+    name = filename.lower()
+    if name.endswith('.xml') or name.endswith('.xml.gz'):
+        if not shpt.path_exists(filename):
+            raise IOError("The nrml file %s doesn't exists" % filename)
+        source = gzip.open(filename, 'rb') if name.endswith('.gz') else \
+            filename
+        return AreaSourceTable.from_sources(
+            SourceModelParser(source).parse().sources)
+    return parse_area_source_shp(filename, as_table=True, **kwargs)
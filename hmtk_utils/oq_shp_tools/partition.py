@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+Module for splitting a source model into blocks of similar computational
+weight for distributed hazard calculations. The weight of each source is
+estimated from the area of its polygon, the number of magnitude bins and
+the number of nodal planes and hypocentral depths. The sources are sorted
+along a Hilbert curve passing through the centroids of the polygons and
+the curve is cut into consecutive pieces of equal weight, hence each block
+covers a compact region.
+"""
+
+import os
+
+import numpy as np
+
+import polygons as poly
+
+from discretization import get_num_magnitude_bins
+from nrml import get_geometry_fragments, write_nrml
+from parsers import parse_area_source_table
+from source_table import AreaSourceTable
+from writers import write_shps
+
+
+def get_source_weights(table, spacing=5.0, bin_width=0.1):
+    """
+    Estimate the computational weight of each source as the approximate
+    number of ruptures it generates
+
+    :parameter table:
+        An instance of :class:`AreaSourceTable`
+    :parameter float spacing:
+        The spacing [km] of the discretization grid
+    :parameter float bin_width:
+        The width of the magnitude bins used to discretize the truncated
+        Gutenberg-Richter distributions
+    :returns:
+        An array with the weight of each source
+    """
+    areas = poly.get_ring_areas(table.lons, table.lats, table.ring_offsets)
+    num_points = np.maximum(areas / spacing ** 2, 1.)
+    return (num_points *
+            np.maximum(get_num_magnitude_bins(table, bin_width), 1) *
+            np.maximum(np.diff(table.npd_offsets), 1) *
+            np.maximum(np.diff(table.hdd_offsets), 1))
+
+
+def get_spatial_order(table):
+    """
+    :parameter table:
+        An instance of :class:`AreaSourceTable`
+    :returns:
+        The indexes of the sources sorted by the Hilbert index of the
+        centroids of their polygons
+    """
+    return poly.get_hilbert_order(table.lons, table.lats, table.ring_offsets)
+
+
+def get_balanced_blocks(weights, order, num_blocks):
+    """
+    Cut a sequence of sources into blocks of similar total weight. Each
+    source is assigned to the block containing the middle of its weight
+    along the sequence.
+
+    :parameter weights:
+        An array with the weight of each source
+    :parameter order:
+        The indexes of the sources in the sequence
+    :parameter int num_blocks:
+        The number of blocks
+    :returns:
+        An integer array with the block of each source
+    """
+    if num_blocks < 1:
+        raise ValueError('The number of blocks must be positive')
+    weights = np.asarray(weights, dtype=float)[order]
+    cum = np.cumsum(weights)
+    total = cum[-1] if len(cum) else 0.
+    if total > 0:
+        pos = (cum - weights / 2.) / total
+    else:
+        pos = (np.arange(len(weights)) + 0.5) / max(len(weights), 1)
+    out = np.empty(len(weights), dtype=int)
+    out[order] = np.minimum((pos * num_blocks).astype(int), num_blocks - 1)
+    return out
+
+
+def partition_sources(sources, num_blocks, spacing=5.0, bin_width=0.1):
+    """
+    Split a set of area sources into blocks of similar weight covering
+    compact regions
+
+    :parameter sources:
+        An instance of :class:`AreaSourceTable` or the name of a shapefile
+        or of a nrml file
+    :parameter int num_blocks:
+        The number of blocks
+    :parameter float spacing:
+        The spacing [km] of the discretization grid
+    :parameter float bin_width:
+        The width of the magnitude bins
+    :returns:
+        The table of the sources, a list with the indexes of the sources of
+        each block (sorted along the Hilbert curve) and an array with the
+        weight of each block
+    """
+    table = sources
+    if not isinstance(sources, AreaSourceTable):
+        table = parse_area_source_table(sources)
+    weights = get_source_weights(table, spacing, bin_width)
+    order = get_spatial_order(table)
+    blocks = get_balanced_blocks(weights, order, num_blocks)
+    sorted_blocks = blocks[order]
+    idxs = [order[sorted_blocks == i] for i in range(num_blocks)]
+    block_weights = np.bincount(blocks, weights=weights,
+                                minlength=num_blocks)
+    return table, idxs, block_weights
+
+
+def write_blocks(sources, num_blocks, out_directory, out_format='nrml',
+                 name='block', spacing=5.0, bin_width=0.1):
+    """
+    Split a source model into blocks and write each block as a nrml file
+    or as a set of shapefiles
+
+    :parameter sources:
+        An instance of :class:`AreaSourceTable` or the name of a shapefile
+        or of a nrml file
+    :parameter int num_blocks:
+        The number of blocks
+    :parameter str out_directory:
+        The folder where the blocks are written
+    :parameter str out_format:
+        'nrml' or 'shp'
+    :parameter str name:
+        The prefix of the names of the blocks
+    :parameter float spacing:
+        The spacing [km] of the discretization grid
+    :parameter float bin_width:
+        The width of the magnitude bins
+    :returns:
+        A list of tuples with the name of the file (nrml) or the root name
+        of the shapefiles (shp) created, the number of sources and the
+        weight of each block
+    """
+    if out_format not in ('nrml', 'shp'):
+        raise ValueError('Unsupported format: %s' % out_format)
+    table, idxs, block_weights = partition_sources(sources, num_blocks,
+                                                   spacing, bin_width)
+    geometries = None
+    if out_format == 'nrml':
+        geometries = get_geometry_fragments(table)
+
+    out = []
+    for i, idx in enumerate(idxs):
+        if not len(idx):
+            continue
+        block = table.select(idx)
+        rootname = '%s_%d' % (name, i)
+        if out_format == 'nrml':
+            filename = os.path.join(out_directory, rootname + '.xml')
+            write_nrml(block, filename, rootname,
+                       [geometries[j] for j in idx])
+        else:
+            filename = os.path.join(out_directory, rootname)
+            write_shps(block, os.path.join(out_directory, ''),
+                       rootname=rootname)
+        out.append((filename, len(idx), block_weights[i]))
+    return out
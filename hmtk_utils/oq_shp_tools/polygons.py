@@ -0,0 +1,742 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+Module with tools for processing the rings of a set of polygons. The rings
+of all the polygons are stored in two arrays containing the longitudes and
+latitudes of the vertices plus an array of offsets: the vertices of the
+i-th ring are the ones between `offsets[i]` and `offsets[i+1]`.
+"""
+
+import logging
+import struct
+import numpy as np
+
+# Approximate length [km] of one degree of latitude
+DEG_TO_KM = 111.195
+
+LOGGER = logging.getLogger(__name__)
+
+
+def get_ring_index(offsets):
+    """
+    :parameter offsets:
+        An array with the offsets of the rings
+    :returns:
+        An array with the index of the ring of each vertex
+    """
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+
+def get_next_index(offsets):
+    """
+    :parameter offsets:
+        An array with the offsets of the rings
+    :returns:
+        An array with the index of the vertex following each vertex in its
+        ring. The last vertex of a ring is followed by the first one.
+    """
+    idx = np.arange(offsets[-1]) + 1
+    full = np.diff(offsets) > 0
+    idx[offsets[1:][full] - 1] = offsets[:-1][full]
+    return idx
+
+
+def join_rings(coords):
+    """
+    :parameter list coords:
+        A list with the longitudes and latitudes of the vertices of each
+        ring
+    :returns:
+        Three arrays with the longitudes and latitudes of the vertices and
+        the offsets of the rings
+    """
+    offsets = np.cumsum([0] + [len(lons) for lons, _ in coords])
+    lons = np.zeros(offsets[-1])
+    lats = np.zeros(offsets[-1])
+    for i, (rlons, rlats) in enumerate(coords):
+        lons[offsets[i]:offsets[i + 1]] = rlons
+        lats[offsets[i]:offsets[i + 1]] = rlats
+    return lons, lats, offsets
+
+
+def split_rings(lons, lats, offsets):
+    """
+    :parameter lons:
+        An array with the longitudes of the vertices
+    :parameter lats:
+        An array with the latitudes of the vertices
+    :parameter offsets:
+        An array with the offsets of the rings
+    :returns:
+        A list with the longitudes and latitudes of the vertices of each
+        ring
+    """
+    return [(lons[offsets[i]:offsets[i + 1]], lats[offsets[i]:offsets[i + 1]])
+            for i in range(len(offsets) - 1)]
+
+
+def get_signed_areas(lons, lats, offsets):
+    """
+    Compute the signed area of each ring with the shoelace formula. The
+    area is positive for counterclockwise rings.
+
+    :parameter lons:
+        An array with the longitudes of the vertices
+    :parameter lats:
+        An array with the latitudes of the vertices
+    :parameter offsets:
+        An array with the offsets of the rings
+    :returns:
+        An array with the signed area [square degrees] of each ring
+    """
+    nxt = get_next_index(offsets)
+    cross = lons * lats[nxt] - lons[nxt] * lats
+    return np.bincount(get_ring_index(offsets), weights=cross,
+                       minlength=len(offsets) - 1) / 2.
+
+
+def get_ring_areas(lons, lats, offsets):
+    """
+    Compute the area of each ring using an equirectangular projection
+    centred on the mean latitude of the ring
+
+    :parameter lons:
+        An array with the longitudes of the vertices
+    :parameter lats:
+        An array with the latitudes of the vertices
+    :parameter offsets:
+        An array with the offsets of the rings
+    :returns:
+        An array with the area [km2] of each ring
+    """
+    num = np.diff(offsets)
+    ridx = get_ring_index(offsets)
+    mean_lat = np.bincount(ridx, weights=lats, minlength=len(num)) / \
+        np.maximum(num, 1)
+    scale = np.cos(np.radians(mean_lat))[ridx]
+    areas = get_signed_areas(lons * scale, lats, offsets)
+    return np.abs(areas) * DEG_TO_KM**2
+
+
+def is_closed(lons, lats, offsets):
+    """
+    :parameter lons:
+        An array with the longitudes of the vertices
+    :parameter lats:
+        An array with the latitudes of the vertices
+    :parameter offsets:
+        An array with the offsets of the rings
+    :returns:
+        A boolean array, True for the rings whose last vertex coincides
+        with the first one
+    """
+    out = np.zeros(len(offsets) - 1, dtype=bool)
+    full = np.diff(offsets) > 1
+    first = offsets[:-1][full]
+    last = offsets[1:][full] - 1
+    out[full] = (lons[first] == lons[last]) & (lats[first] == lats[last])
+    return out
+
+
+def get_duplicate_vertices(lons, lats, offsets, tolerance=0.0):
+    """
+    Find the vertices coinciding with the vertex following them in the
+    same ring. The closing vertex of a ring is not considered a duplicate.
+
+    :parameter lons:
+        An array with the longitudes of the vertices
+    :parameter lats:
+        An array with the latitudes of the vertices
+    :parameter offsets:
+        An array with the offsets of the rings
+    :parameter float tolerance:
+        Maximum distance [degrees] between coinciding vertices
+    :returns:
+        A boolean array, True for the duplicated vertices
+    """
+    out = np.zeros(len(lons), dtype=bool)
+    if len(lons) < 2:
+        return out
+    ridx = get_ring_index(offsets)
+    out[:-1] = ((np.abs(lons[1:] - lons[:-1]) <= tolerance) &
+                (np.abs(lats[1:] - lats[:-1]) <= tolerance) &
+                (ridx[1:] == ridx[:-1]))
+    return out
+
+
+def remove_vertices(lons, lats, offsets, mask):
+    """
+    Remove a set of vertices from the rings
+
+    :parameter lons:
+        An array with the longitudes of the vertices
+    :parameter lats:
+        An array with the latitudes of the vertices
+    :parameter offsets:
+        An array with the offsets of the rings
+    :parameter mask:
+        A boolean array, True for the vertices to be removed
+    :returns:
+        The updated longitudes, latitudes and offsets
+    """
+    keep = ~mask
+    num = np.bincount(get_ring_index(offsets)[keep],
+                      minlength=len(offsets) - 1)
+    return lons[keep], lats[keep], np.concatenate([[0], np.cumsum(num)])
+
+
+def close_rings(lons, lats, offsets):
+    """
+    Add a closing vertex to the rings whose last vertex does not coincide
+    with the first one
+
+    :parameter lons:
+        An array with the longitudes of the vertices
+    :parameter lats:
+        An array with the latitudes of the vertices
+    :parameter offsets:
+        An array with the offsets of the rings
+    :returns:
+        The updated longitudes, latitudes and offsets
+    """
+    open_rings = ~is_closed(lons, lats, offsets) & (np.diff(offsets) > 0)
+    first = offsets[:-1][open_rings]
+    lons = np.insert(lons, offsets[1:][open_rings], lons[first])
+    lats = np.insert(lats, offsets[1:][open_rings], lats[first])
+    offsets = offsets + np.concatenate([[0], np.cumsum(open_rings)])
+    return lons, lats, offsets
+
+
+def reverse_rings(lons, lats, offsets, mask):
+    """
+    Reverse the order of the vertices of a set of rings
+
+    :parameter lons:
+        An array with the longitudes of the vertices
+    :parameter lats:
+        An array with the latitudes of the vertices
+    :parameter offsets:
+        An array with the offsets of the rings
+    :parameter mask:
+        A boolean array, True for the rings to be reversed
+    :returns:
+        The updated longitudes and latitudes
+    """
+    ridx = get_ring_index(offsets)
+    idx = np.arange(len(lons))
+    sel = mask[ridx]
+    idx[sel] = (offsets[:-1][ridx[sel]] + offsets[1:][ridx[sel]] - 1 -
+                idx[sel])
+    return lons[idx], lats[idx]
+
+
+def get_polygon_wkb(lons, lats):
+    """
+    Create the well-known binary representation of a polygon with a single
+    ring
+
+    :parameter lons:
+        An array with the longitudes of the vertices of the ring
+    :parameter lats:
+        An array with the latitudes of the vertices of the ring
+    :returns:
+        A string with the WKB (little endian)
+    """
+    coo = np.empty((len(lons), 2), dtype='<f8')
+    coo[:, 0] = lons
+    coo[:, 1] = lats
+    return struct.pack('<bIII', 1, 3, 1, len(lons)) + coo.tobytes()
+
+
+def get_polygon_from_wkb(wkb):
+    """
+    Read the exterior ring of a polygon from its well-known binary
+    representation
+
+    :parameter wkb:
+        A string with the WKB of a 2D polygon (either byte order)
+    :returns:
+        Two arrays with the longitudes and latitudes of the vertices of the
+        ring
+    """
+    wkb = bytes(wkb)
+    order = '<' if struct.unpack('b', wkb[:1])[0] == 1 else '>'
+    gtype, num_rings = struct.unpack(order + 'II', wkb[1:9])
+    if gtype != 3:
+        raise ValueError('The geometry is not a 2D polygon')
+    if not num_rings:
+        return np.zeros(0), np.zeros(0)
+    num = struct.unpack(order + 'I', wkb[9:13])[0]
+    coo = np.frombuffer(wkb[13:13 + 16 * num], dtype=order + 'f8')
+    coo = coo.reshape(num, 2).astype(float)
+    return coo[:, 0], coo[:, 1]
+
+
+def get_polygon_from_wkt(wkt):
+    """
+    Get the coordinates of the exterior ring of a polygon described by a
+    WKT string (e.g. the geometry of an area source)
+
+    :parameter str wkt:
+        A WKT string describing a polygon
+    :returns:
+        Two arrays with the longitudes and the latitudes of the vertices
+    """
+    ring = wkt[wkt.index('((') + 2:wkt.index(')')]
+    coo = np.array([pnt.split()[:2] for pnt in ring.split(',') if
+                    pnt.strip()], dtype=float).reshape(-1, 2)
+    return coo[:, 0], coo[:, 1]
+
+
+def get_cartesian(lons, lats):
+    """
+    Convert geographic coordinates into cartesian coordinates on a sphere
+
+    :parameter lons:
+        An array with the longitudes of the vertices
+    :parameter lats:
+        An array with the latitudes of the vertices
+    :returns:
+        A 2D array (number of vertices x 3) with the coordinates [km]
+    """
+    radius = DEG_TO_KM * 180. / np.pi
+    lons = np.radians(lons)
+    lats = np.radians(lats)
+    return radius * np.column_stack([np.cos(lats) * np.cos(lons),
+                                     np.cos(lats) * np.sin(lons),
+                                     np.sin(lats)])
+
+
+def get_shared_vertices(lons, lats, offsets):
+    """
+    Find the vertices where the boundary shared by neighbouring polygons
+    starts or ends. These are the vertices included in more than one ring
+    whose number of rings differs from the one of one of the adjacent
+    vertices.
+
+    :parameter lons:
+        An array with the longitudes of the vertices
+    :parameter lats:
+        An array with the latitudes of the vertices
+    :parameter offsets:
+        An array with the offsets of the rings
+    :returns:
+        A boolean array, True for the junction vertices
+    """
+    if not len(lons):
+        return np.zeros(0, dtype=bool)
+    ridx = get_ring_index(offsets)
+    _, coo_idx = np.unique(np.column_stack([lons, lats]), axis=0,
+                           return_inverse=True)
+    # Number of distinct rings including each location
+    pairs = np.unique(coo_idx * (len(offsets) - 1) + ridx)
+    count = np.bincount(pairs // (len(offsets) - 1),
+                        minlength=coo_idx.max() + 1)[coo_idx]
+    prv = np.arange(len(lons)) - 1
+    prv[offsets[:-1][np.diff(offsets) > 0]] = \
+        offsets[1:][np.diff(offsets) > 0] - 1
+    nxt = get_next_index(offsets)
+    return (count > 1) & ((count != count[prv]) | (count != count[nxt]))
+
+
+def get_vertex_significance(lons, lats, offsets, locked):
+    """
+    Compute the significance of each vertex according to the Douglas-Peucker
+    algorithm, i.e. the largest tolerance for which the vertex is retained.
+    The vertices of all the rings are processed together: at each step the
+    farthest vertex of all the active segments is found with array
+    operations.
+
+    :parameter lons:
+        An array with the longitudes of the vertices
+    :parameter lats:
+        An array with the latitudes of the vertices
+    :parameter offsets:
+        An array with the offsets of the rings
+    :parameter locked:
+        A boolean array, True for the vertices that must be retained. The
+        first and last vertex of each ring must be locked.
+    :returns:
+        An array with the significance [km] of each vertex (infinite for
+        the locked vertices)
+    """
+    xyz = get_cartesian(lons, lats)
+    sig = np.zeros(len(lons))
+    sig[locked] = np.inf
+
+    # Initial segments connect consecutive locked vertices of each ring
+    idx = np.nonzero(locked)[0]
+    ridx = get_ring_index(offsets)
+    same = ridx[idx[1:]] == ridx[idx[:-1]]
+    start = idx[:-1][same]
+    end = idx[1:][same]
+    parent = np.empty(len(start))
+    parent.fill(np.inf)
+
+    while True:
+        sel = end - start > 1
+        start, end, parent = start[sel], end[sel], parent[sel]
+        if not len(start):
+            break
+        # Vertices inside each segment
+        num = end - start - 1
+        seg = np.repeat(np.arange(len(start)), num)
+        first = np.concatenate([[0], np.cumsum(num)[:-1]])
+        pnt = start[seg] + 1 + np.arange(len(seg)) - first[seg]
+        # Distance between each vertex and its segment
+        pa = xyz[start[seg]]
+        ab = xyz[end[seg]] - pa
+        den = np.sum(ab * ab, axis=1)
+        tpar = np.sum((xyz[pnt] - pa) * ab, axis=1) / np.where(den > 0,
+                                                               den, 1.)
+        tpar = np.clip(tpar, 0., 1.)
+        dst = np.sqrt(np.sum((xyz[pnt] - pa - tpar[:, None] * ab)**2,
+                             axis=1))
+        # Farthest vertex of each segment
+        dmax = np.maximum.reduceat(dst, first)
+        far = np.nonzero(dst == dmax[seg])[0]
+        _, uidx = np.unique(seg[far], return_index=True)
+        split = pnt[far[uidx]]
+        sig[split] = np.minimum(dmax, parent)
+        # Split the segments
+        start, end = (np.concatenate([start, split]),
+                      np.concatenate([split, end]))
+        parent = np.concatenate([sig[split], sig[split]])
+    return sig
+
+
+def simplify_rings(lons, lats, offsets, tolerance=None, max_vertices=None,
+                   preserve_topology=True):
+    """
+    Simplify a set of rings with the Douglas-Peucker algorithm. When
+    topology is preserved the vertices where neighbouring polygons start or
+    stop sharing their boundary are retained, hence shared boundaries are
+    simplified in the same way in all the polygons.
+
+    :parameter lons:
+        An array with the longitudes of the vertices
+    :parameter lats:
+        An array with the latitudes of the vertices
+    :parameter offsets:
+        An array with the offsets of the rings
+    :parameter float tolerance:
+        The tolerance [km]. Vertices closer than this distance to the
+        simplified boundary are removed.
+    :parameter int max_vertices:
+        The maximum number of vertices of each ring. The most significant
+        vertices are retained. Locked vertices are always retained.
+    :parameter bool preserve_topology:
+        When True shared boundaries are preserved
+    :returns:
+        The updated longitudes, latitudes and offsets plus an array with the
+        relative change of the area of each ring
+    """
+    num = np.diff(offsets)
+    full = num > 0
+    locked = np.zeros(len(lons), dtype=bool)
+    locked[offsets[:-1][full]] = True
+    locked[offsets[1:][full] - 1] = True
+    if preserve_topology:
+        locked |= get_shared_vertices(lons, lats, offsets)
+    sig = get_vertex_significance(lons, lats, offsets, locked)
+
+    keep = np.ones(len(lons), dtype=bool)
+    if tolerance is not None:
+        keep &= sig > tolerance
+    # Rank of the vertices of each ring by significance
+    ridx = get_ring_index(offsets)
+    order = np.lexsort((-sig, ridx))
+    rank = np.empty(len(lons), dtype=int)
+    rank[order] = np.arange(len(lons)) - offsets[:-1][ridx[order]]
+    if max_vertices is not None:
+        keep &= rank < max_vertices
+    # Keep the locked vertices and at least four vertices for each ring
+    keep |= locked | (rank < 4)
+
+    old_areas = get_ring_areas(lons, lats, offsets)
+    lons, lats, offsets = remove_vertices(lons, lats, offsets, ~keep)
+    new_areas = get_ring_areas(lons, lats, offsets)
+    change = (new_areas - old_areas) / np.where(old_areas > 0, old_areas, 1.)
+    return lons, lats, offsets, change
+
+
+def simplify_rings_and_log(lons, lats, offsets, **kwargs):
+    """
+    Simplify a set of rings (see :func:`simplify_rings`) and log the
+    number of vertices removed and the largest relative change of area
+
+    :returns:
+        The updated longitudes, latitudes and offsets plus an array with the
+        relative change of the area of each ring
+    """
+    out = simplify_rings(lons, lats, offsets, **kwargs)
+    LOGGER.info('Simplification: %d vertices reduced to %d', len(lons),
+                len(out[0]))
+    if len(out[3]):
+        LOGGER.info('Largest relative change of area: %.4f',
+                    np.abs(out[3]).max())
+    return out
+
+
+def get_bounding_boxes(lons, lats, offsets):
+    """
+    :parameter lons:
+        An array with the longitudes of the vertices
+    :parameter lats:
+        An array with the latitudes of the vertices
+    :parameter offsets:
+        An array with the offsets of the rings (rings must not be empty)
+    :returns:
+        An array (number of rings x 4) with the minimum longitude, minimum
+        latitude, maximum longitude and maximum latitude of each ring
+    """
+    start = offsets[:-1]
+    return np.column_stack([np.minimum.reduceat(lons, start),
+                            np.minimum.reduceat(lats, start),
+                            np.maximum.reduceat(lons, start),
+                            np.maximum.reduceat(lats, start)])
+
+
+def get_bbox_candidate_pairs(bboxes):
+    """
+    Find the pairs of intersecting bounding boxes with a sort and sweep
+    along the x axis: the boxes are sorted by minimum x and each box is
+    compared only with the following boxes starting before its maximum x.
+
+    :parameter bboxes:
+        An array (number of boxes x 4) with minimum x, minimum y, maximum x
+        and maximum y of each box
+    :returns:
+        An array (number of pairs x 2) with the indexes of the intersecting
+        boxes. In each pair the first index is the smallest one.
+    """
+    bboxes = np.asarray(bboxes, dtype=float).reshape(-1, 4)
+    order = np.argsort(bboxes[:, 0], kind='mergesort')
+    sbox = bboxes[order]
+    # Boxes following box i and starting before its end
+    end = np.searchsorted(sbox[:, 0], sbox[:, 2], side='right')
+    counts = np.maximum(end - np.arange(len(sbox)) - 1, 0)
+    first = np.repeat(np.arange(len(sbox)), counts)
+    shift = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,
+                                                counts)
+    second = first + 1 + shift
+    # Intersection along y
+    ok = ((sbox[first, 1] <= sbox[second, 3]) &
+          (sbox[second, 1] <= sbox[first, 3]))
+    pairs = np.sort(np.column_stack([order[first[ok]], order[second[ok]]]),
+                    axis=1)
+    return pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+
+
+def get_points_in_rings(xpnt, ypnt, ring_idx, lons, lats, offsets,
+                        max_pairs=1 << 22):
+    """
+    Check if a set of points is inside a set of rings with the even-odd
+    (ray casting) rule. Each point is tested against one ring; all the
+    pairs point-edge are processed at once in chunks.
+
+    :parameter xpnt:
+        An array with the longitudes of the points
+    :parameter ypnt:
+        An array with the latitudes of the points
+    :parameter ring_idx:
+        An array with the index of the ring tested for each point
+    :parameter lons:
+        An array with the longitudes of the vertices
+    :parameter lats:
+        An array with the latitudes of the vertices
+    :parameter offsets:
+        An array with the offsets of the rings
+    :parameter int max_pairs:
+        The maximum number of pairs point-edge processed at once
+    :returns:
+        A boolean array, True for the points inside their ring
+    """
+    xpnt = np.asarray(xpnt, dtype=float)
+    ypnt = np.asarray(ypnt, dtype=float)
+    ring_idx = np.asarray(ring_idx, dtype=int)
+    nxt = get_next_index(offsets)
+    num_edges = np.diff(offsets)[ring_idx]
+    cum = np.cumsum(num_edges)
+    bounds = np.unique(np.concatenate([
+        [0], np.searchsorted(cum, np.arange(max_pairs, cum[-1] if len(cum)
+                                            else 0, max_pairs)),
+        [len(xpnt)]]))
+    inside = np.zeros(len(xpnt), dtype=bool)
+    for low, upp in zip(bounds[:-1], bounds[1:]):
+        cnt = num_edges[low:upp]
+        pnt = np.repeat(np.arange(low, upp), cnt)
+        edge = (np.repeat(offsets[:-1][ring_idx[low:upp]], cnt) +
+                np.arange(cnt.sum()) - np.repeat(np.cumsum(cnt) - cnt, cnt))
+        x1, y1 = lons[edge], lats[edge]
+        x2, y2 = lons[nxt[edge]], lats[nxt[edge]]
+        xp, yp = xpnt[pnt], ypnt[pnt]
+        straddle = (y1 > yp) != (y2 > yp)
+        dy = np.where(straddle, y2 - y1, 1.)
+        cross = straddle & (xp < x1 + (x2 - x1) * (yp - y1) / dy)
+        inside[low:upp] = np.bincount(pnt[cross] - low,
+                                      minlength=upp - low) % 2 == 1
+    return inside
+
+
+def get_centroids(lons, lats, offsets):
+    """
+    Compute the centroid of each ring. The mean of the vertices is used for
+    degenerate rings.
+
+    :parameter lons:
+        An array with the longitudes of the vertices
+    :parameter lats:
+        An array with the latitudes of the vertices
+    :parameter offsets:
+        An array with the offsets of the rings
+    :returns:
+        Two arrays with the longitudes and latitudes of the centroids
+    """
+    num = len(offsets) - 1
+    ridx = get_ring_index(offsets)
+    nxt = get_next_index(offsets)
+    cross = lons * lats[nxt] - lons[nxt] * lats
+    area = np.bincount(ridx, weights=cross, minlength=num) / 2.
+    xcen = np.bincount(ridx, weights=(lons + lons[nxt]) * cross,
+                       minlength=num)
+    ycen = np.bincount(ridx, weights=(lats + lats[nxt]) * cross,
+                       minlength=num)
+    counts = np.maximum(np.diff(offsets), 1)
+    xmean = np.bincount(ridx, weights=lons, minlength=num) / counts
+    ymean = np.bincount(ridx, weights=lats, minlength=num) / counts
+    ok = np.abs(area) > 1e-12
+    den = np.where(ok, 6. * area, 1.)
+    return np.where(ok, xcen / den, xmean), np.where(ok, ycen / den, ymean)
+
+
+def get_hilbert_index(xcoo, ycoo, bbox=None, order=16):
+    """
+    Compute the position of a set of points along a Hilbert curve filling
+    a box. Sorting by this index keeps close points close in the sequence.
+
+    :parameter xcoo:
+        An array with the x coordinates of the points
+    :parameter ycoo:
+        An array with the y coordinates of the points
+    :parameter bbox:
+        The box (minimum x, minimum y, maximum x, maximum y) covered by the
+        curve. When None it is the bounding box of the points.
+    :parameter int order:
+        The order of the curve (the box is divided in 2**order x 2**order
+        cells)
+    :returns:
+        An integer array with the Hilbert index of each point
+    """
+    xcoo = np.asarray(xcoo, dtype=float)
+    ycoo = np.asarray(ycoo, dtype=float)
+    if not len(xcoo):
+        return np.zeros(0, dtype=np.int64)
+    if bbox is None:
+        bbox = (xcoo.min(), ycoo.min(), xcoo.max(), ycoo.max())
+    side = 2 ** order
+    cells = []
+    for coo, low, upp in [(xcoo, bbox[0], bbox[2]), (ycoo, bbox[1], bbox[3])]:
+        width = upp - low if upp > low else 1.
+        cells.append(np.clip(((coo - low) / width * side).astype(np.int64),
+                             0, side - 1))
+    xcel, ycel = cells
+    out = np.zeros(len(xcoo), dtype=np.int64)
+    step = side // 2
+    while step > 0:
+        rx = (xcel & step) > 0
+        ry = (ycel & step) > 0
+        out += step * step * ((3 * rx) ^ ry)
+        # Rotate the quadrant
+        flip = ~ry & rx
+        xcel = np.where(flip, side - 1 - xcel, xcel)
+        ycel = np.where(flip, side - 1 - ycel, ycel)
+        swap = ~ry
+        xcel, ycel = np.where(swap, ycel, xcel), np.where(swap, xcel, ycel)
+        step //= 2
+    return out
+
+
+def get_hilbert_order(lons, lats, offsets):
+    """
+    :parameter lons:
+        An array with the longitudes of the vertices
+    :parameter lats:
+        An array with the latitudes of the vertices
+    :parameter offsets:
+        An array with the offsets of the rings
+    :returns:
+        The indexes of the rings sorted by the Hilbert index of their
+        centroids
+    """
+    xcen, ycen = get_centroids(lons, lats, offsets)
+    return np.argsort(get_hilbert_index(xcen, ycen), kind='mergesort')
+
+
+def get_block_bounding_boxes(bboxes, block_size):
+    """
+    Merge the bounding boxes of consecutive groups of rings
+
+    :parameter bboxes:
+        An array (number of rings x 4) with the bounding boxes of the rings
+        (see :func:`get_bounding_boxes`). Undefined (NaN) bounding boxes
+        are ignored.
+    :parameter int block_size:
+        The number of rings in a group (the last one can be smaller)
+    :returns:
+        An array (number of groups x 4) with the bounding boxes of the
+        groups
+    """
+    bboxes = np.asarray(bboxes, dtype=float).reshape(-1, 4)
+    if not len(bboxes):
+        return np.zeros((0, 4))
+    start = np.arange(0, len(bboxes), block_size)
+    return np.column_stack([np.fmin.reduceat(bboxes[:, 0], start),
+                            np.fmin.reduceat(bboxes[:, 1], start),
+                            np.fmax.reduceat(bboxes[:, 2], start),
+                            np.fmax.reduceat(bboxes[:, 3], start)])
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+Module for transforming the coordinates of the polygons between different
+spatial reference systems. Coordinate transformations are cached for each
+thread (they are not thread safe) hence the same transformation is created
+only once by a thread and it is applied to whole arrays of coordinates.
+"""
+
+import threading
+import numpy as np
+import osgeo.osr as osr
+
+_LOCAL = threading.local()
+
+
+def get_spatial_reference(srs=None):
+    """
+    Create a spatial reference
+
+    :parameter srs:
+        An EPSG code, a string with a definition accepted by
+        `osr.SpatialReference.SetFromUserInput` (e.g. 'EPSG:32633', WKT,
+        PROJ.4), an instance of :class:`osr.SpatialReference` or None (WGS84)
+    :returns:
+        An instance of :class:`osr.SpatialReference`
+    """
+    if isinstance(srs, osr.SpatialReference):
+        return srs
+    spatial_reference = osr.SpatialReference()
+    if srs is None:
+        spatial_reference.SetWellKnownGeogCS('WGS84')
+    elif isinstance(srs, int):
+        spatial_reference.ImportFromEPSG(srs)
+    else:
+        spatial_reference.SetFromUserInput(srs)
+    # Use the longitude, latitude order with GDAL >= 3
+    if hasattr(osr, 'OAMS_TRADITIONAL_GIS_ORDER'):
+        spatial_reference.SetAxisMappingStrategy(
+            osr.OAMS_TRADITIONAL_GIS_ORDER)
+    return spatial_reference
+
+
+def is_wgs84(srs):
+    """
+    :parameter srs:
+        An instance of :class:`osr.SpatialReference`
+    :returns:
+        True if the spatial reference is geographic WGS84
+    """
+    return bool(srs.IsSame(get_spatial_reference()))
+
+
+def get_transformation(source, target):
+    """
+    Get the transformation between two spatial reference systems. The
+    transformation is created only the first time it is requested by the
+    current thread.
+
+    :parameter source:
+        The source spatial reference (see :func:`get_spatial_reference`)
+    :parameter target:
+        The target spatial reference (see :func:`get_spatial_reference`)
+    :returns:
+        An instance of :class:`osr.CoordinateTransformation`
+    """
+    source = get_spatial_reference(source)
+    target = get_spatial_reference(target)
+    key = (source.ExportToWkt(), target.ExportToWkt())
+    transformations = getattr(_LOCAL, 'transformations', None)
+    if transformations is None:
+        transformations = _LOCAL.transformations = {}
+    if key not in transformations:
+        transformations[key] = osr.CoordinateTransformation(source, target)
+    return transformations[key]
+
+
+def transform_coordinates(xcoo, ycoo, transformation):
+    """
+    Transform an array of coordinates
+
+    :parameter xcoo:
+        An array with the x coordinates (e.g. longitudes)
+    :parameter ycoo:
+        An array with the y coordinates (e.g. latitudes)
+    :parameter transformation:
+        An instance of :class:`osr.CoordinateTransformation`
+    :returns:
+        Two arrays with the transformed coordinates
+    """
+    if not len(xcoo):
+        return np.array(xcoo, dtype=float), np.array(ycoo, dtype=float)
+    pnts = np.column_stack([xcoo, ycoo]).tolist()
+    out = np.array(transformation.TransformPoints(pnts), dtype=float)
+    return out[:, 0], out[:, 1]
@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+Module for fitting the Gutenberg-Richter parameters of all the zones of a
+model at once. The events of a catalogue, already assigned to the zones
+(see :mod:`hmtk_utils.oq_shp_tools.assignment`), are filtered with a
+completeness table and binned by zone and magnitude; the b-value of every
+zone is then estimated with grouped array operations using either the
+Aki-Utsu maximum likelihood estimator (applied to the annual rates of the
+magnitude bins, to account for the completeness) or the Weichert method.
+The results can be written in the attribute table of a preformatted
+shapefile.
+
+The completeness table follows the HMTK convention: an array with one row
+(year, magnitude) for each completeness interval, i.e. the catalogue is
+complete since `year` for magnitudes larger than `magnitude`.
+"""
+
+import multiprocessing
+import os
+
+import numpy as np
+import osgeo.ogr as ogr
+
+METHODS = ('mle', 'weichert')
+MAX_ITERATIONS = 100
+
+
+def _get_completeness(completeness):
+    """
+    :returns:
+        The completeness table sorted by magnitude
+    """
+    completeness = np.asarray(completeness, dtype=float).reshape(-1, 2)
+    if not len(completeness):
+        raise ValueError('The completeness table is empty')
+    return completeness[np.argsort(completeness[:, 1])]
+
+
+def get_completeness_years(mags, completeness):
+    """
+    :parameter mags:
+        An array with the magnitudes of the events
+    :parameter completeness:
+        The completeness table
+    :returns:
+        An array with the first year of completeness of each magnitude
+        (infinite for magnitudes below the completeness)
+    """
+    completeness = _get_completeness(completeness)
+    idx = np.searchsorted(completeness[:, 1], mags, side='right') - 1
+    out = np.empty(len(idx))
+    out.fill(np.inf)
+    out[idx >= 0] = completeness[idx[idx >= 0], 0]
+    return out
+
+
+def _get_counts(mags, years, zones, num_zones, completeness, end_year,
+                bin_width):
+    """
+    Bin the complete events by zone and magnitude. The bins start at the
+    smallest completeness magnitude Mc (edges Mc + k * bin_width) and the
+    magnitudes are treated as continuous values.
+
+    :returns:
+        A 2D array (number of zones x number of bins) with the number of
+        events, the centres of the bins, the duration of completeness of
+        each bin and the smallest completeness magnitude
+    """
+    completeness = _get_completeness(completeness)
+    min_mag = completeness[0, 1]
+    ok = ((zones >= 0) & (zones < num_zones) &
+          (years >= get_completeness_years(mags, completeness)) &
+          (years <= end_year))
+    bins = np.floor((mags[ok] - min_mag) / bin_width + 1e-7).astype(int)
+    num_bins = bins.max() + 1 if len(bins) else 1
+    counts = np.bincount(zones[ok] * num_bins + bins,
+                         minlength=num_zones * num_bins).reshape(
+                             num_zones, num_bins).astype(float)
+    edges = min_mag + np.arange(num_bins) * bin_width
+    durations = end_year - get_completeness_years(edges + 1e-7,
+                                                  completeness) + 1
+    centres = edges + bin_width / 2.
+    return counts, centres, durations, min_mag
+
+
+def _get_weichert_beta(counts, centres, durations, tolerance=1e-7):
+    """
+    Solve the Weichert equation for all the zones with Newton iterations
+
+    :returns:
+        An array with the beta of each zone
+    """
+    total = counts.sum(axis=1)
+    mbar = counts.dot(centres) / np.maximum(total, 1)
+    beta = np.ones(len(counts)) * np.log(10.)
+    active = total > 0
+    for _ in range(MAX_ITERATIONS):
+        wei = durations[None, :] * np.exp(-beta[active, None] *
+                                          centres[None, :])
+        norm = wei.sum(axis=1)
+        mean = wei.dot(centres) / norm
+        var = wei.dot(centres ** 2) / norm - mean ** 2
+        step = (mean - mbar[active]) / np.maximum(var, 1e-12)
+        beta[active] += step
+        active[active] = np.abs(step) > tolerance
+        if not active.any():
+            break
+    return beta
+
+
+def fit_recurrence(mags, years, zones, num_zones, completeness,
+                   end_year=None, bin_width=0.1, method='weichert',
+                   min_events=5):
+    """
+    Fit the Gutenberg-Richter parameters of a set of zones
+
+    :parameter mags:
+        An array with the magnitudes of the events (treated as continuous
+        values)
+    :parameter years:
+        An array with the years of the events
+    :parameter zones:
+        An array with the index of the zone of each event (-1 for the
+        events outside the zones)
+    :parameter int num_zones:
+        The number of zones
+    :parameter completeness:
+        The completeness table
+    :parameter int end_year:
+        The last year of the catalogue. When None it is the largest year.
+    :parameter float bin_width:
+        The width of the magnitude bins. The bins start at the smallest
+        completeness magnitude.
+    :parameter str method:
+        'mle' (Aki-Utsu) or 'weichert'
+    :parameter int min_events:
+        The minimum number of complete events required to fit a zone
+    :returns:
+        A dictionary with the arrays `a_value`, `b_value`, `num_events`
+        (complete events used) and `max_obs` (largest magnitude observed in
+        each zone). The parameters of the zones with too few events are NaN.
+    """
+    if method not in METHODS:
+        raise ValueError('Unsupported method: %s' % method)
+    mags = np.asarray(mags, dtype=float)
+    years = np.asarray(years, dtype=float)
+    zones = np.asarray(zones, dtype=int)
+    if end_year is None:
+        end_year = years.max()
+    counts, centres, durations, min_mag = _get_counts(
+        mags, years, zones, num_zones, completeness, end_year, bin_width)
+    total = counts.sum(axis=1)
+    if method == 'weichert':
+        beta = _get_weichert_beta(counts, centres, durations)
+    else:
+        # Mean magnitude of the annual rates of each bin
+        rates = counts / durations[None, :]
+        mbar = rates.dot(centres) / np.maximum(rates.sum(axis=1), 1e-12)
+        with np.errstate(divide='ignore'):
+            beta = 1. / (mbar - min_mag)
+    # Annual rate of events above the smallest completeness magnitude
+    with np.errstate(over='ignore', invalid='ignore'):
+        wei = np.exp(-beta[:, None] * centres[None, :])
+        rate = total * wei.sum(axis=1) / (wei * durations[None, :]).sum(
+            axis=1)
+    b_value = beta / np.log(10.)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a_value = np.log10(rate) + b_value * min_mag
+    few = total < max(min_events, 1)
+    a_value[few] = np.nan
+    b_value[few] = np.nan
+
+    max_obs = np.empty(num_zones)
+    max_obs.fill(-np.inf)
+    inside = (zones >= 0) & (zones < num_zones)
+    np.maximum.at(max_obs, zones[inside], mags[inside])
+    max_obs[np.isinf(max_obs)] = np.nan
+    return {'a_value': a_value, 'b_value': b_value,
+            'num_events': total.astype(int), 'max_obs': max_obs}
+
+
+def _fit_sample(args):
+    """
+    Fit the parameters of a bootstrap sample of the catalogue
+    """
+    seed, mags, years, zones, num_zones, kwargs = args
+    idx = np.random.RandomState(seed).randint(0, len(mags), len(mags))
+    out = fit_recurrence(mags[idx], years[idx], zones[idx], num_zones,
+                         **kwargs)
+    return out['a_value'], out['b_value']
+
+
+def bootstrap_recurrence(mags, years, zones, num_zones, completeness,
+                         num_samples=100, processes=None, seed=None,
+                         **kwargs):
+    """
+    Estimate the uncertainty of the Gutenberg-Richter parameters by fitting
+    catalogues resampled with replacement. The samples are fitted in a pool
+    of processes.
+
+    :parameter num_samples:
+        The number of bootstrap samples
+    :parameter int processes:
+        The number of processes (1 to fit the samples in this process)
+    :parameter int seed:
+        The seed of the random numbers
+    :returns:
+        The dictionary returned by :func:`fit_recurrence` for the whole
+        catalogue plus the standard deviations `a_std` and `b_std` and the
+        correlation `ab_corr` of the parameters of each zone
+
+    The other parameters are the ones of :func:`fit_recurrence`.
+    """
+    mags = np.asarray(mags, dtype=float)
+    years = np.asarray(years, dtype=float)
+    zones = np.asarray(zones, dtype=int)
+    kwargs['completeness'] = completeness
+    if kwargs.get('end_year') is None:
+        kwargs['end_year'] = years.max()
+    out = fit_recurrence(mags, years, zones, num_zones, **kwargs)
+    seeds = np.random.RandomState(seed).randint(0, 2 ** 31 - 1, num_samples)
+    args = [(s, mags, years, zones, num_zones, kwargs) for s in seeds]
+    if processes == 1:
+        results = [_fit_sample(arg) for arg in args]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_fit_sample, args)
+        finally:
+            pool.close()
+            pool.join()
+    a_samples = np.array([res[0] for res in results])
+    b_samples = np.array([res[1] for res in results])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out['a_std'] = np.nanstd(a_samples, axis=0)
+        out['b_std'] = np.nanstd(b_samples, axis=0)
+        a_dev = a_samples - np.nanmean(a_samples, axis=0)
+        b_dev = b_samples - np.nanmean(b_samples, axis=0)
+        out['ab_corr'] = (np.nanmean(a_dev * b_dev, axis=0) /
+                          (out['a_std'] * out['b_std']))
+    return out
+
+
+def update_recurrence_attributes(filename, ids, a_values, b_values,
+                                 max_mags=None, id_field='src_id'):
+    """
+    Write the Gutenberg-Richter parameters in the attribute table of a
+    preformatted shapefile. Only the .dbf file is opened hence the
+    geometries are not rewritten. NaN values are not written.
+
+    :parameter str filename:
+        The name of the shapefile
+    :parameter ids:
+        The IDs of the zones
+    :parameter a_values:
+        An array with the a-values of the zones
+    :parameter b_values:
+        An array with the b-values of the zones
+    :parameter max_mags:
+        An array with the maximum magnitudes of the zones or None
+    :parameter str id_field:
+        The name of the field with the IDs
+    :returns:
+        The number of features updated
+    """
+    dbf_filename = os.path.splitext(filename)[0] + '.dbf'
+    if not os.path.isfile(dbf_filename):
+        raise IOError("The file %s doesn't exists" % dbf_filename)
+    data_source = ogr.GetDriverByName('ESRI Shapefile').Open(dbf_filename, 1)
+    if data_source is None:
+        raise IOError("The file %s cannot be opened" % dbf_filename)
+    layer = data_source.GetLayer()
+    values = [('a_value', a_values), ('b_value', b_values)]
+    if max_mags is not None:
+        values.append(('max_mag', max_mags))
+    layer_defn = layer.GetLayerDefn()
+    for name, _ in values + [(id_field, None)]:
+        if layer_defn.GetFieldIndex(name) < 0:
+            raise ValueError('The shapefile does not contain the field %s' %
+                             name)
+    positions = dict((str(key), i) for i, key in enumerate(ids))
+
+    num = 0
+    layer.ResetReading()
+    feature = layer.GetNextFeature()
+    while feature is not None:
+        pos = positions.get(str(feature.GetField(id_field)))
+        if pos is not None:
+            for name, vals in values:
+                if not np.isnan(vals[pos]):
+                    feature.SetField(name, float(vals[pos]))
+            layer.SetFeature(feature)
+            num += 1
+        feature.Destroy()
+        feature = layer.GetNextFeature()
+    data_source.SyncToDisk()
+    data_source.Destroy()
+    return num
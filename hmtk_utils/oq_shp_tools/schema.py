@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+Module for describing how the fields of a shapefile not following the
+template (see `tests/oq_shp_tools/dat/oq_area_source_template.shp`)
+correspond to the fields of the preformatted shapefile. A schema is a
+dictionary (or a json or yaml file) like::
+
+    {"fields": {"src_id": "ZONE_ID", "b_value": "bval"},
+     "families": {"strike_": "NP{n}_STK", "dip_": "NP{n}_DIP",
+                  "weight_": {"pattern": "W{n}", "start": 0}},
+     "config": {"trt": "Active Shallow Crust"},
+     "defaults": {"rupt_aspect_ratio": 1.0}}
+
+`fields` maps single fields (numbered fields included, e.g. to change the
+order of the nodal planes), `families` maps families of numbered fields
+using a pattern where `{n}` is the number (`start` is the number of the
+first field in the shapefile, 1 by default), `config` and `defaults` are
+passed to :func:`hmtk_utils.oq_shp_tools.parsers.parse_area_source_shp`.
+The schema is compiled once against the fields of a layer into a map from
+the names of the template to the names of the layer.
+"""
+
+import json
+import os
+import re
+
+from source_table import MAPPING_FIELDS, MAPPING_RAGGED_FIELDS
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+SCHEMA_KEYS = ('fields', 'families', 'config', 'defaults')
+
+TEMPLATE_FIELDS = set(MAPPING_FIELDS.values()) | set(
+    count for count, _ in MAPPING_RAGGED_FIELDS.values())
+
+TEMPLATE_PREFIXES = set(prefix for _, prefix in
+                        MAPPING_RAGGED_FIELDS.values())
+
+
+def _is_template_field(name):
+    """
+    :returns:
+        True if a name is a field of the preformatted shapefile
+    """
+    if name in TEMPLATE_FIELDS:
+        return True
+    for prefix in TEMPLATE_PREFIXES:
+        if name.startswith(prefix) and name[len(prefix):].isdigit():
+            return True
+    return False
+
+
+def load_schema(schema):
+    """
+    Load and validate a schema
+
+    :parameter schema:
+        A dictionary or the name of a json or yaml file
+    :returns:
+        A dictionary
+    """
+    if not isinstance(schema, dict):
+        if not os.path.isfile(schema):
+            raise IOError("The schema file %s doesn't exists" % schema)
+        with open(schema) as fin:
+            if os.path.splitext(schema)[1].lower() in ('.yml', '.yaml'):
+                if yaml is None:
+                    raise ImportError('PyYAML is required to read %s' %
+                                      schema)
+                schema = yaml.safe_load(fin)
+            else:
+                schema = json.load(fin)
+    for key in schema:
+        if key not in SCHEMA_KEYS:
+            raise ValueError('Unknown key in schema: %s' % key)
+    for name in schema.get('fields', {}):
+        if not _is_template_field(name):
+            raise ValueError('Unknown template field: %s' % name)
+    for prefix in schema.get('families', {}):
+        if prefix not in TEMPLATE_PREFIXES:
+            raise ValueError('Unknown family of fields: %s' % prefix)
+    return schema
+
+
+def _get_family_regex(pattern):
+    """
+    :returns:
+        A compiled regular expression matching the names of a family of
+        fields; the group matches the number
+    """
+    if pattern.count('{n}') != 1:
+        raise ValueError('The pattern %s must contain {n} once' % pattern)
+    before, after = pattern.split('{n}')
+    return re.compile('^%s(\\d+)%s$' % (re.escape(before), re.escape(after)),
+                      re.IGNORECASE)
+
+
+def compile_schema(schema, field_names):
+    """
+    Compile a schema for a layer
+
+    :parameter schema:
+        A dictionary or the name of a json or yaml file
+    :parameter list field_names:
+        The names of the fields of the layer
+    :returns:
+        A dictionary with the `column_map`, `config` and `defaults`
+        parameters of
+        :func:`hmtk_utils.oq_shp_tools.parsers.parse_area_source_shp`
+    """
+    schema = load_schema(schema)
+    column_map = {}
+    for prefix, family in schema.get('families', {}).items():
+        if not isinstance(family, dict):
+            family = {'pattern': family}
+        regex = _get_family_regex(family['pattern'])
+        shift = 1 - family.get('start', 1)
+        for field in field_names:
+            match = regex.match(field)
+            if match:
+                column_map['%s%d' % (prefix, int(match.group(1)) + shift)] = \
+                    field
+    # Single fields have priority over families
+    for name, field in schema.get('fields', {}).items():
+        if field not in field_names:
+            raise ValueError('Field %s not found in the shapefile' % field)
+        column_map[name] = field
+    return {'column_map': column_map,
+            'config': dict(schema.get('config', {})),
+            'defaults': dict(schema.get('defaults', {}))}
@@ -44,8 +44,18 @@
 # liability for use of the software.
 #
 
+import json
+import os
 import sys
-from osgeo import ogr
+import zipfile
+import numpy as np
+
+import polygons as poly
+
+from osgeo import gdal, ogr
+
+# Number of features of a block of the spatial index
+BLOCK_SIZE = 64
 
 
 def _add_string_field(layer, field_name, length=32):
@@ -125,3 +135,267 @@ def create_datasource(shp_file_path):
         print "Creation of output file failed.\n"
         sys.exit(1)
     return ds
+
+
+def get_field_arrays(layer, field_names=None):
+    """
+    Read the attribute table of a layer into a set of arrays, one for each
+    field. Real fields are returned as float arrays (NaN when the field is
+    not set), integer fields as integer arrays (0 when not set) and all the
+    other fields as object arrays (None when not set).
+
+    :parameter layer:
+        An instance of :class:`ogr.Layer`
+    :parameter list field_names:
+        The names of the fields to be read. Names not included in the
+        attribute table are ignored. When None all the fields are read.
+    :returns:
+        A dictionary whose keys are the field names and values the arrays
+        with the content of the attribute table
+    """
+    defn = layer.GetLayerDefn()
+    if field_names is None:
+        field_names = [defn.GetFieldDefn(i).GetName() for i in
+                       range(defn.GetFieldCount())]
+    num = layer.GetFeatureCount()
+
+    # Get the index of each field once
+    fields = []
+    out = {}
+    for name in field_names:
+        idx = defn.GetFieldIndex(name)
+        if idx < 0:
+            continue
+        ftype = defn.GetFieldDefn(idx).GetType()
+        if ftype == ogr.OFTReal:
+            out[name] = np.empty(num)
+            out[name].fill(np.nan)
+            fields.append((out[name], idx, 'GetFieldAsDouble'))
+        elif ftype == ogr.OFTInteger:
+            out[name] = np.zeros(num, dtype=int)
+            fields.append((out[name], idx, 'GetFieldAsInteger'))
+        else:
+            out[name] = np.empty(num, dtype=object)
+            fields.append((out[name], idx, 'GetField'))
+
+    # Fill the arrays
+    layer.ResetReading()
+    for i, feature in enumerate(layer):
+        for arr, idx, getter in fields:
+            if feature.IsFieldSet(idx):
+                arr[i] = getattr(feature, getter)(idx)
+    layer.ResetReading()
+    return out
+
+
+def get_ring_arrays(layer):
+    """
+    Read the exterior rings of the polygons in a layer into a set of arrays
+
+    :parameter layer:
+        An instance of :class:`ogr.Layer`
+    :returns:
+        Three arrays: longitudes and latitudes of the vertices of all the
+        rings and the offsets (number of polygons + 1) of the first vertex
+        of each ring
+    """
+    coords = []
+    num = [0]
+    layer.ResetReading()
+    for feature in layer:
+        ring = feature.GetGeometryRef().GetGeometryRef(0)
+        pnts = ring.GetPoints() or []
+        dim = len(pnts[0]) if len(pnts) else 2
+        pnts = np.array(pnts, dtype=float).reshape(len(pnts), dim)[:, :2]
+        coords.append(pnts)
+        num.append(len(pnts))
+    layer.ResetReading()
+    offsets = np.cumsum(num)
+    if not len(coords):
+        return np.array([]), np.array([]), offsets
+    coords = np.concatenate(coords)
+    return coords[:, 0].copy(), coords[:, 1].copy(), offsets
+
+
+def get_attribute_definitions(layer):
+    """
+    Get the definition of the fields in the attribute table of a layer in
+    the format used by :func:`add_attributes`. Fields which are neither
+    integer nor real are described as strings.
+
+    :parameter layer:
+        An instance of :class:`ogr.Layer`
+    :returns:
+        A list of dictionaries
+    """
+    defn = layer.GetLayerDefn()
+    out = []
+    for i in range(defn.GetFieldCount()):
+        fdefn = defn.GetFieldDefn(i)
+        if fdefn.GetType() == ogr.OFTReal:
+            out.append({'name': fdefn.GetName(), 'type': 'Real'})
+        elif fdefn.GetType() == ogr.OFTInteger:
+            out.append({'name': fdefn.GetName(), 'type': 'Integer'})
+        else:
+            out.append({'name': fdefn.GetName(), 'type': 'String',
+                        'len': fdefn.GetWidth()})
+    return out
+
+
+def get_vsi_path(filename):
+    """
+    Get the path used by GDAL to read a shapefile stored in an archive. A
+    zip archive containing a single shapefile is opened through /vsizip/
+    (the name of the shapefile is added to the path), a gzip file through
+    /vsigzip/. Other paths, GDAL virtual paths included, are returned as
+    they are.
+
+    :parameter str filename:
+        The name of the file
+    :returns:
+        A string
+    """
+    if filename.startswith('/vsi') or not os.path.isfile(filename):
+        return filename
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.zip':
+        path = '/vsizip/' + os.path.abspath(filename)
+        with zipfile.ZipFile(filename) as zfile:
+            shps = [name for name in zfile.namelist() if
+                    name.lower().endswith('.shp')]
+        if len(shps) == 1:
+            path += '/' + shps[0]
+        return path
+    elif ext == '.gz':
+        return '/vsigzip/' + os.path.abspath(filename)
+    return filename
+
+
+def path_exists(filename):
+    """
+    :parameter str filename:
+        The name of a file or a GDAL virtual path
+    :returns:
+        True if the file exists
+    """
+    if filename.startswith('/vsi'):
+        return gdal.VSIStatL(filename) is not None
+    return os.path.isfile(filename)
+
+
+def write_vsimem_zip(path, archive):
+    """
+    Move the files stored in a folder of the GDAL memory file system into a
+    zip archive
+
+    :parameter str path:
+        The folder (e.g. '/vsimem/shapefiles/')
+    :parameter str archive:
+        The name of the zip archive
+    """
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zfile:
+        for name in sorted(gdal.ReadDir(path) or []):
+            filename = path.rstrip('/') + '/' + name
+            size = gdal.VSIStatL(filename).size
+            fvsi = gdal.VSIFOpenL(filename, 'rb')
+            try:
+                zfile.writestr(name, gdal.VSIFReadL(1, size, fvsi))
+            finally:
+                gdal.VSIFCloseL(fvsi)
+            gdal.Unlink(filename)
+
+
+def get_block_index_filename(filename):
+    """
+    :parameter str filename:
+        The name of a shapefile or of a nrml file
+    :returns:
+        The name of the json file with the index of the blocks of features
+        (e.g. `model.blocks.json` for `model.xml.gz`)
+    """
+    if filename.lower().endswith('.gz'):
+        filename = filename[:-3]
+    return os.path.splitext(filename)[0] + '.blocks.json'
+
+
+def write_block_index(filename, bboxes, block_size=BLOCK_SIZE,
+                      offsets=None):
+    """
+    Write the bounding boxes of the blocks of consecutive features of a
+    file. The file is written through the GDAL virtual file systems hence
+    it can be created in memory (/vsimem/).
+
+    :parameter str filename:
+        The name of the shapefile or of the nrml file indexed
+    :parameter bboxes:
+        An array (number of features x 4) with the bounding boxes of the
+        features in the order of the file
+    :parameter int block_size:
+        The number of features of each block
+    :parameter offsets:
+        An array (number of features + 1) with the byte offsets of the
+        features in the file or None
+    :returns:
+        The name of the index
+    """
+    blocks = []
+    block_bboxes = poly.get_block_bounding_boxes(bboxes, block_size)
+    for i, bbox in enumerate(block_bboxes):
+        first = i * block_size
+        num = min(block_size, len(bboxes) - first)
+        block = {'first': first, 'num': num,
+                 'bbox': [float(val) for val in bbox]}
+        if offsets is not None:
+            block['offset'] = int(offsets[first])
+            block['length'] = int(offsets[first + num] - offsets[first])
+        blocks.append(block)
+    out = get_block_index_filename(filename)
+    data = json.dumps({'block_size': block_size, 'blocks': blocks},
+                      indent=1)
+    fvsi = gdal.VSIFOpenL(out, 'wb')
+    try:
+        gdal.VSIFWriteL(data, 1, len(data), fvsi)
+    finally:
+        gdal.VSIFCloseL(fvsi)
+    return out
+
+
+def get_blocks_in_bbox(filename, bbox):
+    """
+    Find the blocks of features of a file intersecting a region
+
+    :parameter str filename:
+        The name of a shapefile or of a nrml file written with an index
+        (see :func:`write_block_index`)
+    :parameter bbox:
+        The region (minimum x, minimum y, maximum x, maximum y)
+    :returns:
+        A list with the blocks (dictionaries with the index of the first
+        feature `first`, the number of features `num`, the bounding box
+        `bbox` and, for nrml files, the byte range `offset` and `length`)
+    """
+    index_filename = get_block_index_filename(filename)
+    if not path_exists(index_filename):
+        raise IOError("The index %s doesn't exists" % index_filename)
+    size = gdal.VSIStatL(index_filename).size
+    fvsi = gdal.VSIFOpenL(index_filename, 'rb')
+    try:
+        blocks = json.loads(gdal.VSIFReadL(1, size, fvsi))['blocks']
+    finally:
+        gdal.VSIFCloseL(fvsi)
+    return [block for block in blocks if
+            block['bbox'][0] <= bbox[2] and bbox[0] <= block['bbox'][2] and
+            block['bbox'][1] <= bbox[3] and bbox[1] <= block['bbox'][3]]
+
+
+def write_report(report, filename):
+    """
+    Write a report (e.g. of the checks of a model) in json format
+
+    :parameter dict report:
+        A dictionary with the report
+    :parameter str filename:
+        Name of the output file
+    """
+    with open(filename, 'w') as fout:
+        json.dump(report, fout, indent=2, sort_keys=True)
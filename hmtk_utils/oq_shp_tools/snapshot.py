@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+Module for saving the area sources of a model into a binary snapshot and
+for loading them back. A snapshot is a single file containing a header
+followed by the arrays of an
+:class:`hmtk_utils.oq_shp_tools.source_table.AreaSourceTable` stored one
+after the other. When a snapshot is loaded the arrays are memory mapped
+hence only the parts of the columns actually used are read from disk.
+
+The layout of a snapshot is:
+
+- the magic string `HMTKSNAP` (8 bytes)
+- the version of the format (unsigned 32 bit integer, little endian)
+- the length of the header (unsigned 64 bit integer, little endian)
+- the header: a json dictionary containing for each array its type, its
+  shape and the position of its first byte relative to the start of the
+  data section
+- the data section, starting at the first multiple of :data:`ALIGNMENT`
+  following the header. Each array starts at a multiple of
+  :data:`ALIGNMENT`.
+"""
+
+import json
+import struct
+import numpy as np
+
+from source_table import AreaSourceTable, COLUMNS, RAGGED_COLUMNS
+
+MAGIC = 'HMTKSNAP'
+VERSION = 1
+ALIGNMENT = 64
+_PREFIX = struct.Struct('<8sIQ')
+
+
+def _align(position):
+    """
+    :returns:
+        The first multiple of :data:`ALIGNMENT` not smaller than position
+    """
+    return -(-position // ALIGNMENT) * ALIGNMENT
+
+
+def _get_storable_array(values):
+    """
+    Convert an array into an array with a fixed size type. Strings are
+    encoded in UTF-8 and None values are stored as empty strings.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind in 'OU':
+        encoded = []
+        for value in values:
+            if value is None:
+                value = ''
+            elif isinstance(value, unicode):
+                value = value.encode('utf-8')
+            encoded.append(str(value))
+        values = np.array(encoded, dtype='S%d' % max(
+            [1] + [len(value) for value in encoded]))
+    return np.ascontiguousarray(values)
+
+
+def save_snapshot(table, filename):
+    """
+    Save a set of area sources into a snapshot
+
+    :parameter table:
+        An instance of
+        :class:`hmtk_utils.oq_shp_tools.source_table.AreaSourceTable`
+    :parameter str filename:
+        The name of the snapshot file
+    """
+    arrays = []
+    header = {'num_sources': len(table), 'columns': {}}
+    position = 0
+    for name in COLUMNS:
+        values = _get_storable_array(getattr(table, name))
+        header['columns'][name] = {'dtype': values.dtype.str,
+                                   'shape': list(values.shape),
+                                   'offset': position}
+        arrays.append((position, values))
+        position = _align(position + values.nbytes)
+    header = json.dumps(header, sort_keys=True)
+    start = _align(_PREFIX.size + len(header))
+
+    with open(filename, 'wb') as fout:
+        fout.write(_PREFIX.pack(MAGIC, VERSION, len(header)))
+        fout.write(header)
+        for offset, values in arrays:
+            fout.seek(start + offset)
+            fout.write(values.tobytes())
+        fout.truncate(start + position)
+
+
+def read_snapshot_header(filename):
+    """
+    Read the header of a snapshot
+
+    :parameter str filename:
+        The name of the snapshot file
+    :returns:
+        A dictionary with the header and the position of the data section
+    """
+    with open(filename, 'rb') as fin:
+        prefix = fin.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size:
+            raise ValueError('%s is not a snapshot' % filename)
+        magic, version, length = _PREFIX.unpack(prefix)
+        if magic != MAGIC:
+            raise ValueError('%s is not a snapshot' % filename)
+        if version != VERSION:
+            raise ValueError('Unsupported snapshot version: %d' % version)
+        header = json.loads(fin.read(length))
+    header['data_start'] = _align(_PREFIX.size + length)
+    return header
+
+
+def load_snapshot(filename, columns=None, mmap=True):
+    """
+    Load a set of area sources from a snapshot
+
+    :parameter str filename:
+        The name of the snapshot file
+    :parameter list columns:
+        The names of the columns to be loaded. When None all the columns
+        are loaded. Columns not loaded get default values. The offsets of
+        the ragged columns requested are always loaded.
+    :parameter bool mmap:
+        When True the arrays are memory mapped (read-only) otherwise they
+        are read into memory
+    :returns:
+        An instance of
+        :class:`hmtk_utils.oq_shp_tools.source_table.AreaSourceTable`
+    """
+    header = read_snapshot_header(filename)
+    names = set(COLUMNS if columns is None else columns) | set(['id'])
+    # The offsets of the ragged columns are always loaded with their values
+    for offsets, values in RAGGED_COLUMNS:
+        if names & set(values):
+            names.add(offsets)
+    out = {}
+    for name in names:
+        info = header['columns'][name]
+        dtype = np.dtype(str(info['dtype']))
+        shape = tuple(info['shape'])
+        offset = header['data_start'] + info['offset']
+        if not np.prod(shape):
+            out[name] = np.zeros(shape, dtype=dtype)
+        elif mmap:
+            out[name] = np.memmap(filename, dtype=dtype, mode='r',
+                                  offset=offset, shape=shape)
+        else:
+            with open(filename, 'rb') as fin:
+                fin.seek(offset)
+                out[name] = np.fromfile(fin, dtype=dtype, count=int(
+                    np.prod(shape))).reshape(shape)
+    return AreaSourceTable(**out)
@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+Module defining a compact, array-backed container for the area sources of a
+model. All the sources are stored in parallel arrays (one element for each
+source) while the nodal plane distributions, the hypocentral depth
+distributions, the occurrence rates of incremental MFDs and the vertices of
+the polygons are stored in ragged arrays: the values of the i-th source are
+the ones between `offsets[i]` and `offsets[i+1]`. Instances of
+:class:`AreaSource` are created only on demand.
+"""
+
+import numpy as np
+
+import polygons as poly
+
+from attribute_tools import get_numbered_columns, get_ragged_from_matrix, \
+    get_matrix_from_ragged, take_ragged
+
+from openquake.nrmllib.models import AreaSource, TGRMFD, IncrementalMFD, \
+    NodalPlane, HypocentralDepth, AreaGeometry
+
+TGR_MFD = 'truncGutenbergRichterMFD'
+INCR_MFD = 'IncrementalMFD'
+
+# Columns with one value for each source
+STRING_COLUMNS = ('id', 'name', 'trt', 'mag_scale_rel', 'mfd_type')
+FLOAT_COLUMNS = ('rupt_aspect_ratio', 'upper_seismo_depth',
+                 'lower_seismo_depth', 'a_val', 'b_val', 'min_mag',
+                 'max_mag', 'bin_width')
+
+# Ragged columns: name of the offsets and names of the values
+RAGGED_COLUMNS = (('rate_offsets', ('occur_rates',)),
+                  ('npd_offsets', ('npd_probability', 'npd_strike',
+                                   'npd_dip', 'npd_rake')),
+                  ('hdd_offsets', ('hdd_probability', 'hdd_depth')),
+                  ('ring_offsets', ('lons', 'lats')))
+
+COLUMNS = STRING_COLUMNS + FLOAT_COLUMNS + tuple(
+    name for offsets, values in RAGGED_COLUMNS for name in
+    (offsets,) + values)
+
+# Correspondence between the columns of the table and the fields of the
+# attribute table of a preformatted shapefile
+MAPPING_FIELDS = {'id': 'src_id', 'name': 'src_name', 'trt': 'tect_reg',
+                  'mag_scale_rel': 'mag_scal_r', 'mfd_type': 'mfd_type',
+                  'rupt_aspect_ratio': 'rup_asp_ra',
+                  'upper_seismo_depth': 'upp_seismo',
+                  'lower_seismo_depth': 'low_seismo',
+                  'a_val': 'a_value', 'b_val': 'b_value',
+                  'min_mag': 'min_mag', 'max_mag': 'max_mag',
+                  'bin_width': 'bin_width'}
+
+MAPPING_RAGGED_FIELDS = {'occur_rates': ('num_bins', 'or_'),
+                         'npd_probability': ('num_npd', 'weight_'),
+                         'npd_strike': ('num_npd', 'strike_'),
+                         'npd_dip': ('num_npd', 'dip_'),
+                         'npd_rake': ('num_npd', 'rake_'),
+                         'hdd_probability': ('num_hdd', 'hdd_w_'),
+                         'hdd_depth': ('num_hdd', 'hdd_d_')}
+
+
+def _get_string_array(values):
+    """
+    Create an array of strings (an array of objects if some values are not
+    strings). Arrays are used as they are.
+    """
+    if isinstance(values, np.ndarray):
+        return values
+    if not len(values):
+        return np.array([], dtype=object)
+    return np.array(list(values))
+
+
+class AreaSourceTable(object):
+    """
+    A set of area sources stored in arrays. The names of the arrays are
+    listed in :data:`COLUMNS`.
+
+    Indexing the table with an integer returns an instance of
+    :class:`AreaSource` created on demand; iterating over the table creates
+    one instance at a time.
+    """
+
+    __slots__ = COLUMNS
+
+    def __init__(self, **columns):
+        num = len(columns['id'])
+        for name in STRING_COLUMNS:
+            values = columns.get(name)
+            setattr(self, name, _get_string_array(
+                [None] * num if values is None else values))
+        for name in FLOAT_COLUMNS:
+            values = columns.get(name)
+            if values is None:
+                values = np.empty(num)
+                values.fill(np.nan)
+            setattr(self, name, np.asanyarray(values, dtype=float))
+        for offsets, names in RAGGED_COLUMNS:
+            setattr(self, offsets, np.asanyarray(
+                columns.get(offsets, np.zeros(num + 1)), dtype=int))
+            for name in names:
+                setattr(self, name, np.asanyarray(
+                    columns.get(name, np.array([])), dtype=float))
+
+    def __len__(self):
+        return len(self.id)
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError('Source index out of range')
+        return self.get_source(idx)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self.get_source(idx)
+
+    def get_polygon(self, idx):
+        """
+        :parameter int idx:
+            The index of a source
+        :returns:
+            Two arrays with the longitudes and latitudes of the vertices of
+            the polygon
+        """
+        low, upp = self.ring_offsets[idx], self.ring_offsets[idx + 1]
+        return self.lons[low:upp], self.lats[low:upp]
+
+    def get_mfd(self, idx):
+        """
+        :parameter int idx:
+            The index of a source
+        :returns:
+            An instance of :class:`TGRMFD` or :class:`IncrementalMFD`
+        """
+        if self.mfd_type[idx] == TGR_MFD:
+            return TGRMFD(a_val=self.a_val[idx], b_val=self.b_val[idx],
+                          min_mag=self.min_mag[idx],
+                          max_mag=self.max_mag[idx])
+        elif self.mfd_type[idx] == INCR_MFD:
+            low, upp = self.rate_offsets[idx], self.rate_offsets[idx + 1]
+            return IncrementalMFD(min_mag=self.min_mag[idx],
+                                  bin_width=self.bin_width[idx],
+                                  occur_rates=list(self.occur_rates[low:upp]))
+        raise ValueError('Unsupported MFD type: %s' % self.mfd_type[idx])
+
+    def get_source(self, idx):
+        """
+        Create the :class:`AreaSource` instance of one source
+
+        :parameter int idx:
+            The index of a source
+        :returns:
+            An instance of :class:`AreaSource`
+        """
+        lons, lats = self.get_polygon(idx)
+        points = ['%.5f %.5f' % (lon, lat) for lon, lat in zip(lons, lats)]
+        if len(points) and points[0] != points[-1]:
+            points.append(points[0])
+        geometry = AreaGeometry(
+            wkt='POLYGON((%s))' % (', '.join(points)),
+            upper_seismo_depth=self.upper_seismo_depth[idx],
+            lower_seismo_depth=self.lower_seismo_depth[idx])
+
+        low, upp = self.npd_offsets[idx], self.npd_offsets[idx + 1]
+        nodal_planes = [NodalPlane(probability=self.npd_probability[i],
+                                   strike=self.npd_strike[i],
+                                   dip=self.npd_dip[i],
+                                   rake=self.npd_rake[i]) for i in
+                        range(low, upp)]
+        low, upp = self.hdd_offsets[idx], self.hdd_offsets[idx + 1]
+        hypo_depths = [HypocentralDepth(probability=self.hdd_probability[i],
+                                        depth=self.hdd_depth[i]) for i in
+                       range(low, upp)]
+
+        return AreaSource(id=self.id[idx],
+                          name=self.name[idx],
+                          geometry=geometry,
+                          trt=self.trt[idx],
+                          mag_scale_rel=self.mag_scale_rel[idx],
+                          rupt_aspect_ratio=self.rupt_aspect_ratio[idx],
+                          mfd=self.get_mfd(idx),
+                          nodal_plane_dist=nodal_planes,
+                          hypo_depth_dist=hypo_depths)
+
+    def get_columns(self):
+        """
+        :returns:
+            A dictionary with all the arrays of the table
+        """
+        return dict((name, getattr(self, name)) for name in COLUMNS)
+
+    def select(self, idx):
+        """
+        Create a table with a subset of the sources
+
+        :parameter idx:
+            An array with the indexes of the sources selected (or a boolean
+            mask)
+        :returns:
+            An instance of :class:`AreaSourceTable`
+        """
+        idx = np.arange(len(self))[idx]
+        columns = {}
+        for name in STRING_COLUMNS + FLOAT_COLUMNS:
+            columns[name] = getattr(self, name)[idx]
+        for offsets, names in RAGGED_COLUMNS:
+            for name in names:
+                columns[name], columns[offsets] = take_ragged(
+                    getattr(self, name), getattr(self, offsets), idx)
+        return AreaSourceTable(**columns)
+
+    def to_attribute_columns(self):
+        """
+        Create the columns of the attribute table of a preformatted
+        shapefile
+
+        :returns:
+            A dictionary whose keys are the names of the fields and values
+            arrays
+        """
+        out = {}
+        for name, field in MAPPING_FIELDS.items():
+            out[field] = getattr(self, name)
+        for offsets, names in RAGGED_COLUMNS[:-1]:
+            for name in names:
+                count, prefix = MAPPING_RAGGED_FIELDS[name]
+                out[count] = np.diff(getattr(self, offsets))
+                matrix = get_matrix_from_ragged(getattr(self, name),
+                                                getattr(self, offsets))
+                for i in range(matrix.shape[1]):
+                    out['%s%d' % (prefix, i + 1)] = matrix[:, i]
+        return out
+
+    @classmethod
+    def from_attribute_columns(cls, columns, lons, lats, ring_offsets):
+        """
+        Create a table from the columns of the attribute table of a
+        preformatted shapefile (see
+        :func:`hmtk_utils.oq_shp_tools.shapefile_tools.get_field_arrays`)
+
+        :parameter dict columns:
+            A dictionary with the columns of the attribute table
+        :parameter lons:
+            An array with the longitudes of the vertices of the polygons
+        :parameter lats:
+            An array with the latitudes of the vertices of the polygons
+        :parameter ring_offsets:
+            An array with the offsets of the polygons
+        :returns:
+            An instance of :class:`AreaSourceTable`
+        """
+        num = len(ring_offsets) - 1
+        out = {'lons': lons, 'lats': lats, 'ring_offsets': ring_offsets}
+        for name, field in MAPPING_FIELDS.items():
+            if field in columns:
+                out[name] = columns[field]
+        if 'id' not in out:
+            out['id'] = [None] * num
+        for offsets, names in RAGGED_COLUMNS[:-1]:
+            # The values of a group (e.g. strike, dip, rake and weight of
+            # the nodal planes) share the offsets hence the matrices are
+            # padded to the same width and the counts are computed once
+            matrices = []
+            for name in names:
+                matrix = get_numbered_columns(
+                    columns, MAPPING_RAGGED_FIELDS[name][1])
+                matrices.append(np.zeros((num, 0)) if matrix is None else
+                                matrix)
+            width = max(matrix.shape[1] for matrix in matrices)
+            for i, matrix in enumerate(matrices):
+                if matrix.shape[1] < width:
+                    pad = np.empty((num, width - matrix.shape[1]))
+                    pad.fill(np.nan)
+                    matrices[i] = np.hstack([matrix, pad])
+            # When the number of values is not set the largest number of
+            # values available in the columns of the group is used
+            counts = np.zeros(num, dtype=int)
+            for matrix in matrices:
+                counts = np.maximum(counts, np.isfinite(matrix).sum(axis=1))
+            count = MAPPING_RAGGED_FIELDS[names[0]][0]
+            if count in columns:
+                counts = np.where(columns[count] > 0, columns[count], counts)
+            for name, matrix in zip(names, matrices):
+                out[name], out[offsets] = get_ragged_from_matrix(matrix,
+                                                                 counts)
+        return cls(**out)
+
+    @classmethod
+    def from_sources(cls, sources):
+        """
+        Create a table from a list of area sources
+
+        :parameter sources:
+            A list of :class:`AreaSource` instances
+        :returns:
+            An instance of :class:`AreaSourceTable`
+        """
+        sources = [src for src in sources if isinstance(src, AreaSource)]
+        out = dict((name, []) for name in COLUMNS)
+        for src in sources:
+            out['id'].append(src.id)
+            out['name'].append(src.name)
+            out['trt'].append(src.trt)
+            out['mag_scale_rel'].append(src.mag_scale_rel)
+            out['rupt_aspect_ratio'].append(src.rupt_aspect_ratio)
+            out['upper_seismo_depth'].append(
+                src.geometry.upper_seismo_depth)
+            out['lower_seismo_depth'].append(
+                src.geometry.lower_seismo_depth)
+            if isinstance(src.mfd, TGRMFD):
+                out['mfd_type'].append(TGR_MFD)
+                out['a_val'].append(src.mfd.a_val)
+                out['b_val'].append(src.mfd.b_val)
+                out['max_mag'].append(src.mfd.max_mag)
+                out['bin_width'].append(np.nan)
+                out['occur_rates'].append([])
+            elif isinstance(src.mfd, IncrementalMFD):
+                out['mfd_type'].append(INCR_MFD)
+                out['a_val'].append(np.nan)
+                out['b_val'].append(np.nan)
+                out['max_mag'].append(np.nan)
+                out['bin_width'].append(src.mfd.bin_width)
+                out['occur_rates'].append(src.mfd.occur_rates)
+            else:
+                raise ValueError('Unsupported MFD for source %s' % src.id)
+            out['min_mag'].append(src.mfd.min_mag)
+            out['npd_probability'].append([float(npd.probability) for npd
+                                           in src.nodal_plane_dist])
+            out['npd_strike'].append([npd.strike for npd in
+                                      src.nodal_plane_dist])
+            out['npd_dip'].append([npd.dip for npd in src.nodal_plane_dist])
+            out['npd_rake'].append([npd.rake for npd in
+                                    src.nodal_plane_dist])
+            out['hdd_probability'].append([float(hdd.probability) for hdd
+                                           in src.hypo_depth_dist])
+            out['hdd_depth'].append([hdd.depth for hdd in
+                                     src.hypo_depth_dist])
+            lons, lats = poly.get_polygon_from_wkt(src.geometry.wkt)
+            out['lons'].append(lons)
+            out['lats'].append(lats)
+
+        # Flatten the ragged columns
+        for offsets, names in RAGGED_COLUMNS:
+            out[offsets] = np.cumsum([0] + [len(val) for val in
+                                            out[names[0]]])
+            for name in names:
+                out[name] = np.array([value for values in out[name] for
+                                      value in values], dtype=float)
+        return cls(**out)
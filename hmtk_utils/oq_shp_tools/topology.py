@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+Module for checking the topology of the polygons describing the area
+sources of a model: overlapping sources (double counting of the
+seismicity) and gaps between sources inside the convex hull of the model.
+Only the pairs of polygons with intersecting bounding boxes are compared.
+"""
+
+import os
+
+import numpy as np
+import osgeo.ogr as ogr
+
+import polygons as poly
+import projections as proj
+import shapefile_tools as shpt
+
+from openquake.nrmllib.hazard.parsers import SourceModelParser
+from openquake.nrmllib.models import AreaSource
+
+# Tolerance [degrees] used to find the sources bordering a gap
+TOUCH_TOLERANCE = 1e-7
+
+
+def _get_area(geom):
+    """
+    :returns:
+        The approximate area [km2] of a geometry in geographic coordinates
+    """
+    lat = geom.Centroid().GetY()
+    return geom.GetArea() * poly.DEG_TO_KM ** 2 * np.cos(np.radians(lat))
+
+
+def _get_bboxes(geoms):
+    """
+    :returns:
+        An array with the bounding boxes (min x, min y, max x, max y)
+    """
+    # GetEnvelope returns min x, max x, min y, max y
+    bboxes = np.array([geom.GetEnvelope() for geom in geoms]).reshape(-1, 4)
+    return bboxes[:, [0, 2, 1, 3]]
+
+
+def _get_parts(geom):
+    """
+    :returns:
+        The list of polygons included in a geometry
+    """
+    if geom is None or geom.IsEmpty():
+        return []
+    if geom.GetGeometryType() == ogr.wkbPolygon:
+        return [geom]
+    parts = []
+    for i in range(geom.GetGeometryCount()):
+        parts.extend(_get_parts(geom.GetGeometryRef(i)))
+    return parts
+
+
+def get_overlaps(wkbs, ids, min_area=0.0):
+    """
+    Find the overlapping polygons. The candidate pairs are selected by
+    intersecting the bounding boxes and only these are checked with OGR.
+
+    :parameter list wkbs:
+        The WKB of each polygon (geographic coordinates)
+    :parameter list ids:
+        The ID of each polygon
+    :parameter float min_area:
+        The minimum area [km2] of the overlaps reported
+    :returns:
+        A list of dictionaries with the IDs of the two polygons and the
+        approximate area [km2] of their intersection
+    """
+    geoms = [ogr.CreateGeometryFromWkb(wkb) for wkb in wkbs]
+    out = []
+    for i, j in poly.get_bbox_candidate_pairs(_get_bboxes(geoms)):
+        inter = geoms[i].Intersection(geoms[j])
+        if inter is None or inter.IsEmpty():
+            continue
+        area = _get_area(inter)
+        if area > min_area:
+            out.append({'src_id_1': ids[i], 'src_id_2': ids[j],
+                        'area': area})
+    return out
+
+
+def get_gaps(wkbs, ids, min_area=0.0):
+    """
+    Find the gaps between the polygons inside the convex hull of the
+    model. Gaps touching the boundary of the convex hull are part of the
+    concave outline of the model rather than holes; these are flagged as
+    not interior.
+
+    :parameter list wkbs:
+        The WKB of each polygon (geographic coordinates)
+    :parameter list ids:
+        The ID of each polygon
+    :parameter float min_area:
+        The minimum area [km2] of the gaps reported
+    :returns:
+        A list of dictionaries with the approximate area [km2], the
+        centroid, the IDs of the bordering polygons and the interior flag
+        of each gap
+    """
+    if not len(wkbs):
+        return []
+    geoms = [ogr.CreateGeometryFromWkb(wkb) for wkb in wkbs]
+    collection = ogr.Geometry(ogr.wkbMultiPolygon)
+    for geom in geoms:
+        for part in _get_parts(geom):
+            collection.AddGeometry(part)
+    union = collection.UnionCascaded()
+    hull = union.ConvexHull()
+    boundary = hull.GetBoundary()
+    gaps = [gap for gap in _get_parts(hull.Difference(union)) if
+            _get_area(gap) > min_area]
+
+    # Bordering polygons: candidates from the bounding boxes of the
+    # polygons and of the gaps
+    bboxes = np.vstack([_get_bboxes(geoms), _get_bboxes(gaps)])
+    bboxes[:, :2] -= TOUCH_TOLERANCE
+    bboxes[:, 2:] += TOUCH_TOLERANCE
+    pairs = poly.get_bbox_candidate_pairs(bboxes)
+    pairs = pairs[(pairs[:, 0] < len(geoms)) & (pairs[:, 1] >= len(geoms))]
+    bordering = [[] for _ in gaps]
+    for i, j in pairs:
+        if geoms[i].Distance(gaps[j - len(geoms)]) <= TOUCH_TOLERANCE:
+            bordering[j - len(geoms)].append(ids[i])
+
+    out = []
+    for gap, src_ids in zip(gaps, bordering):
+        centroid = gap.Centroid()
+        out.append({'area': _get_area(gap),
+                    'centroid': [centroid.GetX(), centroid.GetY()],
+                    'src_ids': src_ids,
+                    'interior': not gap.Intersects(boundary)})
+    return out
+
+
+def check_topology(wkbs, ids, min_area=0.0, gaps=True):
+    """
+    Check the topology of a set of polygons
+
+    :parameter list wkbs:
+        The WKB of each polygon (geographic coordinates)
+    :parameter list ids:
+        The ID of each polygon
+    :parameter float min_area:
+        The minimum area [km2] of the overlaps and gaps reported
+    :parameter bool gaps:
+        When False the gaps are not computed
+    :returns:
+        A dictionary with the report
+    """
+    report = {'num_polygons': len(wkbs)}
+    report['overlaps'] = get_overlaps(wkbs, ids, min_area)
+    report['num_overlaps'] = len(report['overlaps'])
+    if gaps:
+        report['gaps'] = get_gaps(wkbs, ids, min_area)
+        report['num_gaps'] = len(report['gaps'])
+    return report
+
+
+def _get_wkbs(lons, lats, offsets):
+    """
+    :returns:
+        The WKB of the polygons described by a set of rings
+    """
+    lons, lats, offsets = poly.close_rings(lons, lats, offsets)
+    return [poly.get_polygon_wkb(rlons, rlats) for rlons, rlats in
+            poly.split_rings(lons, lats, offsets)]
+
+
+def check_area_source_shp_topology(filename, report_filename=None,
+                                   min_area=0.0, gaps=True):
+    """
+    Check the topology of the area sources in a shapefile
+
+    :parameter str filename:
+        Name of the shapefile to be checked
+    :parameter str report_filename:
+        Name of the file where the report is saved in json format
+    :parameter float min_area:
+        The minimum area [km2] of the overlaps and gaps reported
+    :parameter bool gaps:
+        When False the gaps are not computed
+    :returns:
+        A dictionary with the report
+    """
+    if not os.path.isfile(filename):
+        raise IOError("This shapefile doesn't exists")
+    data_source = ogr.GetDriverByName('ESRI Shapefile').Open(filename, 0)
+    if data_source is None:
+        raise IOError("This shapefile cannot be opened")
+    layer = data_source.GetLayer()
+    lons, lats, offsets = shpt.get_ring_arrays(layer)
+    ids = shpt.get_field_arrays(layer, ['src_id']).get(
+        'src_id', [None] * (len(offsets) - 1))
+    srs = layer.GetSpatialRef()
+    if srs is not None and not proj.is_wgs84(srs):
+        lons, lats = proj.transform_coordinates(
+            lons, lats, proj.get_transformation(srs, None))
+    data_source.Destroy()
+
+    report = check_topology(_get_wkbs(lons, lats, offsets), list(ids),
+                            min_area, gaps)
+    if report_filename is not None:
+        shpt.write_report(report, report_filename)
+    return report
+
+
+def check_area_source_nrml_topology(filename, report_filename=None,
+                                    min_area=0.0, gaps=True):
+    """
+    Check the topology of the area sources in a nrml file
+
+    :parameter str filename:
+        Name of the nrml file to be checked
+    :parameter str report_filename:
+        Name of the file where the report is saved in json format
+    :parameter float min_area:
+        The minimum area [km2] of the overlaps and gaps reported
+    :parameter bool gaps:
+        When False the gaps are not computed
+    :returns:
+        A dictionary with the report
+    """
+    coords = []
+    ids = []
+    for src in SourceModelParser(filename).parse().sources:
+        if isinstance(src, AreaSource):
+            coords.append(poly.get_polygon_from_wkt(src.geometry.wkt))
+            ids.append(src.id)
+    lons, lats, offsets = poly.join_rings(coords)
+
+    report = check_topology(_get_wkbs(lons, lats, offsets), ids, min_area,
+                            gaps)
+    if report_filename is not None:
+        shpt.write_report(report, report_filename)
+    return report
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+Module for exporting area sources as vector tiles (a folder of Mapbox
+Vector Tiles or an MBTiles file) to be browsed with web viewers. The
+polygons are simplified for each zoom level with a tolerance proportional
+to the size of a pixel and only a subset of the attributes is exported.
+The tiles of each zoom level are created in parallel with the GDAL MVT
+driver (GDAL >= 2.3).
+"""
+
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+
+import numpy as np
+import osgeo.ogr as ogr
+
+import polygons as poly
+import projections as proj
+
+from parsers import parse_area_source_table
+from source_table import AreaSourceTable
+
+DEFAULT_COLUMNS = ('src_id', 'a_value', 'b_value', 'max_mag')
+
+# Length [km] of the equator and size [pixels] of a tile
+EQUATOR_LENGTH = 40075.016686
+TILE_SIZE = 256
+
+
+def get_pixel_size(zoom):
+    """
+    :parameter int zoom:
+        The zoom level
+    :returns:
+        The size [km] of a pixel at the equator
+    """
+    return EQUATOR_LENGTH / (TILE_SIZE * 2 ** zoom)
+
+
+def _get_field_type(values):
+    """
+    :returns:
+        The OGR type of a column
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == 'f':
+        return ogr.OFTReal
+    elif values.dtype.kind in 'iu':
+        return ogr.OFTInteger
+    return ogr.OFTString
+
+
+def _write_zoom(args):
+    """
+    Create the tiles of a zoom level in a folder
+
+    :parameter tuple args:
+        The zoom level, the rings, the columns exported, the tolerance
+        [pixels], the name of the folder and the name of the layer
+    :returns:
+        The name of the folder
+    """
+    zoom, lons, lats, offsets, columns, tolerance, path, layer_name = args
+    if tolerance > 0:
+        lons, lats, offsets, _ = poly.simplify_rings(
+            lons, lats, offsets, tolerance=tolerance * get_pixel_size(zoom))
+
+    drv = ogr.GetDriverByName('MVT')
+    dsource = drv.CreateDataSource(path, options=['MINZOOM=%d' % zoom,
+                                                  'MAXZOOM=%d' % zoom])
+    if dsource is None:
+        raise IOError('Cannot create the tiles in %s' % path)
+    lyr = dsource.CreateLayer(layer_name, proj.get_spatial_reference(),
+                              ogr.wkbPolygon)
+    for name, values in columns:
+        lyr.CreateField(ogr.FieldDefn(name, _get_field_type(values)))
+    for i, (rlons, rlats) in enumerate(poly.split_rings(lons, lats,
+                                                        offsets)):
+        feat = ogr.Feature(lyr.GetLayerDefn())
+        for name, values in columns:
+            value = values[i]
+            if value is None or (isinstance(value, float) and
+                                 np.isnan(value)):
+                continue
+            feat.SetField(name, value.item() if hasattr(value, 'item') else
+                          value)
+        feat.SetGeometry(ogr.CreateGeometryFromWkb(
+            poly.get_polygon_wkb(rlons, rlats)))
+        lyr.CreateFeature(feat)
+        feat.Destroy()
+    dsource.Destroy()
+    return path
+
+
+def _get_tile_files(path):
+    """
+    :returns:
+        A list with the zoom, column, row and name of each tile in a folder
+    """
+    out = []
+    for zdir in os.listdir(path):
+        if not zdir.isdigit():
+            continue
+        for xdir in os.listdir(os.path.join(path, zdir)):
+            for name in os.listdir(os.path.join(path, zdir, xdir)):
+                out.append((int(zdir), int(xdir), int(name.split('.')[0]),
+                            os.path.join(path, zdir, xdir, name)))
+    return out
+
+
+def _write_mbtiles(path, filename, metadata):
+    """
+    Store the tiles of a folder in an MBTiles file
+    """
+    if os.path.exists(filename):
+        os.remove(filename)
+    conn = sqlite3.connect(filename)
+    try:
+        conn.execute('CREATE TABLE metadata (name text, value text)')
+        conn.execute('CREATE TABLE tiles (zoom_level integer, '
+                     'tile_column integer, tile_row integer, tile_data blob)')
+        conn.execute('CREATE UNIQUE INDEX tile_index ON tiles '
+                     '(zoom_level, tile_column, tile_row)')
+        conn.executemany('INSERT INTO metadata VALUES (?, ?)',
+                         sorted(metadata.items()))
+        for zoom, col, row, name in _get_tile_files(path):
+            with open(name, 'rb') as fin:
+                # MBTiles rows are numbered from the bottom (TMS)
+                conn.execute('INSERT INTO tiles VALUES (?, ?, ?, ?)',
+                             (zoom, col, 2 ** zoom - 1 - row,
+                              sqlite3.Binary(fin.read())))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def export_vector_tiles(sources, out_path, min_zoom=0, max_zoom=8,
+                        columns=DEFAULT_COLUMNS, tolerance=1.0,
+                        processes=None, layer_name='area_sources',
+                        overwrite=False):
+    """
+    Export a set of area sources as vector tiles
+
+    :parameter sources:
+        An instance of :class:`AreaSourceTable` or the name of a shapefile
+        or of a nrml file
+    :parameter str out_path:
+        The name of the folder where the tiles are created or, when the
+        extension is .mbtiles, the name of the MBTiles file
+    :parameter int min_zoom:
+        The minimum zoom level
+    :parameter int max_zoom:
+        The maximum zoom level
+    :parameter columns:
+        The names of the fields of the preformatted shapefile exported
+    :parameter float tolerance:
+        The tolerance [pixels] used to simplify the polygons at each zoom
+        level. When 0 the polygons are not simplified.
+    :parameter int processes:
+        The number of processes creating the tiles (one zoom level for
+        each process)
+    :parameter str layer_name:
+        The name of the layer in the tiles
+    :parameter bool overwrite:
+        When True an existing folder or MBTiles file is replaced
+    :returns:
+        The name of the folder or of the MBTiles file
+    """
+    if os.path.exists(out_path) and not overwrite:
+        raise IOError('The output %s already exists' % out_path)
+    if ogr.GetDriverByName('MVT') is None:
+        raise ValueError('The MVT driver is not available (GDAL >= 2.3)')
+    table = sources
+    if not isinstance(sources, AreaSourceTable):
+        table = parse_area_source_table(sources)
+    attributes = table.to_attribute_columns()
+    for name in columns:
+        if name not in attributes:
+            raise ValueError('Unknown column: %s' % name)
+    columns = [(name, attributes[name]) for name in columns]
+
+    tmp_path = tempfile.mkdtemp()
+    try:
+        zooms = range(min_zoom, max_zoom + 1)
+        args = [(zoom, table.lons, table.lats, table.ring_offsets, columns,
+                 tolerance, os.path.join(tmp_path, 'z%d' % zoom), layer_name)
+                for zoom in zooms]
+        pool = multiprocessing.Pool(processes)
+        try:
+            paths = pool.map(_write_zoom, args)
+        finally:
+            pool.close()
+            pool.join()
+
+        # Merge the zoom levels
+        tiles_path = os.path.join(tmp_path, 'tiles')
+        os.mkdir(tiles_path)
+        for zoom, path in zip(zooms, paths):
+            if os.path.isdir(os.path.join(path, str(zoom))):
+                shutil.move(os.path.join(path, str(zoom)), tiles_path)
+        metadata = {}
+        metadata_file = os.path.join(paths[0], 'metadata.json')
+        if os.path.isfile(metadata_file):
+            with open(metadata_file) as fin:
+                metadata = json.load(fin)
+        metadata.update({'name': layer_name, 'format': 'pbf',
+                         'minzoom': str(min_zoom),
+                         'maxzoom': str(max_zoom)})
+
+        if out_path.lower().endswith('.mbtiles'):
+            _write_mbtiles(tiles_path, out_path, metadata)
+        else:
+            if os.path.isdir(out_path):
+                shutil.rmtree(out_path)
+            elif os.path.exists(out_path):
+                os.remove(out_path)
+            shutil.move(tiles_path, out_path)
+            with open(os.path.join(out_path, 'metadata.json'), 'w') as fout:
+                json.dump(metadata, fout, indent=2)
+    finally:
+        shutil.rmtree(tmp_path)
+    return out_path
@@ -1,3 +1,4 @@
+# -*- coding: utf-8 -*-
 #
 # LICENSE
 #
@@ -48,14 +49,23 @@
 Module for parsing nrml and create preformatted shapefiles
 """
 
+import os
 import sys
-import re
+import gzip
+import shutil
+import uuid
+import Queue
+import threading
+import numpy as np
 
 import osgeo.ogr as ogr
-import osgeo.osr as osr
 
+import polygons as poly
+import projections as proj
 import shapefile_tools as shpt
 
+from source_table import AreaSourceTable, INCR_MFD, TGR_MFD
+
 from openquake.nrmllib.hazard.parsers import SourceModelParser
 from openquake.nrmllib.models import AreaSource, TGRMFD, SourceModel
 from openquake.nrmllib.models import IncrementalMFD
@@ -78,10 +88,24 @@ MAPPING_NPD = {'weight': 'probability', 'strike': 'strike',
 MAPPING_HDD = {'hdd_w': 'probability', 'hdd_d': 'depth'}
 
 
+def _get_max_count(offsets, mask=None):
+    """
+    :returns:
+        The largest number of values of the rows of a ragged column (of the
+        rows selected by a boolean mask)
+    """
+    counts = np.diff(offsets)
+    if mask is not None:
+        counts = counts[mask]
+    return int(counts.max()) if len(counts) else 0
+
+
 def _get_max_nodal_plane_number(sourceModel):
     """
     This finds the maximum number of nodal planes and maximum number of
-    hypocentral depths used in a source model.
+    hypocentral depths used in a source model. For a table of sources they
+    are taken from the offsets of the ragged columns without creating the
+    sources.
 
     :parameter sourceModel:
         An instance of :class:`SourceModel`:
@@ -90,6 +114,14 @@ def _get_max_nodal_plane_number(sourceModel):
         single source and the maximum number of hypocentral depths assigned
         to a source.
     """
+    if isinstance(sourceModel.sources, AreaSourceTable):
+        table = sourceModel.sources
+        incr = np.asarray(table.mfd_type, dtype=object) == INCR_MFD
+        print 'The model contains %d area sources' % len(table)
+        return (_get_max_count(table.npd_offsets),
+                _get_max_count(table.hdd_offsets),
+                _get_max_count(table.rate_offsets, incr))
+
     num = 0
     numhd = 0
     cnt = 0
@@ -103,38 +135,13 @@ def _get_max_nodal_plane_number(sourceModel):
                 len(src.hypo_depth_dist) > numhd else numhd
 
             if isinstance(src.mfd, IncrementalMFD):
-                numbins = len(src.mfd.occur_rates) if \
-                    len(src.mfd.occur_rates) > numhd else numhd
+                numbins = max(numbins, len(src.mfd.occur_rates))
 
             cnt += 1
     print 'The model contains %d area sources' % (cnt)
     return num, numhd, numbins
 
 
-def _get_polygon(areasrc):
-    """
-    This extracts the lons and lats from a WKT string which describes a
-    polygon
-
-    :parameter string areasrc:
-        A WKT string descibing a polygon geometry
-    :returns:
-        Two lists containing longitudes and latitudes, respectively
-    """
-
-    str = areasrc.geometry.wkt
-    str = re.sub('POLYGON\(\(', '', str)
-    str = re.sub('\)\)', '', str)
-    aa = re.split('\,', str)
-    lons = []
-    lats = []
-    for str in aa:
-        bb = re.split('\s+', re.sub('^\s+', '', str))
-        lons.append(float(bb[0]))
-        lats.append(float(bb[1]))
-    return lons, lats
-
-
 def _get_area_incmfd_attr(max_np, max_hd, max_bins):
     """
     Fix the set of attributes used to describe an area source with an
@@ -238,7 +245,7 @@ def _get_area_tgrmfd_attr(max_np, max_hd):
     return att
 
 
-def _write_area_source_incmfd(src, lyr, max_np, max_hd):
+def _write_area_source_incmfd(src, lyr, max_np, max_hd, polygon=None):
     """
     This creates a shapefile containing the area sources with a truncated GR
     magnitude-frequency distribution included in a :class:`SourceModel`
@@ -252,10 +259,15 @@ def _write_area_source_incmfd(src, lyr, max_np, max_hd):
         Maximum number of nodal planes
     :parameter int max_hd:
         Maximum number of hypocentral depths
+    :parameter polygon:
+        The longitudes and latitudes of the vertices of the polygon. When
+        None they are taken from the geometry of the source.
     """
 
     # Create the geometry
-    lons, lats = _get_polygon(src)
+    if polygon is None:
+        polygon = poly.get_polygon_from_wkt(src.geometry.wkt)
+    lons, lats = polygon
     feat = ogr.Feature(lyr.GetLayerDefn())
     oring = ogr.Geometry(ogr.wkbLinearRing)
     for lon, lat in zip(lons, lats):
@@ -271,6 +283,7 @@ def _write_area_source_incmfd(src, lyr, max_np, max_hd):
     for key in MAPPING_MFD_INCR.keys():
         feat.SetField(key, getattr(src.mfd, MAPPING_MFD_INCR[key]))
 
+    feat.SetField('num_bins', len(src.mfd.occur_rates))
     for i, occ in enumerate(src.mfd.occur_rates):
         tmp_str = 'or_%d' % (i+1)
         feat.SetField(tmp_str, occ)
@@ -281,7 +294,7 @@ def _write_area_source_incmfd(src, lyr, max_np, max_hd):
 
     # Set nodal plane distribution
     cnt = 1
-    feat.SetField('num_npd', int(max_np))
+    feat.SetField('num_npd', len(src.nodal_plane_dist))
     for npd in src.nodal_plane_dist:
         for key in MAPPING_NPD:
             tmp_str = '%s_%d' % (key, cnt)
@@ -294,7 +307,7 @@ def _write_area_source_incmfd(src, lyr, max_np, max_hd):
 
     # Set hypocentral plane distribution
     cnt = 1
-    feat.SetField('num_hdd', int(max_hd))
+    feat.SetField('num_hdd', len(src.hypo_depth_dist))
     for hdd in src.hypo_depth_dist:
         for key in MAPPING_HDD:
             tmp_str = '%s_%d' % (key, cnt)
@@ -318,7 +331,7 @@ def _write_area_source_incmfd(src, lyr, max_np, max_hd):
     feat.Destroy()
 
 
-def _write_area_source_tgrmfd(src, lyr, max_np, max_hd):
+def _write_area_source_tgrmfd(src, lyr, max_np, max_hd, polygon=None):
     """
     This creates a shapefile containing the area sources with a truncated GR
     magnitude-frequency distribution included in a :class:`SourceModel`
@@ -332,13 +345,18 @@ def _write_area_source_tgrmfd(src, lyr, max_np, max_hd):
         Maximum number of nodal planes
     :parameter int max_hd:
         Maximum number of hypocentral depths
+    :parameter polygon:
+        The longitudes and latitudes of the vertices of the polygon. When
+        None they are taken from the geometry of the source.
     """
 
     # Create feature
     feat = ogr.Feature(lyr.GetLayerDefn())
 
     # Create the geometry
-    lons, lats = _get_polygon(src)
+    if polygon is None:
+        polygon = poly.get_polygon_from_wkt(src.geometry.wkt)
+    lons, lats = polygon
     oring = ogr.Geometry(ogr.wkbLinearRing)
     for lon, lat in zip(lons, lats):
         oring.AddPoint(lon, lat, 0.0)
@@ -359,7 +377,7 @@ def _write_area_source_tgrmfd(src, lyr, max_np, max_hd):
 
     # Set nodal plane distribution
     cnt = 1
-    feat.SetField('num_npd', int(max_np))
+    feat.SetField('num_npd', len(src.nodal_plane_dist))
     for npd in src.nodal_plane_dist:
         for key in MAPPING_NPD:
             tmp_str = '%s_%d' % (key, cnt)
@@ -372,7 +390,7 @@ def _write_area_source_tgrmfd(src, lyr, max_np, max_hd):
 
     # Set hypocentral plane distribution
     cnt = 1
-    feat.SetField('num_hdd', int(max_hd))
+    feat.SetField('num_hdd', len(src.hypo_depth_dist))
     for hdd in src.hypo_depth_dist:
         for key in MAPPING_HDD:
             tmp_str = '%s_%d' % (key, cnt)
@@ -397,7 +415,8 @@ def _write_area_source_tgrmfd(src, lyr, max_np, max_hd):
 
 
 def _create_area_source_incmfd_shapefile(shapefile_path, max_np, max_hd,
-                                         max_bins, rootname):
+                                         max_bins, rootname,
+                                         spatial_reference=None):
     """
     Create a shapefile which contains area sources with a truncated GR mfd
 
@@ -407,12 +426,13 @@ def _create_area_source_incmfd_shapefile(shapefile_path, max_np, max_hd,
         Maximum number of nodal planes
     :parameter int max_hd:
         Maximum number of hypocentral depths
+    :parameter spatial_reference:
+        The spatial reference of the shapefile (WGS84 when None)
     :returns:
         Returns an updated data set
     """
 
-    spatialReference = osr.SpatialReference()
-    spatialReference.SetWellKnownGeogCS('WGS84')
+    spatialReference = proj.get_spatial_reference(spatial_reference)
 
     driverName = "ESRI Shapefile"
     drv = ogr.GetDriverByName(driverName)
@@ -443,7 +463,8 @@ def _create_area_source_incmfd_shapefile(shapefile_path, max_np, max_hd,
 
 
 def _create_area_source_tgrmfd_shapefile(shapefile_path, max_np, max_hd,
-                                         rootname):
+                                         max_bins, rootname,
+                                         spatial_reference=None):
     """
     Create a shapefile which contains area sources with a truncated GR mfd
 
@@ -453,12 +474,16 @@ def _create_area_source_tgrmfd_shapefile(shapefile_path, max_np, max_hd,
         Maximum number of nodal planes
     :parameter int max_hd:
         Maximum number of hypocentral depths
+    :parameter int max_bins:
+        Maximum number of bins (not used, the signature is the same as
+        :func:`_create_area_source_incmfd_shapefile`)
+    :parameter spatial_reference:
+        The spatial reference of the shapefile (WGS84 when None)
     :returns:
         Returns an updated data set
     """
 
-    spatialReference = osr.SpatialReference()
-    spatialReference.SetWellKnownGeogCS('WGS84')
+    spatialReference = proj.get_spatial_reference(spatial_reference)
 
     driverName = "ESRI Shapefile"
     drv = ogr.GetDriverByName(driverName)
@@ -488,64 +513,416 @@ def _create_area_source_tgrmfd_shapefile(shapefile_path, max_np, max_hd,
     return ds
 
 
-def write_shps(nrml_data, out_directory, rootname='as'):
+def _get_source_rings(source_model):
+    """
+    :parameter source_model:
+        An instance of :class:`SourceModel`
+    :returns:
+        The longitudes, latitudes and offsets of the polygons of the area
+        sources (see :mod:`hmtk_utils.oq_shp_tools.polygons`)
+    """
+    if isinstance(source_model.sources, AreaSourceTable):
+        table = source_model.sources
+        return table.lons, table.lats, table.ring_offsets
+    return poly.join_rings([poly.get_polygon_from_wkt(src.geometry.wkt) for
+                            src in source_model.sources if
+                            isinstance(src, AreaSource)])
+
+
+def _get_source_polygons(source_model, simplify=None, transformation=None):
+    """
+    Get the polygons of the area sources in a source model, simplified
+    and transformed into a different spatial reference system when needed.
+    The transformation is applied to all the coordinates at once.
+
+    :parameter source_model:
+        An instance of :class:`SourceModel`
+    :parameter dict simplify:
+        The parameters of
+        :func:`hmtk_utils.oq_shp_tools.polygons.simplify_rings`
+    :parameter transformation:
+        An instance of :class:`osr.CoordinateTransformation`
+    :returns:
+        A list with the coordinates of the vertices of each polygon (in the
+        order of the area sources in the model)
+    """
+    lons, lats, offsets = _get_source_rings(source_model)
+    if simplify is not None:
+        lons, lats, offsets, _ = poly.simplify_rings_and_log(
+            lons, lats, offsets, **simplify)
+    if transformation is not None:
+        lons, lats = proj.transform_coordinates(lons, lats, transformation)
+    return poly.split_rings(lons, lats, offsets)
+
+
+def _get_source_model(nrml_data):
+    """
+    :parameter nrml_data:
+        The name of a nrml file (gzip compressed when the extension is
+        .gz), an instance of :class:`SourceModel` or an instance of
+        :class:`AreaSourceTable`
+    :returns:
+        An instance of :class:`SourceModel` whose sources can be iterated
+        more than once (a file is parsed only once)
+    """
+    if isinstance(nrml_data, AreaSourceTable):
+        return SourceModel(sources=nrml_data)
+    elif not isinstance(nrml_data, SourceModel):
+        if nrml_data.lower().endswith('.gz'):
+            nrml_data = SourceModelParser(gzip.open(nrml_data, 'rb')).parse()
+        else:
+            nrml_data = SourceModelParser(nrml_data).parse()
+    if not isinstance(nrml_data.sources, (list, tuple, AreaSourceTable)):
+        nrml_data.sources = list(nrml_data.sources)
+    return nrml_data
+
+
+# The sinks receiving the sources: source typology, mfd class, function
+# creating the data set and function writing a source in the layer
+SINKS = [(AreaSource, IncrementalMFD, _create_area_source_incmfd_shapefile,
+          _write_area_source_incmfd),
+         (AreaSource, TGRMFD, _create_area_source_tgrmfd_shapefile,
+          _write_area_source_tgrmfd)]
+
+
+def _get_source_items(source_model, polygons=None):
+    """
+    Iterate over the sources of a model
+
+    :parameter source_model:
+        An instance of :class:`SourceModel`
+    :parameter list polygons:
+        The coordinates of the polygons of the area sources or None
+    :returns:
+        An iterator over the sources and the coordinates of their polygons
+        (None when not available)
+    """
+    cnt = 0
+    for source in source_model.sources:
+        polygon = None
+        if isinstance(source, AreaSource):
+            if polygons is not None:
+                polygon = polygons[cnt]
+            cnt += 1
+        yield source, polygon
+
+
+class _LayerSink(object):
+    """
+    Writes the sources received through a bounded queue in a layer on a
+    separate thread
+
+    :parameter data_source:
+        The data set containing the layer
+    :parameter write:
+        The function writing a source in the layer
+    :parameter int max_np:
+        Maximum number of nodal planes
+    :parameter int max_hd:
+        Maximum number of hypocentral depths
+    :parameter int queue_size:
+        The maximum number of sources waiting in the queue
+    """
+
+    def __init__(self, data_source, write, max_np, max_hd, queue_size=1000):
+        self.data_source = data_source
+        self.filename = data_source.GetName()
+        self.bboxes = []
+        self.write = write
+        self.max_np = max_np
+        self.max_hd = max_hd
+        self.queue = Queue.Queue(queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        lyr = self.data_source.GetLayer()
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            # After an error the queue is drained without writing
+            if self.error is not None:
+                continue
+            try:
+                self.write(item[0], lyr, self.max_np, self.max_hd, item[1])
+            except BaseException:
+                self.error = sys.exc_info()
+        self.data_source.Destroy()
+
+    def put(self, src, polygon=None):
+        """
+        Send a source to the sink. The bounding boxes of the polygons are
+        collected in the order of the features; a source without polygon
+        gets an undefined (NaN) bounding box.
+        """
+        if polygon is not None and len(polygon[0]):
+            self.bboxes.append((min(polygon[0]), min(polygon[1]),
+                                max(polygon[0]), max(polygon[1])))
+        else:
+            self.bboxes.append((np.nan,) * 4)
+        self.queue.put((src, polygon))
+
+    def close(self):
+        """
+        Wait until all the sources are written and close the data set
+        """
+        self.queue.put(None)
+        self.thread.join()
+
+
+def write_shps(nrml_data, out_directory, rootname='as', simplify=None,
+               target_srs=None, queue_size=1000, spatial_sort=False,
+               block_size=shpt.BLOCK_SIZE):
     """
     This creates a set of shapefiles each one containing a set of sources
-    with uniform characteristics.
+    with uniform characteristics. The sources are read once and sent to
+    the sinks in :data:`SINKS` (one for each shapefile) which write the
+    layers concurrently.
 
     :parameter nrml_data:
         The name of the file containing the model to be tranformed into a
-        shapefile or an instance of :class:`SourceModel`
+        shapefile (gzip compressed when the extension is .gz), an instance
+        of :class:`SourceModel` or an instance of
+        :class:`hmtk_utils.oq_shp_tools.source_table.AreaSourceTable`
     :parameter out_directory:
-        The directory where all the shapefiles will be created
+        The directory where all the shapefiles will be created. When the
+        name ends with .zip the shapefiles are created in memory and
+        stored in a zip archive with this name.
     :parameter str rootname:
         The name used to create the different shaefiles (one for each mfd)
+    :parameter dict simplify:
+        When not None the polygons are simplified. The dictionary can
+        contain the `tolerance` [km], `max_vertices` and
+        `preserve_topology` parameters of
+        :func:`hmtk_utils.oq_shp_tools.polygons.simplify_rings`
+    :parameter target_srs:
+        The spatial reference system of the shapefiles (see
+        :func:`hmtk_utils.oq_shp_tools.projections.get_spatial_reference`).
+        When None the shapefiles use geographic coordinates (WGS84).
+    :parameter int queue_size:
+        The maximum number of sources waiting to be written in each
+        shapefile
+    :parameter bool spatial_sort:
+        When True the area sources are written in the order of the Hilbert
+        index of the centroids of their polygons and the bounding boxes of
+        the blocks of consecutive features of each shapefile are written
+        in a json file (see
+        :func:`hmtk_utils.oq_shp_tools.shapefile_tools.write_block_index`)
+    :parameter int block_size:
+        The number of features of each block of the index
     """
 
-    if isinstance(nrml_data, SourceModel):
-        source_model = nrml_data
+    # Parse the model once. Find the maximum number of nodal planes and the
+    # maximum number of hypocentral depths used for a source
+    source_model = _get_source_model(nrml_data)
+    max_np, max_hd, max_bins = _get_max_nodal_plane_number(source_model)
+
+    # Simplify and reproject the polygons
+    spatial_reference = proj.get_spatial_reference(target_srs)
+    transformation = None
+    if not proj.is_wgs84(spatial_reference):
+        transformation = proj.get_transformation(None, spatial_reference)
+    polygons = None
+    if (simplify is not None or transformation is not None or
+            spatial_sort or isinstance(nrml_data, AreaSourceTable)):
+        polygons = _get_source_polygons(source_model, simplify,
+                                        transformation)
+
+    # Shapefiles stored in a zip archive are created in memory
+    archive = None
+    if out_directory.lower().endswith('.zip'):
+        archive = out_directory
+        out_directory = '/vsimem/%s/' % uuid.uuid4().hex
+
+    # Create the shapefiles and start the sinks
+    sinks = []
+    for typology, mfd_class, create, write in SINKS:
+        data_set = create(out_directory, max_np, max_hd, max_bins, rootname,
+                          spatial_reference)
+        sinks.append((typology, mfd_class,
+                      _LayerSink(data_set, write, max_np, max_hd,
+                                 queue_size)))
+
+    # Sources and polygons in the order of writing
+    if spatial_sort:
+        sources = source_model.sources
+        if not isinstance(sources, AreaSourceTable):
+            sources = [src for src in sources if isinstance(src, AreaSource)]
+        order = poly.get_hilbert_order(*poly.join_rings(polygons))
+        items = ((sources[i], polygons[i]) for i in order)
     else:
-        pass
+        items = _get_source_items(source_model, polygons)
 
-    # Find the maximum number of nodal planes and the maximum number of
-    # hypocentral depths used for a source
-    parser = SourceModelParser(nrml_data)
-    source_model = parser.parse()
-    max_np, max_hd, max_bins = _get_max_nodal_plane_number(source_model)
+    # Route the sources to the sinks
+    try:
+        for source, polygon in items:
+            for typology, mfd_class, sink in sinks:
+                if (isinstance(source, typology) and
+                        isinstance(source.mfd, mfd_class)):
+                    sink.put(source, polygon)
+                    break
+    finally:
+        for _, _, sink in sinks:
+            sink.close()
 
-    # ---- Create shapefile: Area sources with incremental mfd
-    data_set_as_incr = _create_area_source_incmfd_shapefile(out_directory,
-                                                            max_np, max_hd,
-                                                            max_bins,
-                                                            rootname)
-    parser = SourceModelParser(nrml_data)
-    source_model1 = parser.parse()
-
-    lyr = data_set_as_incr.GetLayer()
-    for source in source_model1.sources:
-        # Add area sources
-        if isinstance(source, AreaSource):
-            if isinstance(source.mfd, IncrementalMFD):
-                _write_area_source_incmfd(source, lyr, max_np, max_hd)
+    # Errors raised while writing are raised again here
+    for _, _, sink in sinks:
+        if sink.error is not None:
+            raise sink.error[0], sink.error[1], sink.error[2]
 
-    data_set_as_incr.Destroy()
-    del lyr
-    del parser, source_model1
+    if spatial_sort:
+        for _, _, sink in sinks:
+            if sink.bboxes:
+                shpt.write_block_index(sink.filename, sink.bboxes,
+                                       block_size)
 
-    # ---- Create the shapefile: area sources with truncated GR
-    data_set_as_trgr = _create_area_source_tgrmfd_shapefile(out_directory,
-                                                            max_np, max_hd,
-                                                            rootname)
-    parser = SourceModelParser(nrml_data)
-    source_model1 = parser.parse()
+    if archive is not None:
+        shpt.write_vsimem_zip(out_directory, archive)
 
-    # Get the layer from the dataset
-    lyr = data_set_as_trgr.GetLayer()
 
-    for source in source_model1.sources:
-        # Add area sources
-        if isinstance(source, AreaSource):
-            if isinstance(source.mfd, TGRMFD):
-                _write_area_source_tgrmfd(source, lyr, max_np, max_hd)
+# The shapefiles of a table: mfd type, suffix of the name and function
+# creating the data set
+TABLE_LAYERS = [(INCR_MFD, '_incr', _create_area_source_incmfd_shapefile),
+                (TGR_MFD, '_trgr', _create_area_source_tgrmfd_shapefile)]
+
+# Files of a shapefile copied from the shapefile of another table
+COPIED_EXTENSIONS = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+
+
+def get_table_geometries(table):
+    """
+    Create the polygons of the sources of a table once, e.g. to write
+    several tables with the same geometries (see :func:`write_table_shps`)
+
+    :parameter table:
+        An instance of :class:`AreaSourceTable`
+    :returns:
+        A list with the WKB of the polygon of each source
+    """
+    lons, lats, offsets = poly.close_rings(table.lons, table.lats,
+                                           table.ring_offsets)
+    return [poly.get_polygon_wkb(ring_lons, ring_lats) for
+            ring_lons, ring_lats in poly.split_rings(lons, lats, offsets)]
+
+
+def _is_same_column(values, other):
+    """
+    :returns:
+        True if two columns of an attribute table contain the same values
+        (NaN values are equal)
+    """
+    if values is other:
+        return True
+    if other is None or len(values) != len(other):
+        return False
+    values, other = np.asarray(values), np.asarray(other)
+    if values.dtype.kind == 'f' and other.dtype.kind == 'f':
+        return bool(np.all((values == other) |
+                           (np.isnan(values) & np.isnan(other))))
+    return list(values) == list(other)
+
+
+def _set_fields(feature, columns, names, row):
+    """
+    Set the fields of a feature with the values of a row of the columns of
+    an attribute table. The fields missing in the layer are skipped and
+    the NaN values are not set.
+    """
+    for name in names:
+        idx = feature.GetFieldIndex(name)
+        if idx < 0:
+            continue
+        value = columns[name][row]
+        if value is None or (isinstance(value, (float, np.floating)) and
+                             np.isnan(value)):
+            feature.UnsetField(idx)
+        elif isinstance(value, (float, np.floating)):
+            feature.SetField(idx, float(value))
+        elif isinstance(value, (int, np.integer)):
+            feature.SetField(idx, int(value))
+        else:
+            feature.SetField(idx, str(value))
+
+
+def write_table_shps(table, out_directory, rootname='as', geometries=None,
+                     base=None):
+    """
+    Write a table of area sources in preformatted shapefiles (one for each
+    type of mfd) without creating the sources. The fields are set from the
+    columns of the attribute table and the polygons from their WKB.
+
+    :parameter table:
+        An instance of :class:`AreaSourceTable`
+    :parameter str out_directory:
+        The directory where the shapefiles are created
+    :parameter str rootname:
+        The name used to create the shapefiles
+    :parameter list geometries:
+        The WKB of the polygons of the sources (see
+        :func:`get_table_geometries`). When None they are created from the
+        table.
+    :parameter tuple base:
+        The root name and the table of shapefiles written in
+        `out_directory` for a table with the same sources, polygons and
+        number of values of the ragged columns (e.g. another branch of a
+        logic tree) or None. The files are copied and only the columns
+        which differ are written.
+    :returns:
+        A list with the names of the shapefiles created
+    """
+    columns = table.to_attribute_columns()
+    names = sorted(columns)
+    if base is not None:
+        base_columns = base[1].to_attribute_columns()
+        names = [name for name in names if not
+                 _is_same_column(columns[name], base_columns.get(name))]
+    elif geometries is None:
+        geometries = get_table_geometries(table)
+    mfd_type = np.asarray(table.mfd_type, dtype=object)
+    incr = mfd_type == INCR_MFD
+    max_np = _get_max_count(table.npd_offsets)
+    max_hd = _get_max_count(table.hdd_offsets)
+    max_bins = _get_max_count(table.rate_offsets, incr)
+
+    out = []
+    for mfd, suffix, create in TABLE_LAYERS:
+        rows = np.nonzero(mfd_type == mfd)[0]
+        filename = os.path.join(out_directory, rootname + suffix + '.shp')
+        if base is None:
+            data_source = create(os.path.join(out_directory, ''), max_np,
+                                 max_hd, max_bins, rootname)
+            layer = data_source.GetLayer()
+            for row in rows:
+                feature = ogr.Feature(layer.GetLayerDefn())
+                _set_fields(feature, columns, names, row)
+                feature.SetGeometry(ogr.CreateGeometryFromWkb(
+                    geometries[row]))
+                if layer.CreateFeature(feature) != 0:
+                    raise IOError('Failed to create feature in %s' %
+                                  filename)
+                feature.Destroy()
+        else:
+            root = os.path.join(out_directory, base[0] + suffix)
+            for ext in COPIED_EXTENSIONS:
+                if os.path.isfile(root + ext):
+                    shutil.copyfile(root + ext,
+                                    os.path.splitext(filename)[0] + ext)
+            data_source = ogr.GetDriverByName('ESRI Shapefile').Open(
+                filename, 1)
+            if data_source is None:
+                raise IOError('The shapefile %s cannot be opened' % filename)
+            layer = data_source.GetLayer()
+            if names:
+                # The features of the copy are in the order of the rows
+                for fid, row in enumerate(rows):
+                    feature = layer.GetFeature(fid)
+                    _set_fields(feature, columns, names, row)
+                    layer.SetFeature(feature)
+                    feature.Destroy()
+        data_source.Destroy()
+        out.append(filename)
+    return out
 
-    del data_set_as_trgr
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from hmtk_utils.oq_shp_tools import arrow
+from hmtk_utils.oq_shp_tools.source_table import AreaSourceTable, COLUMNS
+
+
+@unittest.skipIf(arrow.pa is None, 'pyarrow is not installed')
+class ArrowTestCase(unittest.TestCase):
+    """
+    """
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp()
+        self.table = AreaSourceTable(
+            id=['1', '2'], name=['Zone 1', 'Zone 2'],
+            trt=['Active Shallow Crust'] * 2, mag_scale_rel=['WC1994'] * 2,
+            mfd_type=['truncGutenbergRichterMFD', 'IncrementalMFD'],
+            rupt_aspect_ratio=[1.0, 2.0],
+            upper_seismo_depth=[0.0, 5.0], lower_seismo_depth=[20., 25.],
+            a_val=[3.0, np.nan], b_val=[1.0, np.nan], min_mag=[5.0, 5.05],
+            max_mag=[7.0, np.nan], bin_width=[np.nan, 0.1],
+            rate_offsets=[0, 0, 2], occur_rates=[0.1, 0.01],
+            npd_offsets=[0, 1, 2], npd_probability=[1.0, 1.0],
+            npd_strike=[0., 90.], npd_dip=[90., 45.], npd_rake=[0., 90.],
+            hdd_offsets=[0, 1, 3], hdd_probability=[1.0, 0.5, 0.5],
+            hdd_depth=[10., 5., 15.],
+            ring_offsets=[0, 5, 9],
+            lons=[0., 0., 1., 1., 0., 10., 12., 10., 10.],
+            lats=[0., 1., 1., 0., 0., 0., 0., 2., 0.])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path)
+
+    def _check_equal(self, table, expected):
+        for name in COLUMNS:
+            np.testing.assert_equal(getattr(table, name),
+                                    getattr(expected, name))
+
+    def test_round_trip(self):
+        for geometry in arrow.GEOMETRY_FORMATS:
+            arrow_table = arrow.to_arrow(self.table, geometry=geometry)
+            self.assertEqual(arrow_table.num_rows, 2)
+            self._check_equal(arrow.from_arrow(arrow_table), self.table)
+        self.assertRaises(ValueError, arrow.to_arrow, self.table, 'wkt')
+
+    def test_slice(self):
+        """
+        The offsets of the list columns of a slice start from 0
+        """
+        arrow_table = arrow.to_arrow(self.table, geometry='coords')
+        table = arrow.from_arrow(arrow_table.slice(1, 1))
+        self._check_equal(table, self.table.select([1]))
+
+    def test_geoparquet(self):
+        filename = os.path.join(self.tmp_path, 'model.parquet')
+        arrow.write_geoparquet(self.table, filename)
+        self._check_equal(arrow.read_geoparquet(filename), self.table)
+        metadata = arrow.pq.read_schema(filename).metadata
+        self.assertIn(b'geo', metadata)
+        # Column pruning
+        table = arrow.read_geoparquet(filename, columns=['b_val'])
+        np.testing.assert_equal(table.id, self.table.id)
+        np.testing.assert_equal(table.b_val, self.table.b_val)
+        self.assertTrue(np.all(np.isnan(table.a_val)))
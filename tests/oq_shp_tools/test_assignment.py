@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+"""
+
+import unittest
+import numpy as np
+
+from hmtk_utils.oq_shp_tools.assignment import assign_events, \
+    get_zone_counts, get_zone_index
+from hmtk_utils.oq_shp_tools.source_table import AreaSourceTable
+
+
+def _get_zones():
+    """
+    Create two adjacent square zones and a triangle overlapping the second
+    one at larger depth
+    """
+    return AreaSourceTable(
+        id=['1', '2', '3'],
+        upper_seismo_depth=[0., 0., 30.], lower_seismo_depth=[20., 20., 60.],
+        ring_offsets=[0, 5, 10, 14],
+        lons=[0., 0., 1., 1., 0., 1., 1., 2., 2., 1., 1., 1.5, 2., 1.],
+        lats=[0., 1., 1., 0., 0., 0., 1., 1., 0., 0., 0., 1., 0., 0.])
+
+
+class AssignmentTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_index(self):
+        zones = _get_zones()
+        index = get_zone_index(zones.lons, zones.lats, zones.ring_offsets,
+                               cell_size=0.5)
+        self.assertEqual(index['num_x'], 5)
+        # The first zone covers 3 x 3 cells
+        self.assertEqual(np.sum(index['rings'] == 0), 9)
+        self.assertTrue(np.all(np.diff(index['cells']) >= 0))
+
+    def test_assign(self):
+        lons = [0.5, 1.5, 1.5, 1.5, 3.0, 1.1]
+        lats = [0.5, 0.2, 0.2, 0.9, 0.5, 0.9]
+        depths = [10., 10., 40., np.nan, 10., 40.]
+        out = assign_events(lons, lats, depths, _get_zones(), chunk_size=4)
+        np.testing.assert_equal(out, [0, 1, 2, 1, -1, -1])
+        np.testing.assert_equal(get_zone_counts(out, 3), [1, 2, 1])
+
+    def test_without_depths(self):
+        out = assign_events([0.5, 1.5], [0.5, 0.2], None, _get_zones())
+        np.testing.assert_equal(out, [0, 1])
+        self.assertRaises(ValueError, assign_events, [0.5], [0.5, 0.2],
+                          None, _get_zones())
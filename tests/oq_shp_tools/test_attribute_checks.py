@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+"""
+
+import unittest
+import numpy as np
+
+from hmtk_utils.oq_shp_tools import attribute_checks as chk
+
+
+class AttributeChecksTestCase(unittest.TestCase):
+    """
+    """
+
+    def setUp(self):
+        """
+        Create the columns of an attribute table with three sources. The
+        first one is consistent.
+        """
+        nan = np.nan
+        self.columns = {
+            'src_id': np.array(['1', '2', '3'], dtype=object),
+            'upp_seismo': np.array([0.0, 10.0, 0.0]),
+            'low_seismo': np.array([20.0, 5.0, 20.0]),
+            'min_mag': np.array([5.0, 5.0, 6.0]),
+            'max_mag': np.array([7.0, 7.0, 6.0]),
+            'num_npd': np.array([2, 1, 2]),
+            'weight_1': np.array([0.5, 1.0, 0.5]),
+            'strike_1': np.array([0.0, 0.0, 0.0]),
+            'dip_1': np.array([90.0, 90.0, 90.0]),
+            'rake_1': np.array([0.0, 0.0, 0.0]),
+            'weight_2': np.array([0.5, nan, 0.4]),
+            'strike_2': np.array([90.0, nan, nan]),
+            'dip_2': np.array([90.0, nan, 90.0]),
+            'rake_2': np.array([0.0, nan, 0.0]),
+            'num_hdd': np.array([1, 2, 1]),
+            'hdd_d_1': np.array([10.0, 10.0, nan]),
+            'hdd_w_1': np.array([1.0, 1.0, 1.0])}
+
+    def test_errors(self):
+        """
+        Check the errors found
+        """
+        errors = chk.get_attribute_errors(self.columns)
+        np.testing.assert_equal(errors[chk.NPD_WEIGHTS], [False, False, True])
+        np.testing.assert_equal(errors[chk.INCOMPLETE_NPD],
+                                [False, False, True])
+        np.testing.assert_equal(errors[chk.NUM_NPD], [False, False, False])
+        np.testing.assert_equal(errors[chk.NUM_HDD], [False, True, False])
+        np.testing.assert_equal(errors[chk.MISSING_DEPTH],
+                                [False, False, True])
+        np.testing.assert_equal(errors[chk.MAG_RANGE], [False, False, True])
+        np.testing.assert_equal(errors[chk.DEPTH_RANGE], [False, True, False])
+
+    def test_report(self):
+        """
+        Check the report
+        """
+        report = chk.check_area_source_attributes(self.columns)
+        self.assertEqual(report['num_sources'], 3)
+        self.assertEqual(report['num_with_errors'], 2)
+        self.assertEqual([src['src_id'] for src in report['sources']],
+                         ['2', '3'])
+        self.assertEqual(report['num_failures'][chk.MAG_RANGE], 1)
+
+    def test_report_without_checks(self):
+        """
+        The sources are counted when no check applies
+        """
+        report = chk.check_area_source_attributes(
+            {'src_id': self.columns['src_id']})
+        self.assertEqual(report['num_sources'], 3)
+        self.assertEqual(report['num_with_errors'], 0)
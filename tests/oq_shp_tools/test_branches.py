@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+"""
+
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from xml.etree import ElementTree
+
+from hmtk_utils.oq_shp_tools.branches import apply_perturbations, \
+    expand_branches
+from hmtk_utils.oq_shp_tools.nrml import write_nrml
+from hmtk_utils.oq_shp_tools.parsers import parse_area_source_shp
+from hmtk_utils.oq_shp_tools.shapefile_tools import get_blocks_in_bbox
+from hmtk_utils.oq_shp_tools.source_table import AreaSourceTable
+
+NRML = '{http://openquake.org/xmlns/nrml/0.4}'
+
+
+class BranchesTestCase(unittest.TestCase):
+    """
+    """
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp()
+        self.table = AreaSourceTable(
+            id=['1', '2'], name=['Zone 1', 'Zone & 2'],
+            trt=['Active Shallow Crust', 'Stable Continental Crust'],
+            mag_scale_rel=['WC1994', 'WC1994'],
+            mfd_type=['truncGutenbergRichterMFD', 'IncrementalMFD'],
+            rupt_aspect_ratio=[1.0, 2.0],
+            upper_seismo_depth=[0.0, 5.0], lower_seismo_depth=[20., 25.],
+            a_val=[3.0, np.nan], b_val=[1.0, np.nan], min_mag=[5.0, 5.05],
+            max_mag=[7.0, np.nan], bin_width=[np.nan, 0.1],
+            rate_offsets=[0, 0, 2], occur_rates=[0.1, 0.01],
+            npd_offsets=[0, 1, 2], npd_probability=[1.0, 1.0],
+            npd_strike=[0., 90.], npd_dip=[90., 45.], npd_rake=[0., 90.],
+            hdd_offsets=[0, 1, 3], hdd_probability=[1.0, 0.5, 0.5],
+            hdd_depth=[10., 5., 15.],
+            ring_offsets=[0, 5, 9],
+            lons=[0., 0., 1., 1., 0., 10., 12., 10., 10.],
+            lats=[0., 1., 1., 0., 0., 0., 0., 2., 0.])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path)
+
+    def test_perturbations(self):
+        """
+        Only the perturbed columns are copied
+        """
+        variant = apply_perturbations(self.table, [
+            {'column': 'b_value', 'op': 'add', 'value': 0.1},
+            {'column': 'max_mag', 'op': 'scale', 'value': 1.1},
+            {'column': 'mag_scal_r', 'op': 'set', 'value': 'PeerMSR',
+             'ids': ['2']},
+            {'column': 'occur_rates', 'op': 'scale', 'value': 2.}])
+        np.testing.assert_allclose(variant.b_val, [1.1, np.nan])
+        np.testing.assert_allclose(variant.max_mag, [7.7, np.nan])
+        self.assertEqual(list(variant.mag_scale_rel), ['WC1994', 'PeerMSR'])
+        np.testing.assert_allclose(variant.occur_rates, [0.2, 0.02])
+        np.testing.assert_equal(self.table.b_val, [1.0, np.nan])
+        self.assertEqual(list(self.table.mag_scale_rel), ['WC1994'] * 2)
+        self.assertIs(variant.lons, self.table.lons)
+        self.assertIs(variant.a_val, self.table.a_val)
+
+    def test_errors(self):
+        self.assertRaises(ValueError, apply_perturbations, self.table,
+                          [{'column': 'unknown', 'value': 1.}])
+        self.assertRaises(ValueError, apply_perturbations, self.table,
+                          [{'column': 'src_id', 'value': '3'}])
+        self.assertRaises(ValueError, apply_perturbations, self.table,
+                          [{'column': 'trt', 'op': 'add', 'value': 'a'}])
+
+    def test_expand_nrml(self):
+        """
+        Write two branches as nrml files
+        """
+        spec = [{'name': 'low', 'perturbations': [
+                    {'column': 'b_val', 'op': 'add', 'value': -0.1}]},
+                {'name': 'high', 'perturbations': [
+                    {'column': 'b_val', 'op': 'add', 'value': 0.1}]}]
+        filenames = expand_branches(self.table, spec, self.tmp_path)
+        self.assertEqual([os.path.basename(fname) for fname in filenames],
+                         ['low.xml', 'high.xml'])
+        root = ElementTree.parse(filenames[1]).getroot()
+        sources = root.findall('%ssourceModel/%sareaSource' % (NRML, NRML))
+        self.assertEqual(len(sources), 2)
+        self.assertEqual(sources[1].get('name'), 'Zone & 2')
+        mfd = sources[0].find('%struncGutenbergRichterMFD' % NRML)
+        self.assertAlmostEqual(float(mfd.get('bValue')), 1.1)
+        pos = sources[0].find('.//{http://www.opengis.net/gml}posList')
+        self.assertEqual(len(pos.text.split()), 8)
+        rates = sources[1].find('%sincrementalMFD/%soccurRates' % (NRML,
+                                                                   NRML))
+        self.assertEqual(rates.text, '0.1 0.01')
+        depths = sources[1].findall('%shypoDepthDist/%shypoDepth' % (NRML,
+                                                                     NRML))
+        self.assertEqual(len(depths), 2)
+
+    def test_expand_shp(self):
+        """
+        Write two branches as shapefiles. The second one is a copy of the
+        first one with the perturbed columns updated.
+        """
+        spec = [{'name': 'low', 'perturbations': [
+                    {'column': 'b_val', 'op': 'add', 'value': -0.1}]},
+                {'name': 'high', 'perturbations': [
+                    {'column': 'b_val', 'op': 'add', 'value': 0.1},
+                    {'column': 'occur_rates', 'op': 'scale', 'value': 2.}]}]
+        roots = expand_branches(self.table, spec, self.tmp_path,
+                                out_format='shp')
+        self.assertEqual([os.path.basename(root) for root in roots],
+                         ['low', 'high'])
+        for root, b_val, rates in zip(roots, [0.9, 1.1],
+                                      [[0.1, 0.01], [0.2, 0.02]]):
+            table = parse_area_source_shp(root + '_trgr.shp', as_table=True)
+            self.assertEqual(list(table.id), ['1'])
+            self.assertAlmostEqual(table.b_val[0], b_val)
+            self.assertEqual(table.a_val[0], 3.0)
+            np.testing.assert_equal(table.lons[:4], [0., 0., 1., 1.])
+            table = parse_area_source_shp(root + '_incr.shp', as_table=True)
+            self.assertEqual(list(table.name), ['Zone & 2'])
+            np.testing.assert_allclose(table.occur_rates, rates)
+            np.testing.assert_equal(table.hdd_depth, [5., 15.])
+
+    def test_gzip_nrml(self):
+        """
+        Write a compressed nrml file
+        """
+        filename = os.path.join(self.tmp_path, 'model.xml.gz')
+        write_nrml(self.table, filename, 'model')
+        root = ElementTree.parse(gzip.open(filename)).getroot()
+        self.assertEqual(len(root.findall('%ssourceModel/%sareaSource' %
+                                          (NRML, NRML))), 2)
+
+    def test_spatial_sort(self):
+        """
+        Sources are written along the Hilbert curve and the byte ranges of
+        the blocks are recorded in the index
+        """
+        table = self.table.select([1, 0])
+        filename = os.path.join(self.tmp_path, 'sorted.xml')
+        write_nrml(table, filename, 'sorted', spatial_sort=True,
+                   block_size=1)
+        root = ElementTree.parse(filename).getroot()
+        ids = [elem.get('id') for elem in
+               root.iter(NRML + 'areaSource')]
+        self.assertEqual(ids, ['1', '2'])
+        blocks = get_blocks_in_bbox(filename, (9., -1., 13., 3.))
+        self.assertEqual(len(blocks), 1)
+        self.assertEqual(blocks[0]['first'], 1)
+        self.assertEqual(blocks[0]['bbox'], [10., 0., 12., 2.])
+        with open(filename, 'rb') as fin:
+            fin.seek(blocks[0]['offset'])
+            data = fin.read(blocks[0]['length'])
+        self.assertIn('id="2"', data)
+        self.assertNotIn('id="1"', data)
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from hmtk_utils.oq_shp_tools.conversion_service import ConversionService, \
+    get_job_key
+
+BASE_DATA_PATH = os.path.join(os.path.dirname(__file__), 'dat')
+
+
+def _copy_converter(input_path, archive, suffix=''):
+    """
+    A conversion storing a copy of the input in the archive
+    """
+    with zipfile.ZipFile(archive, 'w') as zfile:
+        zfile.write(input_path, os.path.basename(input_path) + suffix)
+
+
+def _failing_converter(input_path, archive):
+    """
+    A conversion always failing
+    """
+    raise ValueError('Conversion failed')
+
+
+class ConversionServiceTestCase(unittest.TestCase):
+    """
+    """
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp()
+        self.input_path = os.path.join(self.tmp_path, 'model.xml')
+        with open(self.input_path, 'w') as fout:
+            fout.write('<nrml/>')
+        self.service = ConversionService(
+            os.path.join(self.tmp_path, 'out'), processes=2,
+            converters={'copy': _copy_converter,
+                        'fail': _failing_converter})
+
+    def tearDown(self):
+        self.service.close()
+        shutil.rmtree(self.tmp_path)
+
+    def test_job_key(self):
+        key = get_job_key('copy', self.input_path, {})
+        self.assertEqual(key, get_job_key('copy', self.input_path, {}))
+        self.assertNotEqual(key, get_job_key('copy', self.input_path,
+                                             {'suffix': '.bak'}))
+        with open(self.input_path, 'w') as fout:
+            fout.write('<nrml></nrml>')
+        self.assertNotEqual(key, get_job_key('copy', self.input_path, {}))
+
+    def test_job_key_shapefile(self):
+        filename = os.path.join(BASE_DATA_PATH,
+                                'oq_area_source_template.shp')
+        key = get_job_key('shp_to_nrml', filename, {})
+        self.assertEqual(len(key), 40)
+
+    def test_deduplicate(self):
+        job1 = self.service.submit('copy', self.input_path)
+        job2 = self.service.submit('copy', self.input_path)
+        self.assertIs(job1, job2)
+        job3 = self.service.submit('copy', self.input_path, suffix='.bak')
+        self.assertIsNot(job1, job3)
+        archive = job1.wait(10)
+        with zipfile.ZipFile(archive) as zfile:
+            self.assertEqual(zfile.namelist(), ['model.xml'])
+        with zipfile.ZipFile(job3.wait(10)) as zfile:
+            self.assertEqual(zfile.namelist(), ['model.xml.bak'])
+
+    def test_stream(self):
+        job = self.service.submit('copy', self.input_path)
+        data = ''.join(self.service.stream(job, chunk_size=16, timeout=10))
+        with open(job.archive, 'rb') as fin:
+            self.assertEqual(data, fin.read())
+
+    def test_existing_archive(self):
+        job = self.service.submit('copy', self.input_path)
+        job.wait(10)
+        service = ConversionService(os.path.join(self.tmp_path, 'out'),
+                                    processes=1,
+                                    converters={'copy': _copy_converter})
+        try:
+            cached = service.submit('copy', self.input_path)
+            self.assertTrue(cached.ready())
+            self.assertEqual(cached.archive, job.archive)
+        finally:
+            service.close()
+
+    def test_failure(self):
+        job = self.service.submit('fail', self.input_path)
+        self.assertRaises(ValueError, job.wait, 10)
+        self.assertIsNot(job, self.service.submit('fail', self.input_path))
+
+    def test_unsupported(self):
+        self.assertRaises(ValueError, self.service.submit, 'unknown',
+                          self.input_path)
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+"""
+
+import unittest
+import numpy as np
+
+from hmtk_utils.oq_shp_tools.diff import diff_models, get_diff_summary, \
+    join_ids
+from hmtk_utils.oq_shp_tools.source_table import AreaSourceTable
+
+
+def _get_table(**changes):
+    """
+    Create a table with three sources, updating some columns
+    """
+    columns = dict(
+        id=['1', '2', '3'], name=['Zone 1', 'Zone 2', 'Zone 3'],
+        trt=['Active Shallow Crust'] * 3, mag_scale_rel=['WC1994'] * 3,
+        mfd_type=['truncGutenbergRichterMFD', 'IncrementalMFD',
+                  'truncGutenbergRichterMFD'],
+        rupt_aspect_ratio=[1.0, 2.0, 1.0],
+        upper_seismo_depth=[0.0, 5.0, 0.0],
+        lower_seismo_depth=[20., 25., 20.],
+        a_val=[3.0, np.nan, 4.0], b_val=[1.0, np.nan, 0.9],
+        min_mag=[5.0, 5.05, 5.0], max_mag=[7.0, np.nan, 7.5],
+        bin_width=[np.nan, 0.1, np.nan],
+        rate_offsets=[0, 0, 2, 2], occur_rates=[0.1, 0.01],
+        npd_offsets=[0, 1, 2, 3], npd_probability=[1.0, 1.0, 1.0],
+        npd_strike=[0., 90., 0.], npd_dip=[90., 45., 90.],
+        npd_rake=[0., 90., 0.],
+        hdd_offsets=[0, 1, 2, 3], hdd_probability=[1.0, 1.0, 1.0],
+        hdd_depth=[10., 5., 10.],
+        ring_offsets=[0, 4, 8, 12],
+        lons=[0., 0., 1., 1., 1., 1., 2., 2., 2., 2., 3., 3.],
+        lats=[0., 1., 1., 0., 0., 1., 1., 0., 0., 1., 1., 0.])
+    columns.update(changes)
+    return AreaSourceTable(**columns)
+
+
+class DiffTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_join(self):
+        old_idx, new_idx, removed, added = join_ids(['a', 'b', 'c'],
+                                                    ['d', 'c', 'a'])
+        np.testing.assert_equal(old_idx, [0, 2])
+        np.testing.assert_equal(new_idx, [2, 1])
+        np.testing.assert_equal(removed, [1])
+        np.testing.assert_equal(added, [0])
+        self.assertRaises(ValueError, join_ids, ['a', 'a'], ['a'])
+
+    def test_no_changes(self):
+        diff = diff_models(_get_table(), _get_table())
+        self.assertEqual(diff['changed'], [])
+        self.assertEqual(diff['num_unchanged'], 3)
+
+    def test_changes(self):
+        """
+        Changes of the b value, of the rates, of the depths and of a
+        vertex plus a source renamed
+        """
+        old = _get_table()
+        new = _get_table(
+            id=['1', '2', '4'], b_val=[1.1, np.nan, 0.9],
+            occur_rates=[0.1, 0.02],
+            hdd_depth=[10., 5., 10.], lower_seismo_depth=[20., 30., 20.],
+            lons=[0., 0., 1.000001, 1., 1., 1., 2., 2.1, 2., 2., 3., 3.])
+        diff = diff_models(old, new)
+        self.assertEqual(diff['removed'], ['3'])
+        self.assertEqual(diff['added'], ['4'])
+        self.assertEqual(diff['num_unchanged'], 0)
+        changes = dict((src['src_id'], src['changes']) for src in
+                       diff['changed'])
+        self.assertEqual(sorted(changes['1']), ['mfd'])
+        self.assertEqual(changes['1']['mfd'][0]['b_val'], 1.0)
+        self.assertEqual(changes['1']['mfd'][1]['b_val'], 1.1)
+        self.assertEqual(sorted(changes['2']), ['depths', 'geometry', 'mfd'])
+        self.assertEqual(changes['2']['mfd'][1]['occur_rates'], [0.1, 0.02])
+        self.assertEqual(changes['2']['depths'][1]['lower_seismo_depth'],
+                         30.)
+        summary = get_diff_summary(diff)
+        self.assertIn('Sources changed: 2', summary)
+        self.assertIn('Changed geometry (1): 2', summary)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+"""
+
+import unittest
+import numpy as np
+
+from hmtk_utils.oq_shp_tools import polygons as poly
+from hmtk_utils.oq_shp_tools.discretization import discretize_rings, \
+    get_discretization_summary, get_num_magnitude_bins
+from hmtk_utils.oq_shp_tools.source_table import AreaSourceTable
+
+
+class DiscretizationTestCase(unittest.TestCase):
+    """
+    """
+
+    def setUp(self):
+        """
+        A square with a TGR distribution and a triangle with an incremental
+        distribution
+        """
+        self.table = AreaSourceTable(
+            id=['1', '2'],
+            mfd_type=['truncGutenbergRichterMFD', 'IncrementalMFD'],
+            a_val=[3.0, np.nan], b_val=[1.0, np.nan], min_mag=[5.0, 5.05],
+            max_mag=[7.0, np.nan], bin_width=[np.nan, 0.1],
+            rate_offsets=[0, 0, 3], occur_rates=[0.1, 0.01, 0.001],
+            npd_offsets=[0, 2, 3], npd_probability=[0.5, 0.5, 1.0],
+            npd_strike=[0., 90., 0.], npd_dip=[90., 90., 45.],
+            npd_rake=[0., 0., 90.],
+            hdd_offsets=[0, 1, 3], hdd_probability=[1.0, 0.5, 0.5],
+            hdd_depth=[10., 5., 15.],
+            ring_offsets=[0, 5, 9],
+            lons=[0., 0., 1., 1., 0., 10., 12., 10., 10.],
+            lats=[0., 1., 1., 0., 0., 0., 0., 2., 0.])
+
+    def test_square(self):
+        """
+        The grid of the square has 4 x 4 points
+        """
+        spacing = 0.3 * poly.DEG_TO_KM
+        xpnt, ypnt, offsets = discretize_rings(
+            self.table.lons[:5], self.table.lats[:5], np.array([0, 5]),
+            spacing)
+        np.testing.assert_equal(offsets, [0, 16])
+        np.testing.assert_allclose(np.unique(ypnt),
+                                   [0.05, 0.35, 0.65, 0.95])
+
+    def test_magnitude_bins(self):
+        np.testing.assert_equal(get_num_magnitude_bins(self.table), [20, 3])
+
+    def test_summary(self):
+        """
+        The number of points of the triangle is about half the number of
+        points of the bounding box
+        """
+        summary = get_discretization_summary(self.table, spacing=10.)
+        num_points = summary['num_points']
+        self.assertEqual(num_points[0], 12 * 12)
+        self.assertTrue(abs(num_points[1] / (23. * 23. / 2.) - 1.) < 0.1)
+        np.testing.assert_equal(summary['num_ruptures'],
+                                num_points * np.array([40, 6]))
+        self.assertEqual(summary['total_ruptures'],
+                         summary['num_ruptures'].sum())
+        self.assertTrue(summary['memory'] > 0)
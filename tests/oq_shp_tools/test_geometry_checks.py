@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from hmtk_utils.oq_shp_tools import polygons as poly
+from hmtk_utils.oq_shp_tools.geometry_checks import check_area_source_shp, \
+    check_polygons, DUPLICATE_VERTICES, INVALID_GEOMETRY, \
+    UNREPAIRABLE_GEOMETRY
+
+
+class GeometryChecksTestCase(unittest.TestCase):
+    """
+    """
+    BASE_DATA_PATH = os.path.join(os.path.dirname(__file__), 'dat')
+
+    def setUp(self):
+        """
+        Fix the name of the sample shapefile and create a temporary folder
+        """
+        flnme = 'oq_area_source_template.shp'
+        self.filename = os.path.join(self.BASE_DATA_PATH, flnme)
+        self.tmp_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path)
+
+    def test_check_template(self):
+        """
+        The polygon in the template contains a duplicated vertex
+        """
+        report_filename = os.path.join(self.tmp_path, 'report.json')
+        report = check_area_source_shp(self.filename,
+                                       report_filename=report_filename,
+                                       processes=1)
+        self.assertEqual(report['num_polygons'], 1)
+        self.assertEqual(report['polygons'][0]['src_id'], '1')
+        self.assertEqual(report['polygons'][0]['errors'],
+                         [DUPLICATE_VERTICES])
+        with open(report_filename) as fin:
+            self.assertEqual(json.load(fin), report)
+
+    def test_repair_template(self):
+        """
+        The repaired polygon does not have problems
+        """
+        out_filename = os.path.join(self.tmp_path, 'repaired.shp')
+        check_area_source_shp(self.filename, out_filename=out_filename,
+                              processes=1)
+        report = check_area_source_shp(out_filename, processes=1)
+        self.assertEqual(report['num_with_errors'], 0)
+
+    def test_unrepairable(self):
+        """
+        A ring collapsing to a line is reported as unrepairable and kept
+        """
+        lons = np.array([0., 1., 2., 0.])
+        lats = np.array([0., 0., 0., 0.])
+        offsets = np.array([0, 4])
+        errors, geoms = check_polygons(lons, lats, offsets, processes=1,
+                                       repair=True)
+        self.assertEqual(errors[0], [INVALID_GEOMETRY,
+                                     UNREPAIRABLE_GEOMETRY])
+        self.assertEqual(geoms[0], poly.get_polygon_wkb(lons, lats))
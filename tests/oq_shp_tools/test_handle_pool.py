@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from hmtk_utils.oq_shp_tools import handle_pool
+from hmtk_utils.oq_shp_tools.handle_pool import HandlePool, get_signature
+from hmtk_utils.oq_shp_tools.parsers import parse_area_source_shp
+
+BASE_DATA_PATH = os.path.join(os.path.dirname(__file__), 'dat')
+TEMPLATE = 'oq_area_source_template'
+
+
+class _FakeDataSource(object):
+
+    def GetLayerCount(self):
+        return 0
+
+    def Destroy(self):
+        pass
+
+
+class _FakeOgr(object):
+    """
+    Opens fake data sources recording if the lock of the pool is held
+    """
+
+    def __init__(self, pool, fail=False):
+        self.pool = pool
+        self.fail = fail
+        self.locked = []
+
+    def GetDriverByName(self, name):
+        return self
+
+    def Open(self, path, update):
+        self.locked.append(self.pool._lock.locked())
+        return None if self.fail else _FakeDataSource()
+
+
+class HandlePoolTestCase(unittest.TestCase):
+    """
+    """
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp()
+        for ext in ('.shp', '.shx', '.dbf', '.prj'):
+            shutil.copy(os.path.join(BASE_DATA_PATH, TEMPLATE + ext),
+                        self.tmp_path)
+        self.filename = os.path.join(self.tmp_path, TEMPLATE + '.shp')
+        self.pool = HandlePool(max_idle=60)
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.tmp_path)
+
+    def test_signature(self):
+        signature = get_signature(self.filename)
+        self.assertEqual([sig[0] for sig in signature],
+                         ['.shp', '.shx', '.dbf', '.prj'])
+        with open(os.path.join(self.tmp_path, TEMPLATE + '.dbf'),
+                  'ab') as fout:
+            fout.write(b' ')
+        self.assertNotEqual(get_signature(self.filename), signature)
+
+    def test_reuse(self):
+        with self.pool.open(self.filename) as first:
+            # Nested calls get a different handle
+            with self.pool.open(self.filename) as second:
+                self.assertFalse(first is second)
+        self.assertEqual(len(self.pool), 2)
+        with self.pool.open(self.filename) as third:
+            self.assertTrue(third is first or third is second)
+        self.assertEqual(len(self.pool), 2)
+        self.assertEqual(self.pool.close(), 2)
+        self.assertEqual(len(self.pool), 0)
+
+    def test_threads(self):
+        """
+        Threads reading at the same time get different handles
+        """
+        handles = []
+        done = threading.Event()
+
+        def read():
+            with self.pool.open(self.filename) as data_source:
+                handles.append(data_source)
+                done.wait(10)
+
+        threads = [threading.Thread(target=read) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        while len(handles) < 3 and all(t.is_alive() for t in threads):
+            time.sleep(0.01)
+        done.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(id(h) for h in handles)), 3)
+        self.assertEqual(len(self.pool), 3)
+
+    def test_open_without_lock(self):
+        """
+        The files are opened without holding the lock of the pool and a
+        failed opening does not leave a handle
+        """
+        ogr = handle_pool.ogr
+        try:
+            handle_pool.ogr = _FakeOgr(self.pool)
+            with self.pool.open(self.filename):
+                pass
+            self.assertEqual(handle_pool.ogr.locked, [False])
+            self.assertEqual(len(self.pool), 1)
+            self.pool.close()
+            handle_pool.ogr = _FakeOgr(self.pool, fail=True)
+            with self.assertRaises(IOError):
+                with self.pool.open(self.filename):
+                    pass
+            self.assertEqual(len(self.pool), 0)
+        finally:
+            handle_pool.ogr = ogr
+
+    def test_invalidation(self):
+        with self.pool.open(self.filename) as first:
+            pass
+        with open(os.path.join(self.tmp_path, TEMPLATE + '.dbf'),
+                  'ab') as fout:
+            fout.write(b' ')
+        with self.pool.open(self.filename) as second:
+            self.assertFalse(first is second)
+        self.assertEqual(len(self.pool), 1)
+
+    def test_parse(self):
+        sources = parse_area_source_shp(self.filename, pool=self.pool)
+        again = parse_area_source_shp(self.filename, pool=self.pool)
+        self.assertEqual([s.id for s in sources], [s.id for s in again])
+        self.assertEqual(len(self.pool), 1)
+        self.assertRaises(IOError, parse_area_source_shp,
+                          os.path.join(self.tmp_path, 'pippo.shp'),
+                          pool=self.pool)
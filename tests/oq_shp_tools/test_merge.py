@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from hmtk_utils.oq_shp_tools.merge import get_merged_attributes, \
+    get_unique_ids, merge_area_source_shps
+
+BASE_DATA_PATH = os.path.join(os.path.dirname(__file__), 'dat')
+
+
+class MergeAttributesTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_families(self):
+        """
+        The nodal plane fields are extended to the largest number used
+        """
+        first = [{'name': 'src_id', 'type': 'String', 'len': 10},
+                 {'name': 'num_npd', 'type': 'Integer'},
+                 {'name': 'weight_1', 'type': 'Real'},
+                 {'name': 'strike_1', 'type': 'Real'},
+                 {'name': 'a_value', 'type': 'Integer'}]
+        second = [{'name': 'src_id', 'type': 'String', 'len': 12},
+                  {'name': 'num_npd', 'type': 'Integer'},
+                  {'name': 'weight_1', 'type': 'Real'},
+                  {'name': 'weight_2', 'type': 'Real'},
+                  {'name': 'a_value', 'type': 'Real'},
+                  {'name': 'num_hdd', 'type': 'Integer'},
+                  {'name': 'hdd_d_1', 'type': 'Real'}]
+        out = get_merged_attributes([first, second])
+        self.assertEqual([att['name'] for att in out],
+                         ['src_id', 'num_npd', 'weight_1', 'strike_1',
+                          'weight_2', 'strike_2', 'a_value', 'num_hdd',
+                          'hdd_d_1'])
+        self.assertEqual(out[0]['len'], 12)
+        self.assertEqual(out[6]['type'], 'Real')
+
+    def test_unique_ids(self):
+        """
+        Repeated IDs get a suffix
+        """
+        ids, remapped = get_unique_ids(['1', '2', '1', '1_1', '1',
+                                        'abcdefghij', 'abcdefghij'])
+        self.assertEqual(ids, ['1', '2', '1_2', '1_1', '1_3', 'abcdefghij',
+                               'abcdefgh_1'])
+        self.assertEqual(remapped, [2, 4, 6])
+
+
+class MergeShapefilesTestCase(unittest.TestCase):
+    """
+    """
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp()
+        self.filename = os.path.join(BASE_DATA_PATH,
+                                     'oq_area_source_template.shp')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path)
+
+    def test_merge_template(self):
+        """
+        Merge the template with itself
+        """
+        out_filename = os.path.join(self.tmp_path, 'merged.shp')
+        report = merge_area_source_shps([self.filename, self.filename],
+                                        out_filename, check_overlaps=True)
+        self.assertEqual(report['num_sources'], 2)
+        self.assertEqual(len(report['remapped_ids']), 1)
+        self.assertEqual(report['remapped_ids'][0]['new_id'], '1_1')
+        self.assertEqual(len(report['overlaps']), 1)
+        self.assertTrue(os.path.isfile(out_filename))
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+"""
+
+import unittest
+import numpy as np
+
+from hmtk_utils.oq_shp_tools.mfd import get_tgr_rates, \
+    get_incremental_rates, get_cumulative_rates, get_magnitude_bins, \
+    get_moment_rates, get_seismic_moment, get_model_rates, \
+    get_incremental_moment_rates
+
+
+class MFDTestCase(unittest.TestCase):
+    """
+    """
+
+    def setUp(self):
+        """
+        Create the columns of an attribute table with two truncated GR
+        distributions and one incremental distribution
+        """
+        nan = np.nan
+        self.columns = {
+            'mfd_type': np.array(['truncGutenbergRichterMFD',
+                                  'IncrementalMFD',
+                                  'truncGutenbergRichterMFD'], dtype=object),
+            'a_value': np.array([3.0, nan, 4.0]),
+            'b_value': np.array([1.0, nan, 0.9]),
+            'min_mag': np.array([5.0, 5.05, 4.5]),
+            'max_mag': np.array([7.0, nan, 6.55]),
+            'bin_width': np.array([nan, 0.1, nan]),
+            'or_1': np.array([nan, 0.1, nan]),
+            'or_2': np.array([nan, 0.05, nan]),
+            'or_3': np.array([nan, nan, nan])}
+
+    def test_tgr_total_rate(self):
+        """
+        The sum of the rates equals the rate between min and max magnitude
+        """
+        edges = get_magnitude_bins(np.array([4.5]), np.array([7.0]), 0.1)
+        rates = get_tgr_rates([3.0, 4.0], [1.0, 0.9], [5.0, 4.5],
+                              [7.0, 6.55], edges)
+        expected = np.array([10.**(3.0 - 5.0) - 10.**(3.0 - 7.0),
+                             10.**(4.0 - 0.9 * 4.5) - 10.**(4.0 - 0.9 * 6.55)])
+        np.testing.assert_allclose(rates.sum(axis=1), expected)
+        # No rates below the minimum magnitude of the first source
+        self.assertTrue(np.all(rates[0, edges[1:] <= 5.0 + 1e-9] == 0.0))
+
+    def test_incremental_rates(self):
+        """
+        Incremental rates are assigned to the bins containing the magnitudes
+        """
+        edges = np.arange(5.0, 5.35, 0.1)
+        rates = get_incremental_rates([[0.1, 0.05, np.nan]], [5.05], [0.1],
+                                      edges)
+        np.testing.assert_allclose(rates, [[0.1, 0.05, 0.0]])
+
+    def test_cumulative_rates(self):
+        """
+        Check the cumulative rates
+        """
+        rates = np.array([[3., 2., 1.]])
+        np.testing.assert_allclose(get_cumulative_rates(rates), [[6., 3., 1.]])
+
+    def test_moment_rates(self):
+        """
+        Check the moment rate of a single bin
+        """
+        edges = np.array([5.9, 6.1])
+        moment = get_moment_rates(np.array([[0.5]]), edges)
+        np.testing.assert_allclose(moment, [0.5 * get_seismic_moment(6.0)])
+
+    def test_model_rates(self):
+        """
+        Check the rates computed for a model with different MFD types
+        """
+        out = get_model_rates(self.columns, bin_width=0.1)
+        self.assertAlmostEqual(out['mag_edges'][0], 4.5)
+        self.assertAlmostEqual(out['mag_edges'][-1], 7.0)
+        np.testing.assert_allclose(out['rates'][1].sum(), 0.15)
+        np.testing.assert_allclose(out['cumulative_rates'][:, 0],
+                                   out['rates'].sum(axis=1))
+        np.testing.assert_allclose(out['total_moment_rate'],
+                                   out['moment_rates'].sum())
+        self.assertTrue(np.all(out['moment_rates'] > 0.0))
+
+    def test_incremental_moment_on_grid_edge(self):
+        """
+        The moment of an incremental bin whose magnitude falls on an edge
+        of the common grid is computed at the magnitude of the bin
+        """
+        columns = {'mfd_type': np.array(['IncrementalMFD'], dtype=object),
+                   'min_mag': np.array([5.0]), 'max_mag': np.array([np.nan]),
+                   'bin_width': np.array([0.1]), 'or_1': np.array([1.0])}
+        out = get_model_rates(columns, bin_width=0.1)
+        np.testing.assert_allclose(out['moment_rates'],
+                                   [get_seismic_moment(5.0)])
+        moment = get_incremental_moment_rates([[1.0, 0.5, np.nan]], [5.0],
+                                              [0.1])
+        np.testing.assert_allclose(moment, [get_seismic_moment(5.0) +
+                                            0.5 * get_seismic_moment(5.1)])
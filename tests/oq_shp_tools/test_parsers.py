@@ -50,8 +50,13 @@
 """
 
 import os
+import shutil
+import tempfile
 import unittest
 
+from osgeo import ogr
+
+from hmtk_utils.oq_shp_tools import parsers
 from hmtk_utils.oq_shp_tools.parsers import parse_area_source_shp
 
 
@@ -108,3 +113,107 @@ class ParsersTestCase(unittest.TestCase):
         # Check nodal plane
         self.assertTrue(src.geometry.upper_seismo_depth == 0.0)
         self.assertTrue(src.geometry.lower_seismo_depth == 20.0)
+
+    def test_config(self):
+        """
+        Attributes assigned with the configuration
+        """
+        config = {'trt': 'Stable Continental Crust',
+                  'mag_scale_rel': lambda feature: 'PeerMSR',
+                  'rupt_aspect_ratio': lambda feature:
+                  feature.GetField('rup_asp_ra') * 2.}
+        src = parse_area_source_shp(self.filename, config=config)[0]
+        self.assertEqual(src.trt, 'Stable Continental Crust')
+        self.assertEqual(src.mag_scale_rel, 'PeerMSR')
+        self.assertEqual(src.rupt_aspect_ratio, 4.0)
+        self.assertEqual(src.mfd.a_val, 3.001)
+
+        table = parse_area_source_shp(self.filename, config=config,
+                                      as_table=True)
+        self.assertEqual(table.trt[0], 'Stable Continental Crust')
+        self.assertEqual(table.mag_scale_rel[0], 'PeerMSR')
+        self.assertEqual(table.rupt_aspect_ratio[0], 4.0)
+
+    def test_column_map_and_defaults(self):
+        """
+        Fields read with a different name and default values
+        """
+        src = parse_area_source_shp(self.filename,
+                                    column_map={'src_name': 'tect_reg'})[0]
+        self.assertEqual(src.name, 'Active Shallow Crust')
+        self.assertRaises(ValueError, parse_area_source_shp, self.filename,
+                          column_map={'src_name': 'missing'})
+        self.assertRaises(ValueError, parse_area_source_shp, self.filename,
+                          config={'unknown': 1.0})
+
+        # Copy of the shapefile without the magnitude scaling relationship
+        tmp_path = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmp_path, 'test.shp')
+            driver = ogr.GetDriverByName('ESRI Shapefile')
+            data_source = driver.CopyDataSource(driver.Open(self.filename),
+                                                filename)
+            layer = data_source.GetLayer()
+            layer.DeleteField(layer.GetLayerDefn().GetFieldIndex(
+                'mag_scal_r'))
+            data_source.Destroy()
+            defaults = {'mag_scale_rel': 'PeerMSR'}
+            src = parse_area_source_shp(filename, defaults=defaults)[0]
+            self.assertEqual(src.mag_scale_rel, 'PeerMSR')
+            self.assertEqual(src.trt, 'Active Shallow Crust')
+            table = parse_area_source_shp(filename, defaults=defaults,
+                                          as_table=True)
+            self.assertEqual(table.mag_scale_rel[0], 'PeerMSR')
+        finally:
+            shutil.rmtree(tmp_path)
+
+    def test_schema(self):
+        """
+        Fields read through a schema
+        """
+        schema = {'families': {'strike_': 'dip_{n}'},
+                  'config': {'trt': 'Stable Continental Crust'}}
+        src = parse_area_source_shp(self.filename, schema=schema)[0]
+        self.assertEqual(src.trt, 'Stable Continental Crust')
+        self.assertEqual(src.nodal_plane_dist[0].strike, 89.99)
+
+    def test_geometry_only(self):
+        """
+        The values assigned when only the geometry is read are the same for
+        the sources and for the table
+        """
+        src = parse_area_source_shp(self.filename, only_geom=True)[0]
+        table = parse_area_source_shp(self.filename, only_geom=True,
+                                      as_table=True)
+        self.assertEqual(src.mag_scale_rel, table.mag_scale_rel[0])
+        self.assertEqual(src.mfd.max_mag, table.max_mag[0])
+        self.assertEqual(src.hypo_depth_dist[0].depth, table.hdd_depth[0])
+
+    def test_unknown_fields_not_read(self):
+        """
+        The fields which are not in the preformatted shapefile are not read
+        when parsing a table
+        """
+        tmp_path = tempfile.mkdtemp()
+        get_field_arrays = parsers.shpt.get_field_arrays
+        names = []
+
+        def get_arrays(layer, field_names=None):
+            names.extend(field_names or [])
+            return get_field_arrays(layer, field_names)
+        try:
+            filename = os.path.join(tmp_path, 'test.shp')
+            driver = ogr.GetDriverByName('ESRI Shapefile')
+            data_source = driver.CopyDataSource(driver.Open(self.filename),
+                                                filename)
+            data_source.GetLayer().CreateField(
+                ogr.FieldDefn('comment', ogr.OFTString))
+            data_source.Destroy()
+            parsers.shpt.get_field_arrays = get_arrays
+            table = parse_area_source_shp(filename, as_table=True)
+        finally:
+            parsers.shpt.get_field_arrays = get_field_arrays
+            shutil.rmtree(tmp_path)
+        self.assertEqual(list(table.id), ['1'])
+        self.assertTrue('src_id' in names)
+        self.assertFalse('comment' in names)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+"""
+
+import unittest
+import numpy as np
+
+from hmtk_utils.oq_shp_tools.partition import get_balanced_blocks, \
+    get_source_weights, partition_sources
+from hmtk_utils.oq_shp_tools.source_table import AreaSourceTable
+
+
+def _get_table(num):
+    """
+    Create a row of `num` square sources with one degree side
+    """
+    lons = np.concatenate([[i, i, i + 1., i + 1., i] for i in range(num)])
+    lats = np.tile([0., 1., 1., 0., 0.], num)
+    return AreaSourceTable(
+        id=[str(i) for i in range(num)],
+        mfd_type=['truncGutenbergRichterMFD'] * num,
+        a_val=np.ones(num) * 3., b_val=np.ones(num),
+        min_mag=np.ones(num) * 5., max_mag=np.ones(num) * 7.,
+        npd_offsets=np.arange(num + 1), npd_probability=np.ones(num),
+        npd_strike=np.zeros(num), npd_dip=np.ones(num) * 90.,
+        npd_rake=np.zeros(num),
+        hdd_offsets=np.arange(num + 1), hdd_probability=np.ones(num),
+        hdd_depth=np.ones(num) * 10.,
+        ring_offsets=np.arange(0, 5 * num + 1, 5), lons=lons, lats=lats)
+
+
+class PartitionTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_weights(self):
+        table = _get_table(2)
+        table.max_mag[1] = 6.0
+        weights = get_source_weights(table, spacing=5.0, bin_width=0.1)
+        self.assertAlmostEqual(weights[0] / weights[1], 2.0)
+        self.assertAlmostEqual(weights[0], 111.195 ** 2 / 25. * 20., -1)
+
+    def test_balanced_blocks(self):
+        weights = np.array([1., 1., 1., 1., 4.])
+        blocks = get_balanced_blocks(weights, np.arange(5), 2)
+        np.testing.assert_equal(blocks, [0, 0, 0, 0, 1])
+        # The blocks follow the order of the sequence
+        blocks = get_balanced_blocks(weights, np.arange(5)[::-1], 2)
+        np.testing.assert_equal(blocks, [1, 1, 1, 1, 0])
+        self.assertRaises(ValueError, get_balanced_blocks, weights,
+                          np.arange(5), 0)
+
+    def test_partition(self):
+        """
+        Equal sources in a row are split into contiguous blocks
+        """
+        table, idxs, weights = partition_sources(_get_table(8), 4)
+        self.assertEqual(len(idxs), 4)
+        for idx in idxs:
+            self.assertEqual(len(idx), 2)
+            self.assertEqual(abs(idx[0] - idx[1]), 1)
+        np.testing.assert_allclose(weights, weights[0])
+        self.assertEqual(sorted(np.concatenate(idxs)), range(8))
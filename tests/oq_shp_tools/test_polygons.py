@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+"""
+
+import unittest
+import numpy as np
+
+from hmtk_utils.oq_shp_tools import polygons as poly
+
+
+class PolygonsTestCase(unittest.TestCase):
+    """
+    """
+
+    def setUp(self):
+        """
+        Create two rings: a closed clockwise square with a duplicated vertex
+        and an open counterclockwise triangle
+        """
+        self.lons = np.array([0., 0., 1., 1., 1., 0., 5., 6., 5.])
+        self.lats = np.array([0., 1., 1., 1., 0., 0., 5., 5., 6.])
+        self.offsets = np.array([0, 6, 9])
+
+    def test_ring_index(self):
+        """
+        Check the index of the ring of each vertex
+        """
+        np.testing.assert_equal(poly.get_ring_index(self.offsets),
+                                [0, 0, 0, 0, 0, 0, 1, 1, 1])
+
+    def test_signed_areas(self):
+        """
+        Check the signed areas
+        """
+        areas = poly.get_signed_areas(self.lons, self.lats, self.offsets)
+        np.testing.assert_allclose(areas, [-1.0, 0.5])
+
+    def test_ring_areas(self):
+        """
+        Check the area in km2 of a square of one degree at the equator
+        """
+        areas = poly.get_ring_areas(self.lons, self.lats, self.offsets)
+        self.assertAlmostEqual(areas[0], poly.DEG_TO_KM**2, places=0)
+
+    def test_closed_and_duplicates(self):
+        """
+        Check the closure of the rings and the duplicated vertices
+        """
+        np.testing.assert_equal(
+            poly.is_closed(self.lons, self.lats, self.offsets), [True, False])
+        dupl = poly.get_duplicate_vertices(self.lons, self.lats, self.offsets)
+        np.testing.assert_equal(np.nonzero(dupl)[0], [2])
+
+    def test_repair(self):
+        """
+        Remove the duplicated vertex, close the rings and reverse the first
+        one
+        """
+        dupl = poly.get_duplicate_vertices(self.lons, self.lats, self.offsets)
+        lons, lats, offsets = poly.remove_vertices(self.lons, self.lats,
+                                                   self.offsets, dupl)
+        lons, lats, offsets = poly.close_rings(lons, lats, offsets)
+        np.testing.assert_equal(offsets, [0, 5, 9])
+        self.assertTrue(np.all(poly.is_closed(lons, lats, offsets)))
+        lons, lats = poly.reverse_rings(lons, lats, offsets,
+                                        np.array([True, False]))
+        areas = poly.get_signed_areas(lons, lats, offsets)
+        np.testing.assert_allclose(areas, [1.0, 0.5])
+        np.testing.assert_equal(lons[5:], [5., 6., 5., 5.])
+
+    def test_wkb(self):
+        """
+        Check the size of the WKB of a polygon
+        """
+        wkb = poly.get_polygon_wkb(self.lons[6:], self.lats[6:])
+        self.assertEqual(len(wkb), 13 + 16 * 3)
+
+    def test_bounding_boxes(self):
+        """
+        Check the bounding boxes of the rings
+        """
+        bboxes = poly.get_bounding_boxes(self.lons, self.lats, self.offsets)
+        np.testing.assert_equal(bboxes, [[0., 0., 1., 1.], [5., 5., 6., 6.]])
+
+    def test_candidate_pairs(self):
+        """
+        Compare the pairs found with the sweep with a brute force search
+        """
+        rng = np.random.RandomState(42)
+        low = rng.uniform(0., 10., (200, 2))
+        bboxes = np.hstack([low, low + rng.uniform(0., 1., (200, 2))])
+        expected = [(i, j) for i in range(200) for j in range(i + 1, 200) if
+                    bboxes[i, 0] <= bboxes[j, 2] and
+                    bboxes[j, 0] <= bboxes[i, 2] and
+                    bboxes[i, 1] <= bboxes[j, 3] and
+                    bboxes[j, 1] <= bboxes[i, 3]]
+        pairs = poly.get_bbox_candidate_pairs(bboxes)
+        self.assertEqual([tuple(pair) for pair in pairs], expected)
+        self.assertEqual(poly.get_bbox_candidate_pairs([]).shape, (0, 2))
+
+    def test_points_in_rings(self):
+        """
+        Check points against the square and the triangle, also processing
+        the pairs point-edge in small chunks
+        """
+        xpnt = np.array([0.5, 1.5, 0.5, 5.2, 5.8, 5.2])
+        ypnt = np.array([0.5, 0.5, 0.5, 5.2, 5.8, 5.2])
+        ring_idx = np.array([0, 0, 1, 1, 1, 0])
+        expected = [True, False, False, True, False, False]
+        for max_pairs in (1 << 22, 4):
+            inside = poly.get_points_in_rings(xpnt, ypnt, ring_idx,
+                                              self.lons, self.lats,
+                                              self.offsets, max_pairs)
+            np.testing.assert_equal(inside, expected)
+
+
+class SimplifyTestCase(unittest.TestCase):
+    """
+    """
+
+    def setUp(self):
+        """
+        Create two polygons sharing a wiggly boundary along the meridian 1
+        """
+        lats = np.linspace(0., 1., 11)
+        wig = 1. + 0.001 * np.sin(lats * np.pi * 5)
+        llons = np.concatenate([[0., 0.], wig[::-1], [0.]])
+        llats = np.concatenate([[0., 1.], lats[::-1], [0.]])
+        rlons = np.concatenate([wig, [2., 2., wig[0]]])
+        rlats = np.concatenate([lats, [1., 0., 0.]])
+        self.lons, self.lats, self.offsets = poly.join_rings(
+            [(llons, llats), (rlons, rlats)])
+
+    def test_shared_vertices(self):
+        """
+        The junctions are the end points of the shared boundary
+        """
+        shared = poly.get_shared_vertices(self.lons, self.lats, self.offsets)
+        np.testing.assert_equal(np.nonzero(shared)[0], [2, 12, 24, 27])
+
+    def test_tolerance(self):
+        """
+        With a large tolerance the wiggles are removed
+        """
+        lons, lats, offsets, change = poly.simplify_rings(
+            self.lons, self.lats, self.offsets, tolerance=1.0)
+        np.testing.assert_equal(offsets, [0, 5, 10])
+        np.testing.assert_allclose(lons, [0, 0, 1, 1, 0, 1, 1, 2, 2, 1])
+        self.assertTrue(np.all(np.abs(change) < 1e-3))
+
+    def test_max_vertices(self):
+        """
+        The shared boundary is simplified in the same way in both polygons
+        """
+        lons, lats, offsets, _ = poly.simplify_rings(
+            self.lons, self.lats, self.offsets, max_vertices=6)
+        rings = poly.split_rings(lons, lats, offsets)
+        left = set(zip(*rings[0])) - set([(0., 0.), (0., 1.)])
+        right = set(zip(*rings[1])) - set([(2., 0.), (2., 1.)])
+        self.assertEqual(left, right)
+        self.assertEqual(len(left), 3)
+
+    def test_simplify_and_log(self):
+        """
+        The report does not change the result of the simplification
+        """
+        expected = poly.simplify_rings(self.lons, self.lats, self.offsets,
+                                       tolerance=1.0)
+        out = poly.simplify_rings_and_log(self.lons, self.lats,
+                                          self.offsets, tolerance=1.0)
+        for arr, exp in zip(out, expected):
+            np.testing.assert_equal(arr, exp)
+
+    def test_significance(self):
+        """
+        Locked vertices have infinite significance
+        """
+        locked = np.zeros(len(self.lons), dtype=bool)
+        locked[[0, 13, 14, 27]] = True
+        sig = poly.get_vertex_significance(self.lons, self.lats,
+                                           self.offsets, locked)
+        self.assertTrue(np.all(np.isinf(sig[locked])))
+        self.assertTrue(np.all(np.isfinite(sig[~locked])))
+
+
+class SpatialOrderTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_centroids(self):
+        lons = np.array([0., 0., 2., 2., 0., 5., 5., 5.])
+        lats = np.array([0., 1., 1., 0., 0., 5., 6., 7.])
+        xcen, ycen = poly.get_centroids(lons, lats, np.array([0, 5, 8]))
+        np.testing.assert_allclose(xcen, [1., 5.])
+        np.testing.assert_allclose(ycen, [0.5, 6.])
+
+    def test_hilbert_index(self):
+        """
+        The cells of a curve of order 1 are visited counterclockwise
+        starting from the lower left one
+        """
+        idx = poly.get_hilbert_index([0., 0., 1., 1.], [0., 1., 1., 0.],
+                                     order=1)
+        np.testing.assert_equal(idx, [0, 1, 2, 3])
+        # Consecutive cells of the curve are neighbours
+        xcoo, ycoo = np.meshgrid(np.arange(8.), np.arange(8.))
+        idx = poly.get_hilbert_index(xcoo.ravel(), ycoo.ravel(), order=3)
+        self.assertEqual(sorted(idx), range(64))
+        order = np.argsort(idx)
+        steps = (np.abs(np.diff(xcoo.ravel()[order])) +
+                 np.abs(np.diff(ycoo.ravel()[order])))
+        self.assertTrue(np.all(steps == 1))
+
+    def test_block_bounding_boxes(self):
+        bboxes = np.array([[0., 0., 1., 1.], [2., -1., 3., 0.],
+                           [5., 5., 6., 6.]])
+        out = poly.get_block_bounding_boxes(bboxes, 2)
+        np.testing.assert_equal(out, [[0., -1., 3., 1.], [5., 5., 6., 6.]])
+        bboxes[1] = np.nan
+        out = poly.get_block_bounding_boxes(bboxes, 2)
+        np.testing.assert_equal(out, [[0., 0., 1., 1.], [5., 5., 6., 6.]])
+        order = poly.get_hilbert_order(
+            np.array([5., 5., 6., 6., 0., 0., 1., 1.]),
+            np.array([0., 1., 1., 0., 0., 1., 1., 0.]),
+            np.array([0, 4, 8]))
+        np.testing.assert_equal(order, [1, 0])
+
+    def test_polygon_from_wkt(self):
+        lons, lats = poly.get_polygon_from_wkt(
+            'POLYGON((0.0 0.0, 0.0 1.5,1.0 1.0, 0.0 0.0))')
+        np.testing.assert_equal(lons, [0., 0., 1., 0.])
+        np.testing.assert_equal(lats, [0., 1.5, 1., 0.])
+
+    def test_wkb_round_trip(self):
+        lons, lats = np.array([0., 0., 1., 0.]), np.array([0., 1., 1., 0.])
+        rlons, rlats = poly.get_polygon_from_wkb(
+            poly.get_polygon_wkb(lons, lats))
+        np.testing.assert_equal(rlons, lons)
+        np.testing.assert_equal(rlats, lats)
+        self.assertRaises(ValueError, poly.get_polygon_from_wkb,
+                          b'\x01\x01\x00\x00\x00' + b'\x00' * 16)
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+"""
+
+import threading
+import unittest
+import numpy as np
+
+from hmtk_utils.oq_shp_tools import projections as proj
+
+
+class ProjectionsTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_cached_transformation(self):
+        """
+        The same transformation is created only once
+        """
+        trans1 = proj.get_transformation(32633, None)
+        trans2 = proj.get_transformation('EPSG:32633', 'EPSG:4326')
+        self.assertTrue(trans1 is proj.get_transformation(32633, None))
+        self.assertTrue(trans2 is proj.get_transformation('EPSG:32633',
+                                                          'EPSG:4326'))
+
+    def test_transformation_per_thread(self):
+        """
+        Each thread gets its own transformation
+        """
+        out = []
+        thread = threading.Thread(target=lambda: out.append(
+            proj.get_transformation(32633, None)))
+        thread.start()
+        thread.join()
+        self.assertFalse(out[0] is proj.get_transformation(32633, None))
+
+    def test_wgs84(self):
+        """
+        Check the identification of WGS84
+        """
+        self.assertTrue(proj.is_wgs84(proj.get_spatial_reference()))
+        self.assertFalse(proj.is_wgs84(proj.get_spatial_reference(32633)))
+
+    def test_round_trip(self):
+        """
+        Transform geographic coordinates into UTM and back
+        """
+        lons = np.array([14.0, 15.0, 15.5])
+        lats = np.array([41.0, 42.0, 40.5])
+        xco, yco = proj.transform_coordinates(
+            lons, lats, proj.get_transformation(None, 32633))
+        # The central meridian of UTM zone 33 is 15 degrees
+        self.assertAlmostEqual(xco[1], 500000., places=3)
+        rlons, rlats = proj.transform_coordinates(
+            xco, yco, proj.get_transformation(32633, None))
+        np.testing.assert_allclose(rlons, lons)
+        np.testing.assert_allclose(rlats, lats)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+"""
+
+import unittest
+import numpy as np
+
+from hmtk_utils.oq_shp_tools.recurrence import bootstrap_recurrence, \
+    fit_recurrence, get_completeness_years
+
+COMPLETENESS = np.array([[1960., 4.0], [1900., 5.5]])
+
+
+def _get_catalogue(seed=42, min_mag=3.95, decimals=1):
+    """
+    Create a synthetic catalogue for two zones with b-values 1.0 and 0.8
+    and annual rates 20 and 5 of events above magnitude `min_mag`. The
+    magnitudes are rounded to `decimals` (continuous when None) and the
+    events below the completeness are removed.
+    """
+    rnd = np.random.RandomState(seed)
+    mags, years, zones = [], [], []
+    for zone, (b_val, rate) in enumerate([(1.0, 20.), (0.8, 5.)]):
+        num = rnd.poisson(rate * 111)
+        mag = min_mag + rnd.exponential(1. / (b_val * np.log(10.)), num)
+        if decimals is not None:
+            mag = np.round(mag, decimals)
+        mags.append(mag)
+        years.append(rnd.randint(1900, 2011, num))
+        zones.append(np.ones(num, dtype=int) * zone)
+    mags, years = np.concatenate(mags), np.concatenate(years)
+    zones = np.concatenate(zones)
+    ok = years >= get_completeness_years(mags, COMPLETENESS)
+    return mags[ok], years[ok], zones[ok]
+
+
+class RecurrenceTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_completeness_years(self):
+        years = get_completeness_years([3.9, 4.0, 5.0, 5.5, 7.0],
+                                       COMPLETENESS)
+        np.testing.assert_equal(years, [np.inf, 1960, 1960, 1900, 1900])
+
+    def test_fit(self):
+        mags, years, zones = _get_catalogue()
+        for method in ('mle', 'weichert'):
+            out = fit_recurrence(mags, years, zones, 3, COMPLETENESS,
+                                 end_year=2010, method=method)
+            np.testing.assert_allclose(out['b_value'][:2], [1.0, 0.8],
+                                       atol=0.1)
+            rates = 10 ** (out['a_value'][:2] - out['b_value'][:2] * 3.95)
+            np.testing.assert_allclose(rates, [20., 5.], rtol=0.15)
+            # Zone without events
+            self.assertTrue(np.isnan(out['a_value'][2]))
+            self.assertEqual(out['num_events'][2], 0)
+        self.assertEqual(out['max_obs'][0], mags[zones == 0].max())
+        self.assertRaises(ValueError, fit_recurrence, mags, years, zones, 2,
+                          COMPLETENESS, method='lsq')
+
+    def test_fit_continuous(self):
+        """
+        With continuous magnitudes the bins start at the completeness
+        magnitude
+        """
+        mags, years, zones = _get_catalogue(min_mag=4.0, decimals=None)
+        for method in ('mle', 'weichert'):
+            out = fit_recurrence(mags, years, zones, 2, COMPLETENESS,
+                                 end_year=2010, method=method)
+            self.assertEqual(out['num_events'].sum(), len(mags))
+            np.testing.assert_allclose(out['b_value'], [1.0, 0.8],
+                                       atol=0.05)
+            rates = 10 ** (out['a_value'] - out['b_value'] * 4.0)
+            np.testing.assert_allclose(rates, [20., 5.], rtol=0.1)
+
+    def test_bootstrap(self):
+        mags, years, zones = _get_catalogue()
+        out = bootstrap_recurrence(mags, years, zones, 2, COMPLETENESS,
+                                   num_samples=20, processes=1, seed=1)
+        self.assertTrue(np.all(out['b_std'] > 0))
+        self.assertTrue(np.all(out['b_std'] < 0.1))
+        self.assertTrue(np.all(out['ab_corr'] > 0.5))
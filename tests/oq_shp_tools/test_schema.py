@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from hmtk_utils.oq_shp_tools import schema as sch
+
+FIELDS = ['ZONE_ID', 'NAME', 'bval', 'NP1_STK', 'NP1_DIP', 'NP2_STK',
+          'NP2_DIP', 'W0', 'W1']
+
+SCHEMA = {'fields': {'src_id': 'ZONE_ID', 'b_value': 'bval',
+                     'dip_2': 'NP1_DIP', 'dip_1': 'NP2_DIP'},
+          'families': {'strike_': 'NP{n}_STK', 'dip_': 'NP{n}_DIP',
+                       'weight_': {'pattern': 'W{n}', 'start': 0}},
+          'config': {'trt': 'Active Shallow Crust'},
+          'defaults': {'rupt_aspect_ratio': 1.0}}
+
+
+class SchemaTestCase(unittest.TestCase):
+    """
+    """
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path)
+
+    def test_compile(self):
+        """
+        Single fields have priority over the families
+        """
+        compiled = sch.compile_schema(SCHEMA, FIELDS)
+        self.assertEqual(compiled['column_map'],
+                         {'src_id': 'ZONE_ID', 'b_value': 'bval',
+                          'strike_1': 'NP1_STK', 'strike_2': 'NP2_STK',
+                          'dip_1': 'NP2_DIP', 'dip_2': 'NP1_DIP',
+                          'weight_1': 'W0', 'weight_2': 'W1'})
+        self.assertEqual(compiled['config'], SCHEMA['config'])
+        self.assertEqual(compiled['defaults'], SCHEMA['defaults'])
+
+    def test_json(self):
+        filename = os.path.join(self.tmp_path, 'schema.json')
+        with open(filename, 'w') as fout:
+            json.dump(SCHEMA, fout)
+        self.assertEqual(sch.compile_schema(filename, FIELDS),
+                         sch.compile_schema(SCHEMA, FIELDS))
+
+    @unittest.skipIf(sch.yaml is None, 'PyYAML is not installed')
+    def test_yaml(self):
+        filename = os.path.join(self.tmp_path, 'schema.yml')
+        with open(filename, 'w') as fout:
+            fout.write('fields:\n  src_id: ZONE_ID\n'
+                       'families:\n  strike_: NP{n}_STK\n')
+        compiled = sch.compile_schema(filename, FIELDS)
+        self.assertEqual(compiled['column_map']['strike_2'], 'NP2_STK')
+
+    def test_errors(self):
+        self.assertRaises(ValueError, sch.load_schema, {'field': {}})
+        self.assertRaises(ValueError, sch.load_schema,
+                          {'fields': {'bval': 'b_value'}})
+        self.assertRaises(ValueError, sch.load_schema,
+                          {'families': {'strk_': 'S{n}'}})
+        self.assertRaises(ValueError, sch.compile_schema,
+                          {'families': {'strike_': 'S'}}, FIELDS)
+        self.assertRaises(ValueError, sch.compile_schema,
+                          {'fields': {'src_id': 'ID'}}, FIELDS)
+        self.assertRaises(IOError, sch.load_schema,
+                          os.path.join(self.tmp_path, 'missing.json'))
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from hmtk_utils.oq_shp_tools.source_table import AreaSourceTable, COLUMNS
+from hmtk_utils.oq_shp_tools.snapshot import save_snapshot, load_snapshot, \
+    ALIGNMENT
+
+
+class SnapshotTestCase(unittest.TestCase):
+    """
+    """
+
+    def setUp(self):
+        """
+        Create a table with two sources and a temporary folder
+        """
+        self.table = AreaSourceTable(
+            id=['1', '2'], name=[u'Z\xfcrich', None],
+            trt=['Active Shallow Crust', 'Stable Continental Crust'],
+            mag_scale_rel=['WC1994', 'WC1994'],
+            mfd_type=['truncGutenbergRichterMFD', 'IncrementalMFD'],
+            rupt_aspect_ratio=[1.0, 2.0],
+            upper_seismo_depth=[0.0, 5.0], lower_seismo_depth=[20., 25.],
+            a_val=[3.0, np.nan], b_val=[1.0, np.nan], min_mag=[5.0, 5.05],
+            max_mag=[7.0, np.nan], bin_width=[np.nan, 0.1],
+            rate_offsets=[0, 0, 2], occur_rates=[0.1, 0.01],
+            npd_offsets=[0, 1, 2], npd_probability=[1.0, 1.0],
+            npd_strike=[0.0, 10.0], npd_dip=[90.0, 45.0],
+            npd_rake=[0.0, 90.0], hdd_offsets=[0, 1, 2],
+            hdd_probability=[1.0, 1.0], hdd_depth=[10.0, 15.0],
+            ring_offsets=[0, 4, 8],
+            lons=[0., 0., 1., 0., 1., 1., 2., 1.],
+            lats=[0., 1., 1., 0., 0., 1., 0., 0.])
+        self.tmp_path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp_path, 'model.snp')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path)
+
+    def test_round_trip(self):
+        """
+        Save and load a table
+        """
+        save_snapshot(self.table, self.filename)
+        table = load_snapshot(self.filename)
+        self.assertTrue(isinstance(table.lons, np.memmap))
+        self.assertEqual(table.name[0].decode('utf-8'), u'Z\xfcrich')
+        self.assertEqual(table.name[1], '')
+        for name in COLUMNS:
+            if name == 'name':
+                continue
+            np.testing.assert_equal(list(getattr(table, name)),
+                                    list(getattr(self.table, name)), name)
+
+    def test_load_columns(self):
+        """
+        Load only the geometry
+        """
+        save_snapshot(self.table, self.filename)
+        table = load_snapshot(self.filename, columns=['lons', 'lats'],
+                              mmap=False)
+        self.assertEqual(len(table), 2)
+        np.testing.assert_equal(table.ring_offsets, [0, 4, 8])
+        np.testing.assert_equal(table.get_polygon(1)[0], [1., 1., 2., 1.])
+        self.assertTrue(np.all(np.isnan(table.a_val)))
+
+    def test_alignment(self):
+        """
+        The size of the file is a multiple of the alignment
+        """
+        save_snapshot(self.table, self.filename)
+        self.assertEqual(os.path.getsize(self.filename) % ALIGNMENT, 0)
+
+    def test_not_a_snapshot(self):
+        """
+        An error is raised when the file is not a snapshot
+        """
+        with open(self.filename, 'wb') as fout:
+            fout.write('This is not a snapshot file')
+        self.assertRaises(ValueError, load_snapshot, self.filename)
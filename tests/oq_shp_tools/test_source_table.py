@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+"""
+
+import os
+import unittest
+import numpy as np
+
+from hmtk_utils.oq_shp_tools.parsers import parse_area_source_shp
+from hmtk_utils.oq_shp_tools.source_table import AreaSourceTable
+
+from openquake.nrmllib.models import TGRMFD, IncrementalMFD
+
+
+class AreaSourceTableTestCase(unittest.TestCase):
+    """
+    """
+    BASE_DATA_PATH = os.path.join(os.path.dirname(__file__), 'dat')
+
+    def setUp(self):
+        """
+        Create the columns of an attribute table with two sources
+        """
+        nan = np.nan
+        self.columns = {
+            'src_id': np.array(['1', '2'], dtype=object),
+            'src_name': np.array(['first', 'second'], dtype=object),
+            'tect_reg': np.array(['Active Shallow Crust'] * 2, dtype=object),
+            'mag_scal_r': np.array(['WC1994'] * 2, dtype=object),
+            'rup_asp_ra': np.array([1.0, 2.0]),
+            'upp_seismo': np.array([0.0, 5.0]),
+            'low_seismo': np.array([20.0, 25.0]),
+            'mfd_type': np.array(['truncGutenbergRichterMFD',
+                                  'IncrementalMFD'], dtype=object),
+            'a_value': np.array([3.0, nan]),
+            'b_value': np.array([1.0, nan]),
+            'min_mag': np.array([5.0, 5.05]),
+            'max_mag': np.array([7.0, nan]),
+            'bin_width': np.array([nan, 0.1]),
+            'or_1': np.array([nan, 0.1]),
+            'or_2': np.array([nan, 0.01]),
+            'num_npd': np.array([2, 1]),
+            'weight_1': np.array([0.5, 1.0]),
+            'strike_1': np.array([0.0, 10.0]),
+            'dip_1': np.array([90.0, 45.0]),
+            'rake_1': np.array([0.0, 90.0]),
+            'weight_2': np.array([0.5, nan]),
+            'strike_2': np.array([90.0, nan]),
+            'dip_2': np.array([90.0, nan]),
+            'rake_2': np.array([180.0, nan]),
+            'num_hdd': np.array([1, 1]),
+            'hdd_d_1': np.array([10.0, 15.0]),
+            'hdd_w_1': np.array([1.0, 1.0])}
+        self.lons = np.array([0., 0., 1., 0., 1., 1., 2., 1.])
+        self.lats = np.array([0., 1., 1., 0., 0., 1., 0., 0.])
+        self.offsets = np.array([0, 4, 8])
+        self.table = AreaSourceTable.from_attribute_columns(
+            self.columns, self.lons, self.lats, self.offsets)
+
+    def test_ragged_columns(self):
+        """
+        Check the ragged arrays
+        """
+        np.testing.assert_equal(self.table.npd_offsets, [0, 2, 3])
+        np.testing.assert_equal(self.table.npd_strike, [0.0, 90.0, 10.0])
+        np.testing.assert_equal(self.table.rate_offsets, [0, 0, 2])
+        np.testing.assert_equal(self.table.occur_rates, [0.1, 0.01])
+
+    def test_missing_counts(self):
+        """
+        Without the count columns the values of a group stay aligned even
+        when some of its columns are missing or shorter
+        """
+        columns = dict(self.columns)
+        del columns['num_npd']
+        del columns['weight_2']
+        del columns['rake_1']
+        del columns['rake_2']
+        table = AreaSourceTable.from_attribute_columns(
+            columns, self.lons, self.lats, self.offsets)
+        np.testing.assert_equal(table.npd_offsets, [0, 2, 3])
+        np.testing.assert_equal(table.npd_strike, [0.0, 90.0, 10.0])
+        np.testing.assert_equal(table.npd_probability, [0.5, np.nan, 1.0])
+        np.testing.assert_equal(table.npd_rake, [np.nan] * 3)
+
+    def test_views(self):
+        """
+        Check the sources created on demand
+        """
+        self.assertEqual(len(self.table), 2)
+        src = self.table[0]
+        self.assertEqual(src.id, '1')
+        self.assertTrue(isinstance(src.mfd, TGRMFD))
+        self.assertEqual(src.mfd.b_val, 1.0)
+        self.assertEqual(len(src.nodal_plane_dist), 2)
+        self.assertEqual(src.nodal_plane_dist[1].rake, 180.0)
+        self.assertEqual(src.geometry.lower_seismo_depth, 20.0)
+        src = self.table[-1]
+        self.assertTrue(isinstance(src.mfd, IncrementalMFD))
+        self.assertEqual(list(src.mfd.occur_rates), [0.1, 0.01])
+        self.assertEqual([s.id for s in self.table], ['1', '2'])
+
+    def test_round_trip(self):
+        """
+        Tables created from sources and from columns are equal
+        """
+        table = AreaSourceTable.from_sources(list(self.table))
+        for name, values in self.table.get_columns().items():
+            np.testing.assert_equal(list(getattr(table, name)), list(values),
+                                    name)
+        columns = self.table.to_attribute_columns()
+        np.testing.assert_equal(columns['num_npd'], [2, 1])
+        np.testing.assert_equal(columns['strike_2'], [90.0, np.nan])
+
+    def test_select(self):
+        """
+        Select the second source
+        """
+        table = self.table.select([1])
+        self.assertEqual(len(table), 1)
+        self.assertEqual(table.id[0], '2')
+        np.testing.assert_equal(table.lons, self.lons[4:])
+        np.testing.assert_equal(table.ring_offsets, [0, 4])
+        np.testing.assert_equal(table.npd_dip, [45.0])
+
+    def test_parse_as_table(self):
+        """
+        Parse the template shapefile into a table
+        """
+        filename = os.path.join(self.BASE_DATA_PATH,
+                                'oq_area_source_template.shp')
+        table = parse_area_source_shp(filename, as_table=True)
+        self.assertEqual(len(table), 1)
+        self.assertEqual(table.id[0], '1')
+        self.assertAlmostEqual(table.a_val[0], 3.001)
+        self.assertEqual(list(table.hdd_depth), [10.0])
+        self.assertEqual(table[0].nodal_plane_dist[0].strike, 359.9)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+"""
+
+import unittest
+
+from hmtk_utils.oq_shp_tools import polygons as poly
+from hmtk_utils.oq_shp_tools.topology import check_topology
+
+
+def _get_square(lon, lat, size=1.0):
+    """
+    WKB of a clockwise square with the lower left corner in (lon, lat)
+    """
+    return poly.get_polygon_wkb([lon, lon, lon + size, lon + size, lon],
+                                [lat, lat + size, lat + size, lat, lat])
+
+
+class TopologyTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_overlap_and_gap(self):
+        """
+        Two overlapping squares plus a third one leaving a gap
+        """
+        wkbs = [_get_square(0., 0.), _get_square(0.5, 0.),
+                _get_square(2., 0.)]
+        report = check_topology(wkbs, ['a', 'b', 'c'])
+        self.assertEqual(report['num_overlaps'], 1)
+        self.assertEqual(report['overlaps'][0]['src_id_1'], 'a')
+        self.assertEqual(report['overlaps'][0]['src_id_2'], 'b')
+        self.assertAlmostEqual(report['overlaps'][0]['area'] / 6182.,
+                               1., places=2)
+        self.assertEqual(report['num_gaps'], 1)
+        self.assertEqual(sorted(report['gaps'][0]['src_ids']), ['b', 'c'])
+        self.assertFalse(report['gaps'][0]['interior'])
+
+    def test_interior_gap(self):
+        """
+        Eight squares around a hole
+        """
+        wkbs = []
+        ids = []
+        for i in range(3):
+            for j in range(3):
+                if i != 1 or j != 1:
+                    wkbs.append(_get_square(float(i), float(j)))
+                    ids.append('%d%d' % (i, j))
+        report = check_topology(wkbs, ids)
+        self.assertEqual(report['num_overlaps'], 0)
+        self.assertEqual(report['num_gaps'], 1)
+        self.assertTrue(report['gaps'][0]['interior'])
+        self.assertEqual(sorted(report['gaps'][0]['src_ids']), sorted(ids))
+        self.assertEqual(report['gaps'][0]['centroid'], [1.5, 1.5])
+
+    def test_min_area(self):
+        """
+        Small overlaps are not reported
+        """
+        wkbs = [_get_square(0., 0.), _get_square(0.99, 0.)]
+        report = check_topology(wkbs, ['a', 'b'], min_area=100., gaps=False)
+        self.assertEqual(report['num_overlaps'], 0)
+        self.assertNotIn('gaps', report)
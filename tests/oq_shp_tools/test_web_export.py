@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+#
+# LICENSE
+#
+# Copyright (c) 2010-2013, GEM Foundation, G. Weatherill, M. Pagani,
+# D. Monelli.
+#
+# The Hazard Modeller's Toolkit is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>
+#
+# DISCLAIMER
+# 
+# The software Hazard Modeller's Toolkit (hmtk) provided herein
+# is released as a prototype implementation on behalf of
+# scientists and engineers working within the GEM Foundation (Global
+# Earthquake Model).
+#
+# It is distributed for the purpose of open collaboration and in the
+# hope that it will be useful to the scientific, engineering, disaster
+# risk and software design communities.
+#
+# The software is NOT distributed as part of GEM’s OpenQuake suite
+# (http://www.globalquakemodel.org/openquake) and must be considered as a
+# separate entity. The software provided herein is designed and implemented
+# by scientific staff. It is not developed to the design standards, nor
+# subject to same level of critical review by professional software
+# developers, as GEM’s OpenQuake software suite.
+#
+# Feedback and contribution to the software is welcome, and can be
+# directed to the hazard scientific staff of the GEM Model Facility
+# (hazard@globalquakemodel.org).
+#
+# The Hazard Modeller's Toolkit (hmtk) is therefore distributed WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+# for more details.
+#
+# The GEM Foundation, and the authors of the software, assume no
+# liability for use of the software.
+#
+
+
+"""
+"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from hmtk_utils.oq_shp_tools.web_export import _get_tile_files, \
+    _write_mbtiles, export_vector_tiles, get_pixel_size
+
+
+class PixelSizeTestCase(unittest.TestCase):
+
+    def test_zoom_levels(self):
+        self.assertAlmostEqual(get_pixel_size(0), 156.543, places=3)
+        self.assertAlmostEqual(get_pixel_size(1), get_pixel_size(0) / 2)
+
+
+class MBTilesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp()
+        self.tiles_path = os.path.join(self.tmp_path, 'tiles')
+        for zoom, col, row in [(0, 0, 0), (1, 1, 0), (1, 0, 1)]:
+            path = os.path.join(self.tiles_path, str(zoom), str(col))
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            with open(os.path.join(path, '%d.pbf' % row), 'wb') as fout:
+                fout.write(b'%d%d%d' % (zoom, col, row))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path)
+
+    def test_tile_files(self):
+        tiles = sorted(t[:3] for t in _get_tile_files(self.tiles_path))
+        self.assertEqual(tiles, [(0, 0, 0), (1, 0, 1), (1, 1, 0)])
+
+    def test_write(self):
+        filename = os.path.join(self.tmp_path, 'model.mbtiles')
+        _write_mbtiles(self.tiles_path, filename,
+                       {'name': 'area_sources', 'format': 'pbf'})
+        conn = sqlite3.connect(filename)
+        try:
+            rows = sorted(conn.execute('SELECT * FROM tiles').fetchall())
+            meta = dict(conn.execute('SELECT * FROM metadata').fetchall())
+        finally:
+            conn.close()
+        # The rows are flipped (TMS)
+        self.assertEqual([r[:3] for r in rows],
+                         [(0, 0, 0), (1, 0, 0), (1, 1, 1)])
+        self.assertEqual(bytes(rows[1][3]), b'101')
+        self.assertEqual(meta['format'], 'pbf')
+
+    def test_existing_output(self):
+        """
+        An existing output is not replaced unless requested
+        """
+        self.assertRaises(IOError, export_vector_tiles, None,
+                          self.tiles_path)
+        self.assertTrue(os.path.isdir(self.tiles_path))
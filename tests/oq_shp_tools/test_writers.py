@@ -48,12 +48,25 @@
 """
 """
 
+import gzip
 import os
+import shutil
+import tempfile
 import unittest
+import zipfile
+import numpy as np
+
+from osgeo import gdal
 
 from hmtk_utils.oq_shp_tools.parsers import parse_area_source_shp
+from hmtk_utils.oq_shp_tools.shapefile_tools import (get_blocks_in_bbox,
+                                                     write_block_index)
+from hmtk_utils.oq_shp_tools.source_table import AreaSourceTable
+from hmtk_utils.oq_shp_tools import writers
 from hmtk_utils.oq_shp_tools.writers import write_shps
 
+from openquake.nrmllib.models import AreaSource, TGRMFD, IncrementalMFD
+
 
 class WritersTestCase(unittest.TestCase):
     """
@@ -109,3 +122,247 @@ class WritersTestCase(unittest.TestCase):
         # Check nodal plane
         self.assertTrue(src.geometry.upper_seismo_depth == 0.0)
         self.assertTrue(src.geometry.lower_seismo_depth == 20.0)
+
+
+class IncrementalRoundTripTestCase(unittest.TestCase):
+    """
+    """
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp()
+        self.table = AreaSourceTable(
+            id=['1', '2'], name=['Zone 1', 'Zone 2'],
+            trt=['Active Shallow Crust'] * 2, mag_scale_rel=['WC1994'] * 2,
+            mfd_type=['IncrementalMFD'] * 2, rupt_aspect_ratio=[1.0, 2.0],
+            upper_seismo_depth=[0.0, 5.0], lower_seismo_depth=[20., 25.],
+            min_mag=[5.05, 5.15], bin_width=[0.1, 0.1],
+            rate_offsets=[0, 3, 5], occur_rates=[0.1, 0.01, 0.001, 0.2, 0.02],
+            npd_offsets=[0, 1, 2], npd_probability=[1.0, 1.0],
+            npd_strike=[0., 90.], npd_dip=[90., 45.], npd_rake=[0., 90.],
+            hdd_offsets=[0, 1, 2], hdd_probability=[1.0, 1.0],
+            hdd_depth=[10., 5.],
+            ring_offsets=[0, 5, 9],
+            lons=[0., 0., 1., 1., 0., 10., 12., 10., 10.],
+            lats=[0., 1., 1., 0., 0., 0., 0., 2., 0.])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path)
+
+    def test_round_trip(self):
+        """
+        Incremental MFDs written in the shapefile are parsed back
+        """
+        write_shps(self.table, os.path.join(self.tmp_path, ''),
+                   rootname='test')
+        filename = os.path.join(self.tmp_path, 'test_incr.shp')
+        sources = parse_area_source_shp(filename)
+        self.assertEqual(len(sources), 2)
+        for i, src in enumerate(sources):
+            expected = self.table.get_mfd(i)
+            self.assertEqual(src.mfd.min_mag, expected.min_mag)
+            self.assertEqual(src.mfd.bin_width, expected.bin_width)
+            np.testing.assert_allclose(src.mfd.occur_rates,
+                                       expected.occur_rates)
+        table = parse_area_source_shp(filename, as_table=True)
+        np.testing.assert_equal(table.rate_offsets, [0, 3, 5])
+        np.testing.assert_allclose(table.occur_rates,
+                                   self.table.occur_rates)
+
+    def test_spatial_sort(self):
+        """
+        The features are written along the Hilbert curve and the blocks
+        are indexed
+        """
+        write_shps(self.table.select([1, 0]),
+                   os.path.join(self.tmp_path, ''), rootname='test',
+                   spatial_sort=True, block_size=1)
+        filename = os.path.join(self.tmp_path, 'test_incr.shp')
+        sources = parse_area_source_shp(filename)
+        self.assertEqual([src.id for src in sources], ['1', '2'])
+        self.assertTrue(os.path.isfile(os.path.join(self.tmp_path,
+                                                    'test_incr.blocks.json')))
+        blocks = get_blocks_in_bbox(filename, (-1., -1., 0.5, 0.5))
+        self.assertEqual([(b['first'], b['num']) for b in blocks], [(0, 1)])
+
+    def test_block_index_in_memory(self):
+        """
+        An index written in memory is read back
+        """
+        filename = '/vsimem/test_incr.shp'
+        index = write_block_index(filename, [[0., 0., 1., 1.],
+                                             [10., 0., 12., 2.]],
+                                  block_size=1)
+        try:
+            blocks = get_blocks_in_bbox(filename, (9., -1., 13., 3.))
+        finally:
+            gdal.Unlink(index)
+        self.assertEqual([(b['first'], b['num']) for b in blocks], [(1, 1)])
+
+
+class ArchiveTestCase(unittest.TestCase):
+    """
+    """
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp()
+        filename = os.path.join(os.path.dirname(__file__), 'xml',
+                                'sample00.xml')
+        self.filename = os.path.join(self.tmp_path, 'sample00.xml.gz')
+        with open(filename, 'rb') as fin:
+            fout = gzip.open(self.filename, 'wb')
+            fout.write(fin.read())
+            fout.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path)
+
+    def test_zip_round_trip(self):
+        """
+        Write a gzip nrml file into a zip archive and parse the archive
+        """
+        archive = os.path.join(self.tmp_path, 'model.zip')
+        write_shps(self.filename, archive, rootname='as')
+        with zipfile.ZipFile(archive) as zfile:
+            names = zfile.namelist()
+        self.assertIn('as_trgr.shp', names)
+        self.assertIn('as_incr.dbf', names)
+        sources = parse_area_source_shp('/vsizip/%s/as_trgr.shp' % archive)
+        self.assertEqual(len(sources), 1)
+        self.assertEqual(sources[0].mfd.a_val, 4.5)
+        self.assertRaises(IOError, parse_area_source_shp,
+                          '/vsizip/%s/missing.shp' % archive)
+
+
+class _FakeDataSource(object):
+    """
+    A data source recording the IDs of the sources written
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.ids = []
+        self.closed = False
+
+    def GetName(self):
+        return self.name
+
+    def GetLayer(self):
+        return self.ids
+
+    def Destroy(self):
+        self.closed = True
+
+
+class SinkTestCase(unittest.TestCase):
+    """
+    Check the routing of the sources to the sinks with sinks that do not
+    create files
+    """
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp()
+        self.table = AreaSourceTable(
+            id=['1', '2', '3'], name=['Zone 1', 'Zone 2', 'Zone 3'],
+            trt=['Active Shallow Crust'] * 3, mag_scale_rel=['WC1994'] * 3,
+            mfd_type=['IncrementalMFD', 'truncGutenbergRichterMFD',
+                      'IncrementalMFD'],
+            rupt_aspect_ratio=[1.0, 1.0, 1.0],
+            upper_seismo_depth=[0.0] * 3, lower_seismo_depth=[20.] * 3,
+            a_val=[np.nan, 3.0, np.nan], b_val=[np.nan, 1.0, np.nan],
+            min_mag=[5.05, 5.0, 5.05], max_mag=[np.nan, 7.0, np.nan],
+            bin_width=[0.1, np.nan, 0.1],
+            rate_offsets=[0, 1, 1, 2], occur_rates=[0.1, 0.2],
+            npd_offsets=[0, 1, 2, 3], npd_probability=[1.0] * 3,
+            npd_strike=[0.] * 3, npd_dip=[90.] * 3, npd_rake=[0.] * 3,
+            hdd_offsets=[0, 1, 2, 3], hdd_probability=[1.0] * 3,
+            hdd_depth=[10.] * 3,
+            ring_offsets=[0, 5, 10, 15],
+            lons=[0., 0., 1., 1., 0., 1., 1., 2., 2., 1., 2., 2., 3., 3., 2.],
+            lats=[0., 1., 1., 0., 0.] * 3)
+        self.data_sources = {}
+        self.sinks = writers.SINKS
+
+    def tearDown(self):
+        writers.SINKS = self.sinks
+        shutil.rmtree(self.tmp_path)
+
+    def _set_sinks(self, fail=None):
+        """
+        Replace the sinks. The sink `fail` raises an error when writing.
+        """
+        def get_create(key):
+            def create(path, max_np, max_hd, max_bins, rootname, srs):
+                self.sizes = (max_np, max_hd, max_bins)
+                self.data_sources[key] = _FakeDataSource(rootname + key)
+                return self.data_sources[key]
+            return create
+
+        def get_write(key):
+            def write(src, lyr, max_np, max_hd, polygon):
+                if key == fail:
+                    raise ValueError('Cannot write source %s' % src.id)
+                lyr.append(src.id)
+            return write
+
+        writers.SINKS = [
+            (AreaSource, IncrementalMFD, get_create('_incr'),
+             get_write('_incr')),
+            (AreaSource, TGRMFD, get_create('_trgr'), get_write('_trgr'))]
+
+    def test_routing(self):
+        """
+        Each source is written in the layer of its MFD, in order
+        """
+        self._set_sinks()
+        write_shps(self.table, os.path.join(self.tmp_path, ''),
+                   rootname='test')
+        self.assertEqual(self.data_sources['_incr'].ids, ['1', '3'])
+        self.assertEqual(self.data_sources['_trgr'].ids, ['2'])
+        self.assertTrue(all(ds.closed for ds in self.data_sources.values()))
+
+    def test_bboxes_without_polygon(self):
+        """
+        The bounding boxes stay aligned with the features when a source
+        has no polygon
+        """
+        sink = writers._LayerSink(_FakeDataSource('test'), lambda *args: None,
+                                  1, 1)
+        sink.put(None, ([0., 1., 1.], [0., 0., 2.]))
+        sink.put(None)
+        sink.put(None, ([2., 3., 3.], [0., 0., 1.]))
+        sink.close()
+        np.testing.assert_equal(sink.bboxes, [[0., 0., 1., 2.],
+                                              [np.nan] * 4,
+                                              [2., 0., 3., 1.]])
+
+    def test_sources_created_once(self):
+        """
+        The sizes of the layers are taken from the table and each source is
+        created only once
+        """
+        self._set_sinks()
+        get_source = AreaSourceTable.get_source
+        calls = []
+
+        def count(table, idx):
+            calls.append(idx)
+            return get_source(table, idx)
+        AreaSourceTable.get_source = count
+        try:
+            write_shps(self.table, os.path.join(self.tmp_path, ''),
+                       rootname='test')
+        finally:
+            AreaSourceTable.get_source = get_source
+        self.assertEqual(sorted(calls), [0, 1, 2])
+        self.assertEqual(self.sizes, (1, 1, 1))
+
+    def test_sink_error(self):
+        """
+        An error raised in the thread of a sink reaches the caller and all
+        the sinks are closed
+        """
+        self._set_sinks(fail='_trgr')
+        self.assertRaises(ValueError, write_shps, self.table,
+                          os.path.join(self.tmp_path, ''), rootname='test')
+        self.assertEqual(self.data_sources['_incr'].ids, ['1', '3'])
+        self.assertTrue(all(ds.closed for ds in self.data_sources.values()))